@@ -0,0 +1,454 @@
+# src/ai_engine/analysis_jobs.py
+# Portfolio analysis as background jobs. The upload enqueues one AnalysisJob per upload session
+# (the session_id column is unique, so a session can never have two jobs); workers claim queued
+# jobs with an atomic conditional UPDATE, so a job runs on one worker at a time, and store the
+# result in the job row for the dashboard and the /api/jobs endpoints. A running job's heartbeat
+# is refreshed while it runs; a job whose worker died (restart, crash) stops heartbeating and is
+# re-queued after stale_seconds, up to max_attempts times. Jobs analyze the session's positions (one
+# per ticker, see PortfolioPosition), not its individual lots. After a differential re-upload only
+# the tickers it changed are fetched and analyzed again; the stored result is reused for the others.
+# Holdings stream through the analysis pipeline (MainAnalyzer.iter_portfolio_advice): the job keeps
+# each holding's advice and price series, not its aggregated data, and records progress as advice
+# arrives; portfolio risk is computed once the stream ends. Batch analyses (POST /api/batch/analyze)
+# run as jobs too: their portfolios wait in a BatchInput row under a "batch-..." session_id.
+#
+# Workers run inside the web app (ANALYSIS_WORKER_IN_APP) and/or as a separate process:
+#   python -m src.ai_engine.analysis_jobs
+
+import datetime
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import Counter
+from types import SimpleNamespace
+from flask import current_app
+
+DEFAULT_POLL_SECONDS = 1.0
+DEFAULT_STALE_SECONDS = 120
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_REUSE_MAX_AGE_SECONDS = 4 * 60 * 60
+BATCH_JOB_PREFIX = "batch-"
+
+class JobLost(Exception):
+    """Raised when a running job was re-queued or taken over by another worker."""
+
+def enqueue_analysis_job(session_id, holdings_count=0, changed_tickers=None):
+    """
+    Queues (or re-queues) the analysis of an upload session. A job that is already running keeps
+    running, but its result is discarded and it runs again, since the holdings changed under it.
+    :param changed_tickers: Tickers whose lots a differential re-upload changed, or None if the
+                            holdings were replaced. Changes accumulate until a run stores its
+                            result; that run re-analyzes only these tickers and reuses the stored
+                            result for the others.
+    :return: The AnalysisJob.
+    """
+    from sqlalchemy.exc import IntegrityError
+    from src.main import db
+    from src.models.analysis_job import AnalysisJob
+
+    job = AnalysisJob.query.filter_by(session_id=session_id).first()
+    if job is None:
+        db.session.add(AnalysisJob(session_id=session_id, status="queued", progress_total=holdings_count))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback() # Enqueued concurrently by another request: re-queue that one below
+            job = AnalysisJob.query.filter_by(session_id=session_id).first()
+        else:
+            current_app.logger.info(f"Queued analysis job for session {session_id}")
+            return AnalysisJob.query.filter_by(session_id=session_id).first()
+
+    pending = None # Analyze every holding
+    if changed_tickers is not None:
+        if job.status == "succeeded":
+            pending = set(changed_tickers)
+            if not pending:
+                return job # Nothing changed: the stored result still holds
+        elif job.status in ("queued", "running") and job.changed_tickers is not None:
+            pending = job.changed_ticker_set() | set(changed_tickers)
+        # A failed job has no usable result, so it analyzes everything
+
+    now = datetime.datetime.utcnow()
+    AnalysisJob.query.filter_by(session_id=session_id).update({
+        "revision": AnalysisJob.revision + 1,
+        "changed_tickers": json.dumps(sorted(pending)) if pending is not None else None,
+    })
+    # The stored result stays until the next run replaces it: that run may reuse it for unchanged tickers
+    AnalysisJob.query.filter(AnalysisJob.session_id == session_id, AnalysisJob.status != "running").update({
+        "status": "queued", "phase": None, "progress_done": 0, "progress_total": holdings_count,
+        "attempts": 0, "error": None, "created_at": now, "started_at": None, "finished_at": None,
+    })
+    db.session.commit()
+    current_app.logger.info(f"Re-queued analysis job for session {session_id}"
+                            + (f" ({len(pending)} changed ticker(s))" if pending is not None else ""))
+    return AnalysisJob.query.filter_by(session_id=session_id).first()
+
+def enqueue_batch_job(portfolios, error_rows):
+    """
+    Stores a validated batch of portfolios and queues its analysis (see batch_analysis).
+    :param portfolios: List of (portfolio_id, holdings) as returned by portfolio_csv.group_portfolios.
+    :param error_rows: Rows rejected by validation; returned with the result.
+    :return: The AnalysisJob; poll it by its session_id.
+    """
+    from src.main import db
+    from src.models.batch_input import BatchInput
+
+    session_id = f"{BATCH_JOB_PREFIX}{uuid.uuid4().hex}"
+    db.session.add(BatchInput.from_portfolios(session_id, portfolios, error_rows))
+    db.session.commit()
+    return enqueue_analysis_job(session_id, holdings_count=sum(len(holdings) for _, holdings in portfolios))
+
+class AnalysisWorker:
+    """Claims queued analysis jobs one at a time and runs them (see the module comment)."""
+
+    def __init__(self, app, poll_seconds=DEFAULT_POLL_SECONDS, stale_seconds=DEFAULT_STALE_SECONDS, max_attempts=DEFAULT_MAX_ATTEMPTS,
+                 reuse_max_age_seconds=DEFAULT_REUSE_MAX_AGE_SECONDS):
+        self.app = app
+        self.poll_seconds = poll_seconds
+        self.stale_seconds = stale_seconds
+        self.max_attempts = max_attempts
+        self.reuse_max_age_seconds = reuse_max_age_seconds # Older advice is analyzed again even if its ticker did not change
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.current_job = None
+        self.jobs_succeeded = 0
+        self.jobs_failed = 0
+        self._thread = None
+        self._stop = threading.Event()
+
+    def requeue_stale(self):
+        """Re-queues running jobs whose worker stopped heartbeating (fails them after max_attempts)."""
+        from src.main import db
+        from src.models.analysis_job import AnalysisJob
+
+        cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=self.stale_seconds)
+        stale = (AnalysisJob.status == "running") & (AnalysisJob.heartbeat_at < cutoff)
+        failed = AnalysisJob.query.filter(stale, AnalysisJob.attempts >= self.max_attempts).update({
+            "status": "failed", "phase": None, "finished_at": datetime.datetime.utcnow(),
+            "error": f"Analysis was interrupted {self.max_attempts} times (worker stopped or timed out).",
+        })
+        requeued = AnalysisJob.query.filter(stale).update({"status": "queued", "phase": None, "worker_id": None})
+        db.session.commit()
+        if failed or requeued:
+            current_app.logger.warning(f"Stale analysis jobs: {requeued} re-queued, {failed} failed")
+
+    def claim_next(self):
+        """Atomically moves the oldest queued job to running for this worker; returns (job id, revision) or None."""
+        from src.main import db
+        from src.models.analysis_job import AnalysisJob
+
+        candidates = [job_id for (job_id,) in db.session.query(AnalysisJob.id).filter_by(status="queued").order_by(AnalysisJob.created_at).limit(5)]
+        for job_id in candidates:
+            now = datetime.datetime.utcnow()
+            claimed = AnalysisJob.query.filter_by(id=job_id, status="queued").update({
+                "status": "running", "phase": "analyzing", "worker_id": self.worker_id, "attempts": AnalysisJob.attempts + 1,
+                "progress_done": 0, "started_at": now, "heartbeat_at": now,
+            })
+            if claimed:
+                revision = db.session.query(AnalysisJob.revision).filter_by(id=job_id).scalar()
+                db.session.commit()
+                return job_id, revision
+            db.session.rollback() # Another worker claimed it first
+        return None
+
+    def _update_running(self, job_id, **fields):
+        from src.main import db
+        from src.models.analysis_job import AnalysisJob
+
+        fields["heartbeat_at"] = datetime.datetime.utcnow()
+        updated = AnalysisJob.query.filter_by(id=job_id, status="running", worker_id=self.worker_id).update(fields)
+        db.session.commit()
+        if not updated:
+            raise JobLost(f"Analysis job {job_id} is no longer running on this worker")
+
+    def _heartbeat(self, job_id, done):
+        with self.app.app_context():
+            while not done.wait(max(1.0, self.stale_seconds / 4)):
+                try:
+                    self._update_running(job_id)
+                except JobLost:
+                    return
+                except Exception as e:
+                    current_app.logger.warning(f"Heartbeat for analysis job {job_id} failed: {e}")
+
+    def _progress(self, job_id):
+        last_update = [0.0]
+        def progress(done, total):
+            now = time.monotonic()
+            if done == total or now - last_update[0] >= 1.0: # At most one progress write per second
+                last_update[0] = now
+                self._update_running(job_id, progress_done=done, progress_total=total)
+        return progress
+
+    def _stream_advice(self, job_id, analyzer, holdings):
+        """
+        Runs holdings through the analysis pipeline, recording progress in the job row as advice arrives.
+        :return: (recommendations, risk inputs), in holding order.
+        """
+        if not holdings:
+            return [], []
+        progress = self._progress(job_id)
+        recommendations, risk_inputs = [], []
+        for advice, risk_input in analyzer.iter_portfolio_advice(holdings):
+            recommendations.append(advice)
+            risk_inputs.append(risk_input)
+            progress(len(recommendations), len(holdings))
+        return recommendations, risk_inputs
+
+    def _portfolio_result(self, job_id, analyzer, recommendations, risk_inputs, analyzed_at):
+        # Portfolio risk needs every holding, so it runs once the stream has ended
+        self._update_running(job_id, phase="risk")
+        risk_report = analyzer.analyze_portfolio_risk(risk_inputs)
+        if risk_report is not None:
+            analyzer.apply_portfolio_context(recommendations, risk_report["holdings"])
+        return {
+            "recommendations": recommendations,
+            "portfolio_risk": risk_report["portfolio"] if risk_report else None,
+            "analyzed_at": analyzed_at, # Epoch seconds, per ticker
+        }
+
+    def _analyze(self, job_id, session_id, changed_tickers=None, previous=None):
+        from sqlalchemy.exc import IntegrityError
+        from src.main import db
+        from src.models.portfolio_holding import PortfolioHolding
+        from src.models.portfolio_position import PortfolioPosition
+        from .main_analyzer import MainAnalyzer
+
+        # Lots of the same ticker are analyzed as one position (total quantity, average cost)
+        holdings = PortfolioPosition.query.filter_by(session_id=session_id).order_by(PortfolioPosition.ticker_symbol).all()
+        if not holdings and PortfolioHolding.query.filter_by(session_id=session_id).first() is not None:
+            PortfolioPosition.refresh(session_id) # Lots uploaded before positions were maintained
+            try:
+                db.session.commit()
+            except IntegrityError:
+                db.session.rollback() # A re-upload wrote the positions meanwhile
+            holdings = PortfolioPosition.query.filter_by(session_id=session_id).order_by(PortfolioPosition.ticker_symbol).all()
+        # Plain copies: the pipeline reads the holdings on its own threads, while progress commits on
+        # this one expire the ORM instances (reloading them would share this thread's session)
+        holdings = [SimpleNamespace(ticker_symbol=holding.ticker_symbol, quantity=holding.quantity, purchase_price=holding.purchase_price,
+                                    priced_quantity=holding.priced_quantity, purchase_date=holding.purchase_date) for holding in holdings]
+        started = time.time()
+        self._update_running(job_id, progress_total=len(holdings))
+        if not holdings:
+            return {"recommendations": [], "portfolio_risk": None, "analyzed_at": {}}
+        if changed_tickers is not None and previous is not None:
+            result = self._analyze_changes(job_id, holdings, changed_tickers, previous)
+            if result is not None:
+                return result
+
+        analyzer = MainAnalyzer()
+        recommendations, risk_inputs = self._stream_advice(job_id, analyzer, holdings)
+        return self._portfolio_result(job_id, analyzer, recommendations, risk_inputs,
+                                      {holding.ticker_symbol: started for holding in holdings})
+
+    def _analyze_changes(self, job_id, holdings, changed_tickers, previous):
+        """
+        Fetches and analyzes only the positions of changed tickers, and reuses the previous
+        recommendations for the others (whose lots a differential re-upload left as they were).
+        Portfolio risk still covers every position, the unchanged ones priced from the local price
+        history, and the portfolio-relative figures of every recommendation are refreshed. Previous
+        advice is only reused if it is complete (not an "Error" result) and was analyzed less than
+        reuse_max_age_seconds ago; otherwise its ticker is analyzed again as well.
+        :return: The job result, or None if the previous result cannot be reused.
+        """
+        from src.data_services.price_history_store import get_price_history_store
+        from .main_analyzer import MainAnalyzer
+
+        store = get_price_history_store()
+        if store is None:
+            return None
+        previous_by_ticker = {}
+        for recommendation in previous.get("recommendations") or []:
+            previous_by_ticker.setdefault(recommendation.get("symbol"), []).append(recommendation)
+
+        now = time.time()
+        analyzed_at = previous.get("analyzed_at") or {} # Missing in results stored before it was recorded
+        changed = set(changed_tickers)
+        stored_series = {}
+        for ticker, lots in Counter(holding.ticker_symbol for holding in holdings).items():
+            if ticker in changed:
+                continue
+            reusable = previous_by_ticker.get(ticker, [])
+            if (len(reusable) != lots or now - analyzed_at.get(ticker, float("-inf")) > self.reuse_max_age_seconds
+                    or any(recommendation.get("recommendation") == "Error" or "details" not in recommendation for recommendation in reusable)):
+                changed.add(ticker) # Nothing usable stored for it: missing, failed or too old
+                continue
+            series = store.load_series(ticker)
+            if series is None:
+                changed.add(ticker)
+            else:
+                stored_series[ticker] = series
+        fresh = [i for i, holding in enumerate(holdings) if holding.ticker_symbol in changed]
+        current_app.logger.info(f"Re-analyzing {len(fresh)} of {len(holdings)} holdings ({len(changed)} changed ticker(s))")
+
+        self._update_running(job_id, progress_total=len(fresh))
+        analyzer = MainAnalyzer()
+        fresh_results = zip(*self._stream_advice(job_id, analyzer, [holdings[i] for i in fresh]))
+        recommendations, risk_inputs = [], []
+        for holding in holdings:
+            if holding.ticker_symbol in changed:
+                recommendation, risk_input = next(fresh_results)
+                recommendations.append(recommendation)
+                risk_inputs.append(risk_input)
+            else:
+                recommendations.append(previous_by_ticker[holding.ticker_symbol].pop(0))
+                risk_inputs.append(MainAnalyzer.risk_input({
+                    "ticker": holding.ticker_symbol,
+                    "quantity": holding.quantity,
+                    "purchase_price": holding.purchase_price,
+                    "priced_quantity": getattr(holding, "priced_quantity", None),
+                    "yahoo_finance": {"price_series": stored_series[holding.ticker_symbol]},
+                }))
+        # The portfolio-relative figures of the reused advice are refreshed too (weights moved with the changed holdings)
+        return self._portfolio_result(job_id, analyzer, recommendations, risk_inputs, {
+            holding.ticker_symbol: now if holding.ticker_symbol in changed else analyzed_at[holding.ticker_symbol] for holding in holdings})
+
+    def _analyze_batch(self, job_id, session_id):
+        from src.models.batch_input import BatchInput
+        from .batch_analysis import BatchPortfolioAnalyzer
+
+        batch = BatchInput.query.filter_by(session_id=session_id).one()
+        portfolios, error_rows = batch.portfolio_list(), batch.error_list()
+        # Progress counts the distinct tickers, each analyzed once for all portfolios
+        result = BatchPortfolioAnalyzer().analyze(portfolios, progress=self._progress(job_id))
+        result["errors"] = error_rows
+        return result
+
+    def run_job(self, job_id, revision):
+        from src.main import db
+        from src.models.analysis_job import AnalysisJob
+        from src.models.batch_input import BatchInput
+
+        session_id, changed_tickers, previous = db.session.query(
+            AnalysisJob.session_id, AnalysisJob.changed_tickers, AnalysisJob.result).filter_by(id=job_id).one()
+        self.current_job = session_id
+        current_app.logger.info(f"Running analysis job for session {session_id} on {self.worker_id}")
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job_id, done), name="analysis-job-heartbeat", daemon=True)
+        heartbeat.start()
+        try:
+            if session_id.startswith(BATCH_JOB_PREFIX):
+                result = json.dumps(self._analyze_batch(job_id, session_id), default=str)
+            else:
+                result = json.dumps(self._analyze(
+                    job_id, session_id,
+                    changed_tickers=json.loads(changed_tickers) if changed_tickers is not None else None,
+                    previous=json.loads(previous) if previous else None,
+                ))
+            finished = {"phase": None, "finished_at": datetime.datetime.utcnow(), "heartbeat_at": datetime.datetime.utcnow()}
+            stored = AnalysisJob.query.filter_by(id=job_id, status="running", worker_id=self.worker_id, revision=revision).update(
+                dict(finished, status="succeeded", result=result, error=None))
+            if stored and session_id.startswith(BATCH_JOB_PREFIX):
+                BatchInput.query.filter_by(session_id=session_id).delete() # The result holds what is needed now
+            if not stored:
+                # Re-uploaded while running: analyze the new holdings (unless the job was taken over)
+                AnalysisJob.query.filter_by(id=job_id, status="running", worker_id=self.worker_id).update(
+                    {"status": "queued", "phase": None, "worker_id": None, "attempts": 0})
+            db.session.commit()
+            if stored:
+                self.jobs_succeeded += 1
+        except JobLost as e:
+            db.session.rollback()
+            current_app.logger.warning(str(e))
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Analysis job for session {session_id} failed: {e}", exc_info=True)
+            AnalysisJob.query.filter_by(id=job_id, status="running", worker_id=self.worker_id).update({
+                "status": "failed", "phase": None, "finished_at": datetime.datetime.utcnow(),
+                "error": f"System error during analysis: {e}",
+            })
+            db.session.commit()
+            self.jobs_failed += 1
+        finally:
+            done.set()
+            heartbeat.join()
+            self.current_job = None
+
+    def run_once(self):
+        """Re-queues stale jobs and runs the next queued one, if any; returns True if a job was run."""
+        with self.app.app_context():
+            self.requeue_stale()
+            claimed = self.claim_next()
+            if claimed is None:
+                return False
+            self.run_job(*claimed)
+            return True
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                if self.run_once():
+                    continue
+            except Exception as e:
+                self.app.logger.error(f"Analysis worker error: {e}", exc_info=True)
+            self._stop.wait(self.poll_seconds)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name="analysis-worker", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def status(self):
+        return {
+            "worker_id": self.worker_id,
+            "running": bool(self._thread and self._thread.is_alive()),
+            "current_job": self.current_job,
+            "jobs_succeeded": self.jobs_succeeded,
+            "jobs_failed": self.jobs_failed,
+        }
+
+def _new_worker(app):
+    return AnalysisWorker(
+        app,
+        poll_seconds=app.config.get("ANALYSIS_JOB_POLL_SECONDS", DEFAULT_POLL_SECONDS),
+        stale_seconds=app.config.get("ANALYSIS_JOB_STALE_SECONDS", DEFAULT_STALE_SECONDS),
+        max_attempts=app.config.get("ANALYSIS_JOB_MAX_ATTEMPTS", DEFAULT_MAX_ATTEMPTS),
+        reuse_max_age_seconds=app.config.get("ANALYSIS_REUSE_MAX_AGE_SECONDS", DEFAULT_REUSE_MAX_AGE_SECONDS),
+    )
+
+_worker = None
+_worker_pid = None
+_worker_lock = threading.Lock()
+
+def ensure_analysis_worker_started(app):
+    """
+    Starts the in-app worker thread once per process (threads do not survive a gunicorn fork,
+    so this is called lazily from a request hook rather than at import time).
+    """
+    global _worker, _worker_pid
+    if _worker_pid == os.getpid():
+        return _worker
+    with _worker_lock:
+        if _worker_pid != os.getpid():
+            _worker = _new_worker(app).start()
+            _worker_pid = os.getpid()
+    return _worker
+
+def get_analysis_worker():
+    return _worker if _worker_pid == os.getpid() else None
+
+if __name__ == "__main__":
+    import argparse
+    from src.main import app
+
+    parser = argparse.ArgumentParser(description="Runs queued portfolio analysis jobs.")
+    parser.add_argument("--once", action="store_true", help="Run at most one queued job and exit")
+    args = parser.parse_args()
+
+    worker = _new_worker(app)
+    if app.config.get("WARMUP_ENABLED") and not args.once:
+        from src.data_services.warmup_scheduler import ensure_warmup_scheduler_started
+        ensure_warmup_scheduler_started(app, warm_memory=True) # Warms the market data cache these jobs read
+    if args.once:
+        print(worker.run_once())
+    else:
+        app.logger.info(f"Analysis worker {worker.worker_id} polling for jobs")
+        try:
+            worker._loop()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,259 @@
+# src/ai_engine/backtest.py
+# Offline backtest of the advice rules over stored daily price history.
+# For every ticker the technical indicators are computed for the whole history at once
+# (batch_indicators.compute_indicator_series), the compiled rule set is evaluated with one row
+# per bar, and the resulting advice is replayed as a long/flat position. Tickers are sharded
+# across a process pool. Only local files are read: a PriceHistoryStore SQLite file or a
+# directory of per-ticker CSV files.
+#
+#   python -m src.ai_engine.backtest --db instance/price_history.sqlite3 --start 2015-01-01 \
+#       --workers 8 --threshold rsi_oversold=25
+
+import datetime
+import glob
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from .batch_indicators import TECHNICAL_FEATURES, compute_indicator_series
+from .rule_compiler import load_rule_set
+
+TRADING_DAYS_PER_YEAR = 252
+DEFAULT_HORIZON_BARS = 20
+# Target position per advice label; advice not listed here (e.g. "Hold") keeps the current position
+DEFAULT_POSITIONS = {"Buy": 1.0, "Consider Buy": 1.0, "Sell": 0.0, "Consider Sell": 0.0}
+
+class StorePriceSource:
+    """Daily closes from a PriceHistoryStore SQLite file (opened lazily, so instances can be sent to pool workers)."""
+
+    def __init__(self, db_path, interval="1d"):
+        self.db_path = db_path
+        self.interval = interval
+        self._store = None
+
+    def __getstate__(self):
+        return {"db_path": self.db_path, "interval": self.interval, "_store": None}
+
+    @property
+    def store(self):
+        if self._store is None:
+            from src.data_services.price_history_store import PriceHistoryStore
+            self._store = PriceHistoryStore(self.db_path)
+        return self._store
+
+    def symbols(self):
+        return self.store.symbols(self.interval)
+
+    def load(self, symbol):
+        series = self.store.load_series(symbol, self.interval)
+        if series is None:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        return series.timestamps[series.valid], series.valid_closes()
+
+class CsvPriceSource:
+    """
+    Daily closes from a directory of <SYMBOL>.csv files with a Date column and an "Adj Close"
+    or "Close" column (the layout of Yahoo Finance history downloads). Symbols are the upper-cased
+    file names, so "aapl.csv" is loaded as AAPL.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._paths = None
+
+    def paths(self):
+        """{symbol: path of its CSV file}, listed once per instance."""
+        if self._paths is None:
+            self._paths = {os.path.splitext(os.path.basename(path))[0].upper(): path
+                           for path in sorted(glob.glob(os.path.join(self.directory, "*.csv")))}
+        return self._paths
+
+    def symbols(self):
+        return sorted(self.paths())
+
+    def load(self, symbol):
+        path = self.paths().get(symbol.upper())
+        if path is None:
+            raise FileNotFoundError(f"No CSV file for {symbol} in {self.directory}")
+        frame = pd.read_csv(path)
+        close_column = "Adj Close" if "Adj Close" in frame.columns else "Close"
+        frame = frame[["Date", close_column]].dropna()
+        dates = pd.to_datetime(frame["Date"], utc=True)
+        order = np.argsort(dates.to_numpy())
+        timestamps = (dates.astype("int64") // 10**9).to_numpy()[order]
+        return timestamps.astype(np.int64), frame[close_column].to_numpy(dtype=np.float64)[order]
+
+def _to_timestamp(date_text):
+    if not date_text:
+        return None
+    return int(datetime.datetime.strptime(date_text, "%Y-%m-%d").replace(tzinfo=datetime.timezone.utc).timestamp())
+
+def _feature_matrix(rule_set, closes, sentiment):
+    """(bars x rule features) matrix: full-series indicators, the close as current_price, a constant sentiment."""
+    indicators = compute_indicator_series(closes, [name for name in rule_set.features if name in TECHNICAL_FEATURES])
+    matrix = np.full((len(closes), len(rule_set.features)), np.nan)
+    unavailable = []
+    for column, name in enumerate(rule_set.features):
+        if name in indicators:
+            matrix[:, column] = indicators[name]
+        elif name == "current_price":
+            matrix[:, column] = closes
+        elif name == "sentiment_score":
+            matrix[:, column] = sentiment # No point-in-time news history is stored
+        else:
+            unavailable.append(name) # Fundamentals etc. are not stored historically; their conditions never hold
+    return matrix, unavailable
+
+def backtest_ticker(symbol, timestamps, closes, rule_set, start=None, end=None, horizon=DEFAULT_HORIZON_BARS,
+                    sentiment=0.0, positions=None):
+    """
+    Replays the rule set over one ticker's history. Indicators use the full history (so they are
+    warmed up at `start`); signals and returns are counted from start to end (epoch seconds).
+    Advice at a bar's close sets the position held over the next bar, so there is no look-ahead.
+    :return: Dict of per-ticker metrics.
+    """
+    positions = positions or DEFAULT_POSITIONS
+    matrix, unavailable = _feature_matrix(rule_set, closes, sentiment)
+    advice_codes, _, _, _ = rule_set.evaluate(matrix)
+
+    window = np.ones(len(closes), dtype=bool)
+    if start is not None:
+        window &= timestamps >= start
+    if end is not None:
+        window &= timestamps <= end
+    first, last = (np.flatnonzero(window)[[0, -1]] if window.any() else (0, -1))
+    closes = closes[first:last + 1]
+    advice_codes = advice_codes[first:last + 1]
+    if len(closes) < 2:
+        return {"symbol": symbol, "bars": int(len(closes)), "error": "Not enough bars in the backtest window"}
+
+    # Target position after each bar's advice (NaN: keep the previous one)
+    targets_by_code = np.array([positions.get(rule_set.advice_names[code], np.nan) for code in range(len(rule_set.advice_names))])
+    targets = targets_by_code[advice_codes]
+    position = pd.Series(targets).ffill().fillna(0.0).to_numpy()
+
+    bar_returns = closes[1:] / closes[:-1] - 1
+    strategy_returns = position[:-1] * bar_returns
+    equity = np.cumprod(1 + strategy_returns)
+    position_changes = np.abs(np.diff(np.concatenate(([0.0], position[:-1]))))
+    years = len(bar_returns) / TRADING_DAYS_PER_YEAR
+
+    # Hit rate: a buy signal is a hit if the price is higher `horizon` bars later, a sell if lower
+    signal_bars = np.flatnonzero(~np.isnan(targets[:len(closes) - horizon])) if len(closes) > horizon else np.empty(0, dtype=np.int64)
+    forward_returns = closes[signal_bars + horizon] / closes[signal_bars] - 1
+    bullish = targets[signal_bars] > 0
+    hits = int(np.sum(np.where(bullish, forward_returns > 0, forward_returns < 0)))
+
+    return {
+        "symbol": symbol,
+        "bars": int(len(closes)),
+        "signals": int(len(signal_bars)),
+        "hits": hits,
+        "hit_rate": round(hits / len(signal_bars), 4) if len(signal_bars) else None,
+        "strategy_return": float(equity[-1] - 1),
+        "buy_and_hold_return": float(closes[-1] / closes[0] - 1),
+        "annualized_return": float(equity[-1] ** (1 / years) - 1) if years > 0 and equity[-1] > 0 else None,
+        "max_drawdown": float(np.max(1 - equity / np.maximum.accumulate(np.concatenate(([1.0], equity)))[1:])),
+        "trades": int(np.count_nonzero(position_changes)),
+        "turnover_per_year": float(position_changes.sum() / years) if years > 0 else None,
+        "exposure": float(position[:-1].mean()),
+        "unavailable_features": unavailable,
+    }
+
+def _run_shard(source, symbols, rules_path, threshold_overrides, start, end, horizon, sentiment):
+    rule_set = load_rule_set(rules_path, threshold_overrides)
+    results = []
+    for symbol in symbols:
+        try:
+            timestamps, closes = source.load(symbol)
+            results.append(backtest_ticker(symbol, timestamps, closes, rule_set, start, end, horizon, sentiment))
+        except Exception as e:
+            results.append({"symbol": symbol, "error": str(e)})
+    return results
+
+def _mean(values):
+    values = [value for value in values if value is not None and not math.isnan(value)]
+    return float(np.mean(values)) if values else None
+
+def _median(values):
+    values = [value for value in values if value is not None and not math.isnan(value)]
+    return float(np.median(values)) if values else None
+
+def summarize(results):
+    """Portfolio-level summary of per-ticker results (hit rate pooled over all signals)."""
+    completed = [result for result in results if "error" not in result]
+    signals = sum(result["signals"] for result in completed)
+    hits = sum(result["hits"] for result in completed)
+    return {
+        "tickers": len(results),
+        "tickers_failed": len(results) - len(completed),
+        "signals": signals,
+        "hit_rate": round(hits / signals, 4) if signals else None,
+        "mean_strategy_return": _mean([result["strategy_return"] for result in completed]),
+        "median_strategy_return": _median([result["strategy_return"] for result in completed]),
+        "mean_buy_and_hold_return": _mean([result["buy_and_hold_return"] for result in completed]),
+        "mean_annualized_return": _mean([result["annualized_return"] for result in completed]),
+        "mean_max_drawdown": _mean([result["max_drawdown"] for result in completed]),
+        "mean_turnover_per_year": _mean([result["turnover_per_year"] for result in completed]),
+        "mean_exposure": _mean([result["exposure"] for result in completed]),
+    }
+
+def run_backtest(source, rules_path, symbols=None, start=None, end=None, horizon=DEFAULT_HORIZON_BARS,
+                 workers=None, threshold_overrides=None, sentiment=0.0, shard_size=50):
+    """
+    Backtests the rules in rules_path over every symbol of source (or the given ones).
+    :param start, end: Optional "YYYY-MM-DD" bounds of the evaluation window.
+    :param workers: Pool processes (default: CPU count); 1 runs in this process.
+    :param threshold_overrides: Optional {threshold name: value} to try instead of the file's values.
+    :return: {"summary": {...}, "tickers": [per-ticker results]}
+    """
+    symbols = list(symbols or source.symbols())
+    start_ts, end_ts = _to_timestamp(start), _to_timestamp(end)
+    load_rule_set(rules_path, threshold_overrides) # Fail fast on a bad rules file or override
+    shards = [symbols[i:i + shard_size] for i in range(0, len(symbols), shard_size)]
+    arguments = (rules_path, threshold_overrides, start_ts, end_ts, horizon, sentiment)
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(shards) <= 1:
+        shard_results = [_run_shard(source, shard, *arguments) for shard in shards]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            shard_results = list(pool.map(_run_shard, [source] * len(shards), shards, *[[argument] * len(shards) for argument in arguments]))
+
+    results = [result for shard in shard_results for result in shard]
+    return {"summary": summarize(results), "tickers": results}
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Backtest the advice rules over stored daily price history (offline).")
+    data = parser.add_mutually_exclusive_group(required=True)
+    data.add_argument("--db", help="PriceHistoryStore SQLite file")
+    data.add_argument("--csv-dir", help="Directory of <SYMBOL>.csv files with Date and Close/Adj Close columns")
+    parser.add_argument("--rules", default=os.path.join(os.path.dirname(__file__), "advice_rules.json"), help="Rules file")
+    parser.add_argument("--tickers", nargs="*", help="Symbols to test (default: all in the data source)")
+    parser.add_argument("--start", help="First date of the evaluation window (YYYY-MM-DD)")
+    parser.add_argument("--end", help="Last date of the evaluation window (YYYY-MM-DD)")
+    parser.add_argument("--horizon", type=int, default=DEFAULT_HORIZON_BARS, help="Bars after a signal used to judge a hit")
+    parser.add_argument("--sentiment", type=float, default=0.0, help="Sentiment score assumed at every bar")
+    parser.add_argument("--workers", type=int, help="Pool processes (default: CPU count)")
+    parser.add_argument("--threshold", action="append", default=[], metavar="NAME=VALUE", help="Override a rules threshold")
+    parser.add_argument("--per-ticker", action="store_true", help="Include per-ticker results in the output")
+    args = parser.parse_args()
+
+    overrides = {}
+    for item in args.threshold:
+        name, _, value = item.partition("=")
+        overrides[name] = float(value)
+
+    started = time.monotonic()
+    report = run_backtest(StorePriceSource(args.db) if args.db else CsvPriceSource(args.csv_dir), args.rules,
+                          symbols=args.tickers, start=args.start, end=args.end, horizon=args.horizon,
+                          workers=args.workers, threshold_overrides=overrides, sentiment=args.sentiment)
+    report["summary"]["duration_seconds"] = round(time.monotonic() - started, 2)
+    if not args.per_ticker:
+        report.pop("tickers")
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,122 @@
+# src/ai_engine/batch_analysis.py
+# Analysis of many portfolios in one call (e.g. the nightly run over every client portfolio).
+# The advice for a holding depends only on its ticker (market data, features, sentiment, rules),
+# so the union of the portfolios' tickers is streamed once through the analysis pipeline
+# (MainAnalyzer.iter_portfolio_advice), keeping only each ticker's advice and price series.
+# The per-ticker advice is then fanned out
+# to every lot holding that ticker, and each portfolio gets its own risk report (weights, P&L,
+# beta) built from the shared price series without fetching anything again.
+#
+# Also runs offline over a CSV of many portfolios (a PortfolioId column plus the upload columns):
+#   python -m src.ai_engine.batch_analysis portfolios.csv --output results.json
+
+import time
+from types import SimpleNamespace
+from flask import current_app
+
+class BatchPortfolioAnalyzer:
+    def __init__(self, analyzer=None):
+        from .main_analyzer import MainAnalyzer
+
+        self.analyzer = analyzer or MainAnalyzer()
+
+    @staticmethod
+    def _lot_data(ticker_data, holding):
+        # The ticker's risk input (price series) with this lot's position
+        return dict(ticker_data, quantity=holding.quantity, purchase_price=holding.purchase_price,
+                    priced_quantity=getattr(holding, "priced_quantity", None),
+                    purchase_date=holding.purchase_date.isoformat() if holding.purchase_date else None)
+
+    @staticmethod
+    def _copy_recommendation(recommendation):
+        copied = dict(recommendation)
+        if "details" in copied:
+            copied["details"] = dict(copied["details"]) # Portfolio context differs per lot
+        return copied
+
+    def analyze_tickers(self, tickers, progress=None):
+        """
+        Fetches and analyzes each ticker once, with no portfolio context.
+        :param tickers: Distinct ticker symbols.
+        :param progress: Optional callable(done, total), called as each ticker's advice arrives.
+        :return: {ticker: (risk input, recommendation)}; see MainAnalyzer.risk_input.
+        """
+        if not tickers:
+            return {}
+        placeholders = [SimpleNamespace(ticker_symbol=ticker, quantity=0, purchase_price=None, purchase_date=None) for ticker in tickers]
+        by_ticker = {}
+        # Portfolio-relative figures are filled in per portfolio, once every ticker is in
+        for recommendation, risk_input in self.analyzer.iter_portfolio_advice(placeholders):
+            by_ticker[risk_input["ticker"]] = (risk_input, recommendation)
+            if progress:
+                progress(len(by_ticker), len(tickers))
+        return by_ticker
+
+    def analyze_portfolio(self, holdings, by_ticker):
+        """
+        Builds one portfolio's result from the per-ticker analysis.
+        :param holdings: PortfolioHolding-like objects (ticker_symbol, quantity, purchase_price, purchase_date).
+        :param by_ticker: Result of analyze_tickers covering every ticker of the holdings.
+        :return: {"recommendations", "portfolio_risk"}, like an analysis job result.
+        """
+        if not holdings:
+            return {"recommendations": [], "portfolio_risk": None}
+        aggregated_data = [self._lot_data(by_ticker[holding.ticker_symbol][0], holding) for holding in holdings]
+        recommendations = [self._copy_recommendation(by_ticker[holding.ticker_symbol][1]) for holding in holdings]
+        risk_report = self.analyzer.analyze_portfolio_risk(aggregated_data)
+        if risk_report is not None:
+            self.analyzer.apply_portfolio_context(recommendations, risk_report["holdings"])
+        return {"recommendations": recommendations, "portfolio_risk": risk_report["portfolio"] if risk_report else None}
+
+    def analyze(self, portfolios, progress=None):
+        """
+        :param portfolios: List of (portfolio_id, holdings); holdings are PortfolioHolding objects or
+                           dicts of ticker_symbol, quantity, purchase_price and purchase_date (as
+                           returned by portfolio_csv.validate_holdings).
+        :param progress: Optional callable(done, total) over the distinct tickers fetched.
+        :return: {"portfolios": [{"portfolio_id", "recommendations", "portfolio_risk"}], "stats"},
+                 portfolios in the order given.
+        """
+        started = time.monotonic()
+        portfolios = [(portfolio_id, [SimpleNamespace(**holding) if isinstance(holding, dict) else holding for holding in holdings])
+                      for portfolio_id, holdings in portfolios]
+        tickers = list(dict.fromkeys(holding.ticker_symbol for _, holdings in portfolios for holding in holdings))
+        lot_count = sum(len(holdings) for _, holdings in portfolios)
+        current_app.logger.info(f"Batch analysis: {len(portfolios)} portfolio(s), {lot_count} holding(s), {len(tickers)} distinct ticker(s)")
+
+        by_ticker = self.analyze_tickers(tickers, progress=progress)
+        results = [dict(portfolio_id=portfolio_id, **self.analyze_portfolio(holdings, by_ticker)) for portfolio_id, holdings in portfolios]
+        return {
+            "portfolios": results,
+            "stats": {
+                "portfolios": len(portfolios),
+                "holdings": lot_count,
+                "distinct_tickers": len(tickers),
+                "seconds": round(time.monotonic() - started, 3),
+            },
+        }
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    from src.data_services.portfolio_csv import read_batch_csv
+    from src.main import app
+
+    parser = argparse.ArgumentParser(description="Analyzes many portfolios from one CSV, fetching each distinct ticker once.")
+    parser.add_argument("csv", help="CSV with PortfolioId, Ticker, Quantity and optional PurchasePrice, PurchaseDate columns")
+    parser.add_argument("--output", help="Write the JSON result here (default: stdout)")
+    args = parser.parse_args()
+
+    with app.app_context():
+        with open(args.csv, "rb") as stream:
+            portfolios, error_rows = read_batch_csv(stream)
+        result = BatchPortfolioAnalyzer().analyze(portfolios)
+        result["errors"] = error_rows
+        app.logger.info(f"Batch analysis stats: {result['stats']}; {len(error_rows)} rejected row(s)")
+
+    text = json.dumps(result, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w") as out:
+            out.write(text)
+    else:
+        print(text)
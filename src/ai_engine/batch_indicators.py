@@ -0,0 +1,163 @@
+# src/ai_engine/batch_indicators.py
+# Vectorized technical indicators for many tickers at once.
+# Prices are laid out as a 2-D matrix (tickers x bars), right-aligned so that column -1 is every
+# ticker's latest bar, with NaN padding on the left for shorter histories. Each indicator is
+# computed for all tickers in one NumPy pass and matches the single-ticker FeatureEngineer methods.
+
+import numpy as np
+import pandas as pd
+
+SMA_WINDOWS = (20, 50, 200)
+RSI_WINDOW = 14
+MACD_SHORT_WINDOW = 12
+MACD_LONG_WINDOW = 26
+MACD_SIGNAL_WINDOW = 9
+TECHNICAL_FEATURES = ("sma_20_day", "sma_50_day", "sma_200_day", "rsi_14_day", "macd_line", "macd_signal", "macd_histogram")
+
+def build_price_matrix(price_arrays):
+    """
+    Stacks ragged 1-D price histories (oldest first, no missing values) into a right-aligned,
+    NaN-padded float64 matrix.
+    :return: (matrix of shape (n_tickers, max_bars), int array of history lengths)
+    """
+    lengths = np.array([len(p) for p in price_arrays], dtype=np.int64)
+    width = int(lengths.max()) if len(lengths) else 0
+    matrix = np.full((len(price_arrays), width), np.nan)
+    for row, prices in enumerate(price_arrays):
+        if len(prices):
+            matrix[row, width - len(prices):] = prices
+    return matrix, lengths
+
+def batch_sma(matrix, lengths, window):
+    """Latest simple moving average per ticker; NaN where the history is shorter than window."""
+    result = np.full(matrix.shape[0], np.nan)
+    ready = lengths >= window
+    if ready.any():
+        result[ready] = matrix[ready, -window:].mean(axis=1)
+    return result
+
+def batch_rsi(matrix, lengths, window=RSI_WINDOW):
+    """
+    Latest RSI per ticker using simple rolling means of gains and losses over `window` deltas
+    (same definition as FeatureEngineer.calculate_rsi); NaN where fewer than window + 1 bars exist.
+    """
+    result = np.full(matrix.shape[0], np.nan)
+    ready = lengths >= window + 1
+    if not ready.any():
+        return result
+    deltas = np.diff(matrix[ready, -(window + 1):], axis=1)
+    gain = np.where(deltas > 0, deltas, 0.0).mean(axis=1)
+    loss = np.where(deltas < 0, -deltas, 0.0).mean(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = 100 - (100 / (1 + gain / loss))
+    # No losses in the window: 100 if there were gains, otherwise neutral
+    result[ready] = np.where(loss == 0, np.where(gain > 0, 100.0, 50.0), rsi)
+    return result
+
+def _ema_step(previous, values, alpha):
+    # pandas ewm(adjust=False): the first observation seeds the average
+    return np.where(np.isnan(previous), values, alpha * values + (1 - alpha) * previous)
+
+def batch_macd(matrix, lengths, short_window=MACD_SHORT_WINDOW, long_window=MACD_LONG_WINDOW, signal_window=MACD_SIGNAL_WINDOW):
+    """
+    Latest MACD line, signal line and histogram per ticker, with EMAs seeded from each ticker's
+    first bar (pandas ewm(span, adjust=False)). The recursion runs once over the bar axis for
+    all tickers together. NaN where the history is shorter than long_window.
+    """
+    n_tickers = matrix.shape[0]
+    short_alpha = 2.0 / (short_window + 1)
+    long_alpha = 2.0 / (long_window + 1)
+    signal_alpha = 2.0 / (signal_window + 1)
+    short_ema = np.full(n_tickers, np.nan)
+    long_ema = np.full(n_tickers, np.nan)
+    signal = np.full(n_tickers, np.nan)
+    for column in matrix.T:
+        short_ema = _ema_step(short_ema, column, short_alpha)
+        long_ema = _ema_step(long_ema, column, long_alpha)
+        signal = _ema_step(signal, short_ema - long_ema, signal_alpha)
+    macd_line = short_ema - long_ema
+
+    too_short = lengths < long_window
+    macd_line[too_short] = np.nan
+    signal[too_short] = np.nan
+    return macd_line, signal, macd_line - signal
+
+def _to_optional_float(value):
+    return None if np.isnan(value) else float(value)
+
+def compute_technical_indicators(price_arrays, names=None):
+    """
+    Computes SMA-20/50/200, RSI-14 and MACD for every ticker in one vectorized pass.
+    :param price_arrays: Sequence of 1-D close price arrays (oldest first, no missing values).
+    :param names: Optional subset of TECHNICAL_FEATURES to compute; the others are skipped.
+    :return: List (same order) of dicts using the FeatureEngineer feature names; None where a
+             history is too short for an indicator.
+    """
+    if len(price_arrays) == 0:
+        return []
+    wanted = set(names) if names is not None else set(TECHNICAL_FEATURES)
+    matrix, lengths = build_price_matrix(price_arrays)
+    columns = {}
+    for window in SMA_WINDOWS:
+        if f"sma_{window}_day" in wanted:
+            columns[f"sma_{window}_day"] = batch_sma(matrix, lengths, window)
+    if "rsi_14_day" in wanted:
+        columns["rsi_14_day"] = batch_rsi(matrix, lengths, RSI_WINDOW)
+    if wanted & {"macd_line", "macd_signal", "macd_histogram"}:
+        columns["macd_line"], columns["macd_signal"], columns["macd_histogram"] = batch_macd(matrix, lengths)
+    return [
+        {name: _to_optional_float(values[row]) for name, values in columns.items()}
+        for row in range(len(price_arrays))
+    ]
+
+# Full-series variants: the indicator value at every bar of one ticker's history (NaN until
+# enough bars exist), for replaying rules over history rather than scoring the latest bar.
+
+def series_sma(closes, window):
+    """Simple moving average ending at every bar, computed from one cumulative sum."""
+    result = np.full(len(closes), np.nan)
+    if len(closes) >= window:
+        cumulative = np.concatenate(([0.0], np.cumsum(closes)))
+        result[window - 1:] = (cumulative[window:] - cumulative[:-window]) / window
+    return result
+
+def series_rsi(closes, window=RSI_WINDOW):
+    """RSI (simple rolling means of gains and losses, as batch_rsi) ending at every bar."""
+    result = np.full(len(closes), np.nan)
+    if len(closes) < window + 1:
+        return result
+    deltas = np.diff(closes)
+    gain = series_sma(np.where(deltas > 0, deltas, 0.0), window)
+    loss = series_sma(np.where(deltas < 0, -deltas, 0.0), window)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = np.where(loss == 0, np.where(gain > 0, 100.0, 50.0), 100 - (100 / (1 + gain / loss)))
+    result[1:] = np.where(np.isnan(gain), np.nan, rsi)
+    return result
+
+def series_macd(closes, short_window=MACD_SHORT_WINDOW, long_window=MACD_LONG_WINDOW, signal_window=MACD_SIGNAL_WINDOW):
+    """MACD line, signal line and histogram at every bar (pandas ewm(adjust=False), as batch_macd)."""
+    prices = pd.Series(closes, dtype=np.float64)
+    macd_line = (prices.ewm(span=short_window, adjust=False).mean() - prices.ewm(span=long_window, adjust=False).mean()).to_numpy()
+    signal = pd.Series(macd_line).ewm(span=signal_window, adjust=False).mean().to_numpy()
+    macd_line[:long_window - 1] = np.nan
+    signal[:long_window - 1] = np.nan
+    return macd_line, signal, macd_line - signal
+
+def compute_indicator_series(closes, names=None):
+    """
+    Full-series technical indicators for one ticker.
+    :param closes: 1-D close price array (oldest first, no missing values).
+    :param names: Optional subset of TECHNICAL_FEATURES to compute.
+    :return: Dict of feature name -> float64 array aligned with closes.
+    """
+    wanted = set(names) if names is not None else set(TECHNICAL_FEATURES)
+    closes = np.asarray(closes, dtype=np.float64)
+    series = {}
+    for window in SMA_WINDOWS:
+        if f"sma_{window}_day" in wanted:
+            series[f"sma_{window}_day"] = series_sma(closes, window)
+    if "rsi_14_day" in wanted:
+        series["rsi_14_day"] = series_rsi(closes, RSI_WINDOW)
+    if wanted & {"macd_line", "macd_signal", "macd_histogram"}:
+        series["macd_line"], series["macd_signal"], series["macd_histogram"] = series_macd(closes)
+    return series
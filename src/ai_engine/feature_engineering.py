@@ -1,12 +1,189 @@
 # src/ai_engine/feature_engineering.py
 
-import pandas as pd
 import numpy as np
+import pandas as pd
 from flask import current_app
+from .batch_indicators import TECHNICAL_FEATURES, compute_technical_indicators
+from .feature_graph import FeatureGraph, FeatureUnavailable, LazyFeatures
+from .feature_store import make_feature_key
+from .streaming_indicators import TickerIndicatorState
+
+FEATURE_CODE_VERSION = "2" # Bump whenever a feature node's output changes, so stored features are not reused
+
+# Every feature is a node of this graph; "stock_data" (one DataAggregator dictionary) and
+# "engineer" (the FeatureEngineer) are supplied per stock.
+FEATURE_GRAPH = FeatureGraph(roots=("stock_data", "engineer"))
+feature = FEATURE_GRAPH.node
+
+@feature("ticker", "stock_data")
+def _ticker(stock_data):
+    return stock_data.get("ticker")
+
+# A. Portfolio-Context Features
+# "current_holding_percentage" and "unrealized_pnl_percentage" depend on the whole portfolio, not
+# on one stock, so they are computed by risk_engine.PortfolioRiskAnalyzer (and would otherwise make
+# stored features portfolio-specific); MainAnalyzer adds them to the recommendation details.
+
+# B. Price & Volume Technical Indicators
+@feature("price_series", "stock_data", output=False)
+def _price_series(stock_data):
+    price_series = stock_data.get("yahoo_finance", {}).get("price_series")
+    if price_series is None or len(price_series) == 0:
+        raise FeatureUnavailable("Chart data missing or incomplete for technical indicators.")
+    return price_series
+
+@feature("close_prices", "engineer", "ticker", "price_series", output=False)
+def _close_prices(engineer, ticker, price_series):
+    close_prices = engineer._get_close_prices(ticker, price_series)
+    if len(close_prices) == 0:
+        raise FeatureUnavailable("No close prices available for technical indicators.")
+    return close_prices
+
+@feature("current_price", "close_prices")
+def _current_price(close_prices):
+    return float(close_prices[-1])
+
+for _window in (20, 50, 200):
+    FEATURE_GRAPH.add(f"sma_{_window}_day", ("engineer", "close_prices"),
+                      lambda engineer, close_prices, window=_window: engineer.calculate_sma(close_prices, window))
+
+@feature("rsi_14_day", "engineer", "close_prices")
+def _rsi_14_day(engineer, close_prices):
+    return engineer.calculate_rsi(close_prices, 14)
+
+@feature("macd", "engineer", "close_prices", output=False)
+def _macd(engineer, close_prices):
+    return engineer.calculate_macd(close_prices)
+
+for _position, _name in enumerate(("macd_line", "macd_signal", "macd_histogram")):
+    FEATURE_GRAPH.add(_name, ("macd",), lambda macd, position=_position: macd[position])
+
+# C. Fundamental & Valuation Metrics (from YahooFinance Insights)
+@feature("insights", "stock_data", output=False)
+def _insights(stock_data):
+    return stock_data.get("yahoo_finance", {}).get("insights") or {}
+
+@feature("fundamentals", "insights", output=False)
+def _fundamentals(insights):
+    if not insights:
+        raise FeatureUnavailable("YahooFinance insights data missing for fundamentals.")
+    return insights
+
+# The exact paths depend on the API response structure, so every lookup uses .get() for safety
+for _name, _section, _field in (
+    ("pe_ratio_trailing", "summaryDetail", "trailingPE"),
+    ("forward_pe_ratio", "summaryDetail", "forwardPE"),
+    ("dividend_yield", "summaryDetail", "dividendYield"),
+    ("market_cap", "summaryDetail", "marketCap"),
+    ("price_to_book", "defaultKeyStatistics", "priceToBook"),
+    ("enterprise_value", "defaultKeyStatistics", "enterpriseValue"),
+):
+    FEATURE_GRAPH.add(_name, ("fundamentals",),
+                      lambda insights, section=_section, field=_field: insights.get(section, {}).get(field, {}).get("raw"))
+
+@feature("latest_analyst_recommendation", "fundamentals", output=False)
+def _latest_analyst_recommendation(insights):
+    trend = insights.get("recommendationTrend", {}).get("trend", [])
+    if not trend:
+        raise FeatureUnavailable()
+    return trend[0] # Assuming the first is the most recent or relevant
+
+for _name, _field in (("analyst_strong_buy", "strongBuy"), ("analyst_buy", "buy"), ("analyst_hold", "hold"),
+                      ("analyst_sell", "sell"), ("analyst_strong_sell", "strongSell")):
+    FEATURE_GRAPH.add(_name, ("latest_analyst_recommendation",), lambda recommendation, field=_field: recommendation.get(field))
+
+@feature("valuation_description", "fundamentals")
+def _valuation_description(insights):
+    return insights.get("instrumentInfo", {}).get("valuation", {}).get("description") # e.g., "Undervalued"
+
+@feature("valuation_discount", "fundamentals")
+def _valuation_discount(insights):
+    return insights.get("instrumentInfo", {}).get("valuation", {}).get("discount") # e.g., "-15%"
+
+# D. News & Sentiment Indicators (sentiment itself comes from SentimentAnalyzer)
+@feature("significant_developments_count", "insights")
+def _significant_developments_count(insights):
+    return len(insights.get("sigDevs") or [])
+
+@feature("analyst_reports_count", "stock_data")
+def _analyst_reports_count(stock_data):
+    analyst_reports = stock_data.get("yahoo_finance", {}).get("analyst_opinions", [])
+    return len(analyst_reports[0].get("hits", [])) if analyst_reports and analyst_reports[0].get("hits") else 0
+
+# E. Macroeconomic & World Event Indicators (from DataBank)
+@feature("macro_data", "stock_data", output=False)
+def _macro_data(stock_data):
+    databank_data = stock_data.get("data_bank", {})
+    if not databank_data:
+        raise FeatureUnavailable("DataBank macroeconomic data missing.")
+    return databank_data
+
+def _latest_annual_value(indicator):
+    """Most recent year's value of a DataBank indicator (years are the keys of its data)."""
+    data = indicator.get("data", {})
+    latest_year = max([int(y) for y in data.keys() if data[y] is not None and y.isdigit()], default=None)
+    if not latest_year:
+        raise FeatureUnavailable()
+    return data.get(str(latest_year))
+
+@feature("latest_gdp_us", "macro_data")
+def _latest_gdp_us(databank_data):
+    return _latest_annual_value(databank_data.get("gdp_us", {}))
+
+@feature("latest_inflation_us_cpi", "macro_data")
+def _latest_inflation_us_cpi(databank_data):
+    return _latest_annual_value(databank_data.get("inflation_us_cpi", {}))
 
 class FeatureEngineer:
-    def __init__(self):
-        pass
+    def __init__(self, price_store=None, streaming_indicators=False, feature_store=None):
+        # Optional PriceHistoryStore: when set, close prices are read straight from it
+        # instead of from the PriceSeries attached to the aggregated data.
+        self.price_store = price_store
+        # With a store, technical indicators can instead be kept as persisted per-ticker state
+        # that is advanced by the new bars only (see streaming_indicators).
+        self.streaming_indicators = streaming_indicators and price_store is not None
+        # Optional FeatureStore: features already computed for the same inputs (by any session or
+        # worker) are reused instead of recomputed.
+        self.feature_store = feature_store
+
+    def _streaming_technicals(self, ticker, price_series):
+        """
+        Advances the ticker's persisted indicator state with the bars it has not seen yet and
+        returns the technical features including the newest bar. The newest bar is only previewed,
+        never committed, because it may still be revised (intraday) on the next fetch.
+        """
+        timestamps = price_series.timestamps[price_series.valid]
+        closes = price_series.valid_closes()
+        saved = self.price_store.load_indicator_state(ticker)
+        state = TickerIndicatorState.from_dict(saved) if saved else None
+
+        position = None
+        if state is not None and state.last_timestamp is not None:
+            position = int(np.searchsorted(timestamps, state.last_timestamp))
+            # The state must describe exactly the stored history up to its last bar, otherwise rebuild it
+            if position >= len(timestamps) or timestamps[position] != state.last_timestamp or state.bars != position + 1:
+                position = None
+
+        if position is None:
+            state = TickerIndicatorState.from_history(timestamps[:-1], closes[:-1])
+            changed = True
+        else:
+            changed = False
+            for timestamp, close in zip(timestamps[position + 1:-1], closes[position + 1:-1]):
+                changed = state.update(int(timestamp), float(close)) or changed
+        if changed:
+            self.price_store.save_indicator_state(ticker, state.to_dict())
+
+        return state.preview(int(timestamps[-1]), float(closes[-1]))
+
+    def _get_close_prices(self, ticker, price_series):
+        """Returns the close price history for a ticker as a float64 array, oldest first, with missing values removed."""
+        if self.price_store is not None and ticker:
+            close_prices = self.price_store.load_closes(ticker)
+            if len(close_prices) > 0:
+                return close_prices
+        # The validity mask drops missing closes, which would otherwise break calculations
+        return price_series.valid_closes()
 
     def calculate_sma(self, prices, window):
         """Calculates Simple Moving Average."""
@@ -19,13 +196,13 @@ class FeatureEngineer:
         if len(prices) < window + 1:
             return None
         delta = pd.Series(prices).diff()
-        gain = (delta.where(delta > 0, 0)).rolling(window=window).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=window).mean()
+        # Only the latest window matters for the returned value
+        gain = (delta.where(delta > 0, 0)).rolling(window=window).mean().iloc[-1]
+        loss = (-delta.where(delta < 0, 0)).rolling(window=window).mean().iloc[-1]
         if loss == 0: # Avoid division by zero if all losses are zero
             return 100 if gain > 0 else 50 # Or handle as per specific strategy
         rs = gain / loss
-        rsi = 100 - (100 / (1 + rs))
-        return rsi.iloc[-1] if isinstance(rsi, pd.Series) else rsi # rsi can be a series or a float
+        return 100 - (100 / (1 + rs))
 
     def calculate_macd(self, prices, short_window=12, long_window=26, signal_window=9):
         """Calculates MACD, MACD Signal, and MACD Histogram."""
@@ -42,124 +219,123 @@ class FeatureEngineer:
         
         return macd_line.iloc[-1], signal_line.iloc[-1], macd_histogram.iloc[-1]
 
-    def extract_features(self, aggregated_stock_data):
+    def lazy_features(self, aggregated_stock_data, precomputed=None, key=None):
+        """Returns a LazyFeatures mapping for one stock; features are computed when first read."""
+        return LazyFeatures(FEATURE_GRAPH, {"stock_data": aggregated_stock_data, "engineer": self}, precomputed, key)
+
+    def lazy_features_batch(self, aggregated_stock_data_list, prefetch=()):
         """
-        Extracts and calculates features for a single stock from aggregated data.
-        :param aggregated_stock_data: A dictionary containing data from DataAggregator for one stock.
-        :return: A dictionary of features.
+        Returns a LazyFeatures mapping per stock (same order). Features already in the feature
+        store for the same inputs are seeded from it, and technical indicators named in `prefetch`
+        are computed up front for all stocks together (streaming state, else one vectorized
+        batch) rather than one stock at a time. Lots sharing a ticker share one mapping.
+        Pass the mappings to save_features once they have been read.
         """
-        features = {
-            "ticker": aggregated_stock_data.get("ticker"),
-            "errors": []
-        }
-        current_app.logger.info(f"Starting feature engineering for {features['ticker']}")
-
-        # A. Portfolio-Context Features (Example - can be expanded)
-        # features["current_holding_percentage"] = ... (requires total portfolio value)
-        # features["unrealized_pnl_percentage"] = ... (requires purchase_price and current_price)
-
-        # B. Price & Volume Technical Indicators
-        chart_data = aggregated_stock_data.get("yahoo_finance", {}).get("chart", {})
-        if chart_data and chart_data.get("timestamp") and chart_data.get("indicators", {}).get("quote"):
-            try:
-                close_prices = chart_data["indicators"]["quote"][0].get("close", [])
-                # Filter out None values which can break calculations
-                close_prices = [p for p in close_prices if p is not None]
-
-                if len(close_prices) > 0:
-                    features["current_price"] = close_prices[-1]
-                    features["sma_20_day"] = self.calculate_sma(close_prices, 20)
-                    features["sma_50_day"] = self.calculate_sma(close_prices, 50)
-                    features["sma_200_day"] = self.calculate_sma(close_prices, 200)
-                    features["rsi_14_day"] = self.calculate_rsi(close_prices, 14)
-                    macd, macd_signal, macd_hist = self.calculate_macd(close_prices)
-                    features["macd_line"] = macd
-                    features["macd_signal"] = macd_signal
-                    features["macd_histogram"] = macd_hist
-                else:
-                    features["errors"].append("No close prices available for technical indicators.")
-            except Exception as e:
-                current_app.logger.error(f"Error calculating technical indicators for {features['ticker']}: {e}")
-                features["errors"].append(f"Error in technical indicators: {str(e)}")
-        else:
-            features["errors"].append("Chart data missing or incomplete for technical indicators.")
+        keys = [None] * len(aggregated_stock_data_list)
+        seeds = [{} for _ in aggregated_stock_data_list]
+        if self.feature_store is not None:
+            for i, aggregated_stock_data in enumerate(aggregated_stock_data_list):
+                try:
+                    keys[i] = make_feature_key(aggregated_stock_data, FEATURE_CODE_VERSION)
+                    if keys[i] is not None:
+                        seeds[i] = self.feature_store.get(keys[i]) or {}
+                except Exception as e:
+                    current_app.logger.warning(f"Feature store lookup failed for {aggregated_stock_data.get('ticker')}: {e}")
 
-        # C. Fundamental & Valuation Metrics (from YahooFinance Insights)
-        insights = aggregated_stock_data.get("yahoo_finance", {}).get("insights", {})
-        if insights:
-            try:
-                # Basic financial ratios (often in summaryDetail or defaultKeyStatistics)
-                # The exact path depends on the API response structure which can be nested.
-                # For now, we'll assume some direct paths or use .get() for safety.
-                # This section needs to be robust to missing keys in the API response.
-                summary_detail = insights.get("summaryDetail", {})
-                features["pe_ratio_trailing"] = summary_detail.get("trailingPE", {}).get("raw")
-                features["forward_pe_ratio"] = summary_detail.get("forwardPE", {}).get("raw")
-                features["dividend_yield"] = summary_detail.get("dividendYield", {}).get("raw") 
-                features["market_cap"] = summary_detail.get("marketCap", {}).get("raw")
-                
-                key_stats = insights.get("defaultKeyStatistics", {})
-                features["price_to_book"] = key_stats.get("priceToBook", {}).get("raw")
-                features["enterprise_value"] = key_stats.get("enterpriseValue", {}).get("raw")
-
-                # Analyst recommendations
-                recommendation = insights.get("recommendationTrend", {}).get("trend", [])
-                if recommendation:
-                    latest_rec = recommendation[0] # Assuming the first is the most recent or relevant
-                    features["analyst_strong_buy"] = latest_rec.get("strongBuy")
-                    features["analyst_buy"] = latest_rec.get("buy")
-                    features["analyst_hold"] = latest_rec.get("hold")
-                    features["analyst_sell"] = latest_rec.get("sell")
-                    features["analyst_strong_sell"] = latest_rec.get("strongSell")
-                
-                # Valuation from insights
-                valuation_info = insights.get("instrumentInfo", {}).get("valuation", {})
-                features["valuation_description"] = valuation_info.get("description") # e.g., "Undervalued"
-                features["valuation_discount"] = valuation_info.get("discount") # e.g., "-15%"
-
-            except Exception as e:
-                current_app.logger.error(f"Error extracting fundamental/valuation for {features['ticker']}: {e}")
-                features["errors"].append(f"Error in fundamental/valuation: {str(e)}")
-        else:
-            features["errors"].append("YahooFinance insights data missing for fundamentals.")
+        # Several lots of one ticker share a key, so each distinct key is evaluated only once
+        first_index = {}
+        unique = []
+        for i, key in enumerate(keys):
+            if key is None or key not in first_index:
+                unique.append(i)
+                if key is not None:
+                    first_index[key] = i
 
-        # D. News & Sentiment Indicators (Placeholder - Sentiment will be done by SentimentAnalyzer)
-        # features["news_sentiment_score_stock"] = ... (This will come from SentimentAnalyzer)
-        # features["news_volume_stock"] = ... (Count of sigDevs or analyst reports)
-        sig_devs = insights.get("sigDevs", [])
-        features["significant_developments_count"] = len(sig_devs) if sig_devs else 0
+        wanted = [name for name in TECHNICAL_FEATURES if name in prefetch]
+        pending = [i for i in unique if wanted and any(name not in seeds[i] for name in wanted)]
+        for i, technicals in zip(pending, self._prefetch_technicals([aggregated_stock_data_list[i] for i in pending], wanted)):
+            seeds[i].update(technicals)
 
-        analyst_reports = aggregated_stock_data.get("yahoo_finance", {}).get("analyst_opinions", [])
-        features["analyst_reports_count"] = len(analyst_reports[0].get("hits",[])) if analyst_reports and analyst_reports[0].get("hits") else 0
+        lazy_by_index = {}
+        for i in unique:
+            lazy_by_index[i] = self.lazy_features(aggregated_stock_data_list[i], seeds[i], keys[i])
+        return [lazy_by_index[i if keys[i] is None else first_index[keys[i]]] for i in range(len(keys))]
 
-        # E. Macroeconomic & World Event Indicators (from DataBank)
-        databank_data = aggregated_stock_data.get("data_bank", {})
-        if databank_data:
+    def save_features(self, lazy_features_list):
+        """Writes newly computed, error-free features back to the feature store."""
+        if self.feature_store is None:
+            return
+        for lazy in {id(lazy): lazy for lazy in lazy_features_list}.values():
+            if lazy.key is None or lazy.errors or not lazy.has_new_values():
+                continue # Errors may be transient; do not pin them
             try:
-                gdp_us_data = databank_data.get("gdp_us", {}).get("data", {})
-                if gdp_us_data:
-                    # Get the most recent year's GDP value (assuming years are keys)
-                    latest_year_gdp = max([int(y) for y in gdp_us_data.keys() if gdp_us_data[y] is not None and y.isdigit()], default=None)
-                    if latest_year_gdp:
-                        features["latest_gdp_us"] = gdp_us_data.get(str(latest_year_gdp))
-                
-                inflation_us_cpi_data = databank_data.get("inflation_us_cpi", {}).get("data", {})
-                if inflation_us_cpi_data:
-                    latest_year_inflation = max([int(y) for y in inflation_us_cpi_data.keys() if inflation_us_cpi_data[y] is not None and y.isdigit()], default=None)
-                    if latest_year_inflation:
-                        features["latest_inflation_us_cpi"] = inflation_us_cpi_data.get(str(latest_year_inflation))
+                self.feature_store.put(lazy.key, lazy.get("ticker"), lazy.computed())
             except Exception as e:
-                current_app.logger.error(f"Error extracting macroeconomic data for {features['ticker']}: {e}")
-                features["errors"].append(f"Error in macroeconomic data: {str(e)}")
-        else:
-            features["errors"].append("DataBank macroeconomic data missing.")
-        
-        current_app.logger.info(f"Finished feature engineering for {features['ticker']}. Features count: {len(features) - 2}, Errors: {len(features['errors'])}")
+                current_app.logger.warning(f"Feature store write failed for {lazy.get('ticker')}: {e}")
+
+    def _prefetch_technicals(self, aggregated_stock_data_list, names):
+        """
+        Computes the named technical indicators for many stocks at once. Stocks with persisted
+        streaming indicator state are advanced by their new bars only, which is O(1) per stock for
+        a daily refresh; every other stock gets its indicators from one vectorized batch (see
+        batch_indicators).
+        :return: List of dicts (same order) with the indicators and the close prices they used.
+        """
+        results = [{} for _ in aggregated_stock_data_list]
+        if not names:
+            return results
+        pending = []
+        for i, aggregated_stock_data in enumerate(aggregated_stock_data_list):
+            ticker = aggregated_stock_data.get("ticker")
+            price_series = aggregated_stock_data.get("yahoo_finance", {}).get("price_series")
+            if price_series is None or len(price_series) == 0 or not price_series.valid.any():
+                continue # Left to the feature graph, which reports why
+            if self.streaming_indicators and ticker:
+                try:
+                    results[i] = self._streaming_technicals(ticker, price_series)
+                    results[i]["close_prices"] = price_series.valid_closes()
+                    continue
+                except Exception as e:
+                    current_app.logger.error(f"Streaming indicator update failed for {ticker}: {e}")
+            results[i]["close_prices"] = self._get_close_prices(ticker, price_series)
+            pending.append(i)
+
+        try:
+            batch = compute_technical_indicators([results[i]["close_prices"] for i in pending], names)
+            for i, technicals in zip(pending, batch):
+                results[i].update(technicals)
+        except Exception as e:
+            # Fall back to the per-stock calculations of the feature graph, which record their own errors
+            current_app.logger.error(f"Batch technical indicator calculation failed: {e}")
+        return results
+
+    def _materialize(self, lazy):
+        current_app.logger.info(f"Starting feature engineering for {lazy.get('ticker')}")
+        features = lazy.materialize()
+        current_app.logger.info(f"Finished feature engineering for {features.get('ticker')}. Features count: {len(features) - 2}, Errors: {len(features['errors'])}")
         return features
 
-# Example usage (for testing - requires Flask app context for logger)
-# if __name__ == "__main__":
-#     # Mock aggregated_stock_data similar to what DataAggregator would produce
-#     # Needs to be run within a Flask app context
-#     pass
+    def extract_features_batch(self, aggregated_stock_data_list):
+        """
+        Extracts every feature for many stocks at once, with technical indicators for all stocks
+        prefetched together and features reused from / saved to the feature store.
+        :param aggregated_stock_data_list: List of DataAggregator dictionaries.
+        :return: List of feature dictionaries, in the same order.
+        """
+        lazy_features_list = self.lazy_features_batch(aggregated_stock_data_list, prefetch=TECHNICAL_FEATURES)
+        features_list = [self._materialize(lazy) for lazy in lazy_features_list]
+        self.save_features(lazy_features_list)
+        return features_list
 
+    def extract_features(self, aggregated_stock_data, close_prices=None, technicals=None):
+        """
+        Extracts and calculates every feature for a single stock from aggregated data.
+        :param aggregated_stock_data: A dictionary containing data from DataAggregator for one stock.
+        :param close_prices: Optional close price array already loaded by the caller.
+        :param technicals: Optional precomputed technical indicators.
+        :return: A dictionary of features.
+        """
+        precomputed = dict(technicals or {})
+        if close_prices is not None and len(close_prices) > 0:
+            precomputed["close_prices"] = close_prices
+        return self._materialize(self.lazy_features(aggregated_stock_data, precomputed))
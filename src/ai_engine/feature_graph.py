@@ -0,0 +1,121 @@
+# src/ai_engine/feature_graph.py
+# Features declared as nodes of a dependency graph. Each node names the nodes it takes as inputs;
+# a LazyFeatures mapping evaluates a node only when it is read and memoizes it for the request,
+# so an analysis pays only for the features its rules actually use.
+
+from collections.abc import Mapping
+
+class FeatureUnavailable(Exception):
+    """
+    Raised by a node whose inputs are missing. The node (and every node depending on it) is left
+    out of the features; the message, if any, is reported once in the features' errors.
+    """
+
+class FeatureNode:
+    __slots__ = ("name", "inputs", "func", "output")
+
+    def __init__(self, name, inputs, func, output=True):
+        self.name = name
+        self.inputs = inputs
+        self.func = func
+        self.output = output # False for intermediate values that are not reported as features
+
+class FeatureGraph:
+    def __init__(self, roots=()):
+        self.roots = tuple(roots) # Values supplied by the caller rather than computed
+        self.nodes = {}
+
+    def node(self, name, *inputs, output=True):
+        """Decorator registering `func(*input_values)` as the node computing `name`."""
+        def register(func):
+            self.add(name, inputs, func, output=output)
+            return func
+        return register
+
+    def add(self, name, inputs, func, output=True):
+        if name in self.nodes or name in self.roots:
+            raise ValueError(f"Feature node already defined: {name}")
+        for input_name in inputs:
+            if input_name not in self.nodes and input_name not in self.roots:
+                raise ValueError(f"Feature node {name} depends on undefined node {input_name}")
+        self.nodes[name] = FeatureNode(name, tuple(inputs), func, output)
+
+    @property
+    def output_names(self):
+        return [name for name, node in self.nodes.items() if node.output]
+
+class LazyFeatures(Mapping):
+    """
+    Read-only mapping of feature name -> value for one stock, evaluated on first access.
+    Features that cannot be computed are absent (so .get() returns the default) and their reasons
+    are collected in `errors`. `precomputed` seeds values computed elsewhere (feature store,
+    vectorized batch indicators), which are then not recomputed.
+    """
+
+    def __init__(self, graph, roots, precomputed=None, key=None):
+        self.graph = graph
+        self.key = key # Feature store key, if any
+        self.errors = []
+        self._values = dict(roots)
+        self._failed = set()
+        self._seeded = set()
+        for name, value in (precomputed or {}).items():
+            if name in graph.nodes:
+                self._values[name] = value
+                self._seeded.add(name)
+
+    def _evaluate(self, name):
+        if name in self._values:
+            return self._values[name]
+        if name in self._failed:
+            raise FeatureUnavailable()
+        node = self.graph.nodes[name]
+        try:
+            value = node.func(*[self._evaluate(input_name) for input_name in node.inputs])
+        except FeatureUnavailable as e:
+            self._failed.add(name)
+            message = str(e)
+            if message and message not in self.errors:
+                self.errors.append(message)
+            raise FeatureUnavailable()
+        except Exception as e:
+            self._failed.add(name)
+            self.errors.append(f"Error in {name}: {e}")
+            raise FeatureUnavailable()
+        self._values[name] = value
+        return value
+
+    def __getitem__(self, name):
+        if name not in self.graph.nodes:
+            raise KeyError(name)
+        try:
+            return self._evaluate(name)
+        except FeatureUnavailable:
+            raise KeyError(name)
+
+    def __iter__(self):
+        return iter(self.graph.output_names)
+
+    def __len__(self):
+        return len(self.graph.output_names)
+
+    def __contains__(self, name):
+        return name in self.graph.nodes and self.get(name, FeatureUnavailable) is not FeatureUnavailable
+
+    def computed(self):
+        """Output features evaluated so far (including seeded ones), without evaluating any others."""
+        return {name: self._values[name] for name in self.graph.output_names if name in self._values}
+
+    def has_new_values(self):
+        """True if any output feature was computed here rather than seeded."""
+        return any(name not in self._seeded for name in self.computed())
+
+    def materialize(self, names=None):
+        """Evaluates the given (default: all) output features and returns them as a plain dict with an `errors` list."""
+        features = {}
+        for name in names or self.graph.output_names:
+            value = self.get(name, FeatureUnavailable)
+            if value is not FeatureUnavailable:
+                features[name] = value
+        features["errors"] = list(self.errors)
+        return features
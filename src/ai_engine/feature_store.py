@@ -0,0 +1,168 @@
+# src/ai_engine/feature_store.py
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+
+DEFAULT_MAX_ENTRIES = 50000
+DEFAULT_MEMORY_ENTRIES = 2000
+
+def _json_default(value):
+    # NumPy scalars (np.float64 etc.) expose .item(); anything else is hashed/stored by its repr
+    return value.item() if hasattr(value, "item") else str(value)
+
+def _digest(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=_json_default).encode("utf-8")).hexdigest()
+
+def make_feature_key(aggregated_stock_data, code_version):
+    """
+    Content address of a stock's features: ticker, last bar timestamp (and close, since the newest
+    bar may be revised intraday), a hash of the non-price inputs (insights, analyst opinions,
+    DataBank data) and the feature code version.
+    :return: Key string, or None when there is no price history to anchor it.
+    """
+    yahoo_finance = aggregated_stock_data.get("yahoo_finance", {})
+    price_series = yahoo_finance.get("price_series")
+    if price_series is None or len(price_series) == 0:
+        return None
+    inputs_hash = _digest([
+        yahoo_finance.get("insights"),
+        yahoo_finance.get("analyst_opinions"),
+        aggregated_stock_data.get("data_bank"),
+    ])
+    return "|".join([
+        str(aggregated_stock_data.get("ticker")),
+        str(price_series.last_timestamp),
+        repr(price_series.last_close),
+        inputs_hash,
+        str(code_version),
+    ])
+
+class FeatureStore:
+    """
+    Feature results shared across sessions and worker processes.
+    Entries live in a SQLite file (shared by every process on the host) fronted by a small
+    in-process LRU; the file is trimmed to max_entries by least recent access.
+    Stored features are returned as fresh dicts, so callers may modify them.
+    """
+
+    def __init__(self, db_path, max_entries=DEFAULT_MAX_ENTRIES, memory_entries=DEFAULT_MEMORY_ENTRIES):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writes_since_trim = 0
+        self.hits = 0
+        self.misses = 0
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS feature_cache (
+                       feature_key TEXT PRIMARY KEY,
+                       ticker TEXT NOT NULL,
+                       features TEXT NOT NULL,
+                       accessed_at REAL NOT NULL
+                   )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_feature_cache_accessed_at ON feature_cache (accessed_at)")
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            self._local.conn = conn
+        return conn
+
+    def _remember(self, key, payload):
+        with self._lock:
+            self._memory[key] = payload
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            payload = self._memory.get(key)
+            if payload is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return json.loads(payload)
+
+        row = self._connection().execute("SELECT features FROM feature_cache WHERE feature_key = ?", (key,)).fetchone()
+        if row is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._connection() as conn:
+            conn.execute("UPDATE feature_cache SET accessed_at = ? WHERE feature_key = ?", (time.time(), key))
+        self._remember(key, row[0])
+        with self._lock:
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key, ticker, features):
+        payload = json.dumps(features, default=_json_default)
+        with self._connection() as conn:
+            conn.execute("INSERT OR REPLACE INTO feature_cache VALUES (?, ?, ?, ?)", (key, ticker, payload, time.time()))
+        self._remember(key, payload)
+        with self._lock:
+            self._writes_since_trim += 1
+            should_trim = self._writes_since_trim >= max(1, self.max_entries // 10)
+            if should_trim:
+                self._writes_since_trim = 0
+        if should_trim:
+            self._trim()
+
+    def _trim(self):
+        """Evicts the least recently accessed entries beyond max_entries."""
+        with self._connection() as conn:
+            conn.execute(
+                """DELETE FROM feature_cache WHERE feature_key IN (
+                       SELECT feature_key FROM feature_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                   )""",
+                (self.max_entries,),
+            )
+
+    def stats(self):
+        entries = self._connection().execute("SELECT COUNT(*) FROM feature_cache").fetchone()[0]
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "memory_entries": len(self._memory),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+_feature_store = None
+_feature_store_lock = threading.Lock()
+
+def get_feature_store():
+    """
+    Returns the process-wide FeatureStore configured by FEATURE_STORE_DB_PATH,
+    or None when the store is disabled (empty path).
+    """
+    global _feature_store
+    db_path = current_app.config.get("FEATURE_STORE_DB_PATH")
+    if not db_path:
+        return None
+    if _feature_store is None or _feature_store.db_path != db_path:
+        with _feature_store_lock:
+            if _feature_store is None or _feature_store.db_path != db_path:
+                _feature_store = FeatureStore(
+                    db_path,
+                    max_entries=current_app.config.get("FEATURE_STORE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES),
+                )
+    return _feature_store
@@ -1,62 +1,190 @@
 # src/ai_engine/main_analyzer.py
 
+from types import SimpleNamespace
 from flask import current_app
 from .feature_engineering import FeatureEngineer
+from .feature_store import get_feature_store
 from .sentiment_analyzer import SentimentAnalyzer
+from .news_sentiment import get_news_sentiment_tracker
+from .sentiment_cache import get_sentiment_cache
 from .rule_engine import RuleEngine
+from .pipeline import Stage, StagedPipeline
+from .risk_engine import PortfolioRiskAnalyzer, get_return_covariance
 from src.data_services.data_aggregator import DataAggregator # Assuming this is correctly placed
+from src.data_services.price_history_store import get_price_history_store
 
 class MainAnalyzer:
     def __init__(self):
-        self.feature_engineer = FeatureEngineer()
-        self.sentiment_analyzer = SentimentAnalyzer()
+        self.feature_engineer = FeatureEngineer(
+            price_store=get_price_history_store(),
+            streaming_indicators=current_app.config.get("STREAMING_INDICATORS_ENABLED", True),
+            feature_store=get_feature_store()
+        )
+        self.sentiment_analyzer = SentimentAnalyzer(
+            cache=get_sentiment_cache(),
+            process_workers=current_app.config.get("SENTIMENT_PROCESS_WORKERS", 0),
+            process_min_texts=current_app.config.get("SENTIMENT_PROCESS_MIN_TEXTS", 2000)
+        )
+        # Per-ticker time-decayed news sentiment, updated with new items only (None: plain mean of current news)
+        self.news_sentiment = get_news_sentiment_tracker()
         self.rule_engine = RuleEngine()
+        self.risk_analyzer = PortfolioRiskAnalyzer(
+            covariance=get_return_covariance(),
+            confidence_levels=current_app.config.get("RISK_VAR_CONFIDENCE_LEVELS", (0.95, 0.99))
+        )
         self.data_aggregator = DataAggregator() # Instantiate the aggregator
         current_app.logger.info("MainAnalyzer initialized.")
 
-    def analyze_portfolio_and_generate_advice(self, portfolio_data):
+    @staticmethod
+    def _collect_sentiment_texts(stock_data):
+        """Gathers analyst report abstracts and significant development headlines for sentiment scoring."""
+        yahoo_finance = stock_data.get("yahoo_finance", {})
+        texts = []
+        for opinion in yahoo_finance.get("analyst_opinions") or []:
+            texts.extend(opinion.get("hits", []))
+        texts.extend(yahoo_finance.get("insights", {}).get("sigDevs", []))
+        return texts
+
+    def _score_sentiment(self, aggregated_data):
+        """News sentiment per holding: the time-decayed aggregate if enabled, else the mean over the current news."""
+        if self.news_sentiment is not None:
+            try:
+                return self.news_sentiment.update_many(aggregated_data, self.sentiment_analyzer)
+            except Exception as e:
+                current_app.logger.error(f"Time-decayed news sentiment update failed, using plain mean: {e}")
+        return self.sentiment_analyzer.analyze_sentiment_batch(
+            [[] if stock_data.get("errors") else self._collect_sentiment_texts(stock_data) for stock_data in aggregated_data]
+        )
+
+    def analyze_portfolio_risk(self, aggregated_data):
         """
-        Main analysis pipeline.
-        1. Fetches market data for each stock in the portfolio.
-        2. Performs feature engineering.
-        3. Analyzes sentiment from news/opinions.
-        4. Applies rule engine to generate advice.
+        Portfolio-level risk report (weights, unrealized P&L, correlation, beta, VaR); see risk_engine.
+        :param aggregated_data: List of aggregated stock data dictionaries, or of their risk inputs (see risk_input).
         """
-        advice_for_portfolio = []
-        if not portfolio_data:
-            current_app.logger.warning("Portfolio data is empty. Cannot generate advice.")
-            return {"error": "Portfolio data is empty."}
-
-        for holding in portfolio_data:
-            ticker = holding.get("symbol")
-            if not ticker:
-                current_app.logger.warning(f"Skipping holding due to missing symbol: {holding}")
-                continue
-            
-            current_app.logger.info(f"Analyzing ticker: {ticker}")
-            
-            # 1. Fetch aggregated market data
-            # Assuming country_code is available or can be defaulted (e.g., from user profile or stock exchange)
-            country_code_for_gdp = holding.get("country_code", "USA") # Example default
-            stock_data = self.data_aggregator.get_all_data_for_stock(ticker, country_code_for_gdp)
-
-            if not stock_data or stock_data.get("errors"): # Check if stock_data itself is None or has an error key
-                current_app.logger.warning(f"Aggregated data for {ticker} has errors or is incomplete: {stock_data.get('errors') if stock_data else 'No data returned'}")
-                advice_for_portfolio.append({"symbol": ticker, "error": "Failed to retrieve complete market data."})
+        try:
+            return self.risk_analyzer.analyze(aggregated_data)
+        except Exception as e:
+            current_app.logger.error(f"Portfolio risk analysis failed: {e}", exc_info=True)
+            return None
+
+    @staticmethod
+    def apply_portfolio_context(recommendations, holding_risks):
+        """
+        Sets the portfolio-relative figures (weight, unrealized P&L, beta) in the recommendation details.
+        :param holding_risks: risk_report["holdings"] entries, by position (None to leave one unchanged).
+        """
+        for recommendation, holding_risk in zip(recommendations, holding_risks):
+            if holding_risk is None or "details" not in recommendation: # Error recommendations have no details
                 continue
+            recommendation["details"].update({
+                "current_holding_percentage": f"{holding_risk['current_holding_percentage']:.2f}" if holding_risk["current_holding_percentage"] is not None else "N/A",
+                "unrealized_pnl_percentage": f"{holding_risk['unrealized_pnl_percentage']:.2f}" if holding_risk["unrealized_pnl_percentage"] is not None else "N/A",
+                "beta": f"{holding_risk['beta']:.2f}" if holding_risk["beta"] is not None else "N/A",
+            })
+
+    @staticmethod
+    def _as_holding(entry):
+        """Accepts a PortfolioHolding or a {"symbol", "quantity", "purchase_price"} dict."""
+        if hasattr(entry, "ticker_symbol"):
+            return entry
+        return SimpleNamespace(ticker_symbol=entry.get("symbol"), quantity=entry.get("quantity"),
+                               purchase_price=entry.get("purchase_price"), purchase_date=None)
+
+    def _fetch_stage(self, macro_snapshot):
+        def fetch(holdings):
+            return [self.data_aggregator.aggregate_holding(holding, *macro_snapshot) for holding in holdings]
+        return fetch
+
+    def _features_stage(self, batch):
+        lazies = self.feature_engineer.lazy_features_batch(batch, prefetch=self.rule_engine.required_features)
+        return list(zip(batch, lazies))
+
+    def _sentiment_stage(self, batch):
+        scores = self._score_sentiment([stock_data for stock_data, _ in batch])
+        return [(stock_data, lazy, score) for (stock_data, lazy), score in zip(batch, scores)]
+
+    def _rules_stage(self, batch):
+        results = [None] * len(batch)
+        complete = []
+        for i, (stock_data, _, _) in enumerate(batch):
+            if stock_data.get("errors"):
+                current_app.logger.warning(f"Aggregated data for {stock_data.get('ticker')} has errors or is incomplete: {stock_data.get('errors')}")
+                results[i] = {"symbol": stock_data.get("ticker"), "recommendation": "Error", "reason": "Failed to retrieve complete market data."}
+            else:
+                complete.append(i)
+        if complete:
+            advice_list = self.rule_engine.generate_advice_batch(
+                [batch[i][0].get("ticker") for i in complete],
+                [batch[i][1] for i in complete],
+                [batch[i][2] for i in complete],
+                [batch[i][0] for i in complete],
+            )
+            for i, advice_details in zip(complete, advice_list):
+                results[i] = advice_details
+        self.feature_engineer.save_features([lazy for _, lazy, _ in batch])
+        # The rest of the aggregated data (news, insights, macro, features) is dropped here
+        return [(advice, self.risk_input(stock_data)) for advice, (stock_data, _, _) in zip(results, batch)]
+
+    @staticmethod
+    def risk_input(stock_data):
+        """The fields of a holding's aggregated data that the portfolio risk report reads (see risk_engine)."""
+        return {
+            "ticker": stock_data.get("ticker"),
+            "quantity": stock_data.get("quantity"),
+            "purchase_price": stock_data.get("purchase_price"),
+            "priced_quantity": stock_data.get("priced_quantity"),
+            "yahoo_finance": {"price_series": stock_data.get("yahoo_finance", {}).get("price_series")},
+            "errors": stock_data.get("errors", []),
+        }
+
+    def iter_portfolio_advice(self, portfolio_data):
+        """
+        Streams advice for holdings that have not been aggregated yet, through a staged pipeline
+        (see pipeline.StagedPipeline) with bounded queues between the stages:
+        1. fetch: market data per holding, several holdings at a time.
+        2. features: lazy features, with technical indicators prefetched per micro-batch.
+        3. sentiment: news sentiment scored per micro-batch.
+        4. rules: the rule set evaluated per micro-batch; new features saved to the feature store.
+        Fetching later holdings overlaps with analysis of earlier ones, and only a bounded number
+        of holdings is in flight, so memory does not grow with the size of the portfolio.
+        Worker counts per stage, queue size and batch size come from the ANALYSIS_PIPELINE_* config.
+        Portfolio-relative figures need every holding, so they are left to the caller: compute
+        analyze_portfolio_risk over the risk inputs once the stream ends, then apply_portfolio_context.
+        :param portfolio_data: Iterable of PortfolioHolding/PortfolioPosition instances or {"symbol", ...} dicts.
+        :return: Generator of (advice dictionary, risk input) pairs, in holding order; the risk input
+                 keeps only the position and price series of the holding (see risk_input).
+        """
+        def holdings():
+            for entry in portfolio_data:
+                holding = self._as_holding(entry)
+                if not holding.ticker_symbol:
+                    current_app.logger.warning(f"Skipping holding due to missing symbol: {entry}")
+                    continue
+                yield holding
 
-            # 2. Feature Engineering (using fetched data)
-            # This part would need actual data to work on; for now, it might receive stubbed data
-            engineered_features = self.feature_engineer.generate_features(stock_data)
-            
-            # 3. Sentiment Analysis (using fetched news/opinions)
-            # This part also needs actual data; for now, it might receive stubbed data
-            sentiment_score = self.sentiment_analyzer.analyze_sentiment(stock_data.get("analyst_opinions", []))
-            
-            # 4. Rule Engine
-            advice_details = self.rule_engine.generate_advice(ticker, engineered_features, sentiment_score, stock_data)
-            current_app.logger.info(f"Generated advice for {ticker}: {advice_details.get('action', 'N/A')}")
-            advice_for_portfolio.append(advice_details)
-
-        return advice_for_portfolio
+        workers = current_app.config.get("ANALYSIS_PIPELINE_WORKERS", {})
+        batch_size = current_app.config.get("ANALYSIS_PIPELINE_BATCH_SIZE", 32)
+        pipeline = StagedPipeline(
+            "portfolio-analysis",
+            [
+                Stage("fetch", self._fetch_stage(self.data_aggregator.get_macro_snapshot()), workers=workers.get("fetch", 8)),
+                Stage("features", self._features_stage, workers=workers.get("features", 1), batch_size=batch_size),
+                Stage("sentiment", self._sentiment_stage, workers=workers.get("sentiment", 1), batch_size=batch_size),
+                Stage("rules", self._rules_stage, workers=workers.get("rules", 1), batch_size=batch_size),
+            ],
+            queue_size=current_app.config.get("ANALYSIS_PIPELINE_QUEUE_SIZE", 32),
+            on_error=self._pipeline_error,
+            app=current_app._get_current_object(),
+        )
+        yield from pipeline.run(holdings())
+        current_app.logger.info(f"Portfolio analysis pipeline finished: {pipeline.stats()}")
 
+    @classmethod
+    def _pipeline_error(cls, item, exception):
+        current_app.logger.error(f"Analysis pipeline stage failed: {exception}", exc_info=exception)
+        if isinstance(item, tuple):
+            stock_data = item[0] # (stock_data, ...) after the fetch stage
+        else:
+            stock_data = DataAggregator._new_stock_data(item, None) # The holding itself, if fetching failed
+        advice = {"symbol": stock_data.get("ticker"), "recommendation": "Error", "reason": f"Analysis failed: {exception}"}
+        return advice, cls.risk_input(stock_data)
@@ -0,0 +1,336 @@
+# src/ai_engine/news_sentiment.py
+# Streaming news ingestion and per-ticker, exponentially time-decayed sentiment aggregates.
+# News items are produced by generators (YahooFinance insights sigDevs, analyst opinions, a
+# local JSON-lines news feed). Each ticker keeps a running decayed sum of compound scores that
+# only the items it has not seen before are scored and folded into, so a refresh costs
+# O(new items) regardless of how much news the ticker has accumulated.
+
+import datetime
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from flask import current_app
+
+SECONDS_PER_DAY = 86400.0
+HORIZON_HALF_LIVES = 10 # Items this many half-lives older than the newest weigh < 0.1% and are dropped
+MAX_PENDING_FEED_ITEMS = 1000 # Per ticker, for feed items of tickers nobody has analyzed yet
+MAX_PENDING_FEED_TOTAL = 20000 # Over all tickers; the tickers waiting longest for an analysis are dropped first
+STATE_READ_BATCH = 500 # Tickers per IN (...) list
+
+class NewsItem:
+    __slots__ = ("ticker", "source", "published_at", "text", "item_id")
+
+    def __init__(self, ticker, source, published_at, text):
+        self.ticker = ticker
+        self.source = source
+        self.published_at = published_at # Epoch seconds
+        self.text = text
+        # Stable identity, so an item seen again on the next fetch is not counted twice
+        self.item_id = hashlib.sha1(f"{source}|{ticker}|{text}".encode("utf-8")).hexdigest()
+
+    def __repr__(self):
+        return f"<NewsItem {self.ticker} {self.source} {self.published_at} {self.text[:40]!r}>"
+
+def parse_news_date(value, default=None):
+    """
+    Converts a news date to epoch seconds: "YYYY-MM-DD" or ISO 8601 strings (UTC unless an
+    offset is given) and epoch seconds or milliseconds. Returns default if it cannot be parsed.
+    """
+    if value is None or value == "":
+        return default
+    if isinstance(value, (int, float)):
+        return float(value) / 1000.0 if value > 1e11 else float(value)
+    try:
+        parsed = datetime.datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return default
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed.timestamp()
+
+def iter_insight_news(ticker, insights, fetched_at=None):
+    """Yields the significant developments (sigDevs) of a YahooFinance insights payload."""
+    fetched_at = fetched_at or time.time()
+    for development in (insights or {}).get("sigDevs") or []:
+        headline = development.get("headline") if isinstance(development, dict) else None
+        if headline and isinstance(headline, str):
+            yield NewsItem(ticker, "sigdev", parse_news_date(development.get("date"), fetched_at), headline)
+
+def iter_analyst_news(ticker, analyst_opinions, fetched_at=None):
+    """Yields analyst report abstracts (or titles) from a YahooFinance analyst opinions payload."""
+    fetched_at = fetched_at or time.time()
+    for opinion in analyst_opinions if isinstance(analyst_opinions, list) else []:
+        for hit in opinion.get("hits", []) if isinstance(opinion, dict) else []:
+            text = hit.get("abstract", hit.get("headline", hit.get("title", hit.get("report_title"))))
+            if text and isinstance(text, str):
+                yield NewsItem(ticker, "analyst", parse_news_date(hit.get("report_date"), fetched_at), text)
+
+def iter_stock_news(stock_data, fetched_at=None):
+    """Yields every news item carried by one DataAggregator dictionary."""
+    ticker = stock_data.get("ticker")
+    yahoo_finance = stock_data.get("yahoo_finance", {})
+    yield from iter_insight_news(ticker, yahoo_finance.get("insights"), fetched_at)
+    yield from iter_analyst_news(ticker, yahoo_finance.get("analyst_opinions"), fetched_at)
+
+class NewsFeedReader:
+    """
+    Tails a local JSON-lines news feed ({"ticker", "date", "headline" or "text"} per line).
+    Each read_new() call yields only the lines appended since the previous call; a truncated or
+    replaced file is read again from the start (items already counted are recognised by id).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+        self._lock = threading.Lock()
+
+    def read_new(self):
+        with self._lock:
+            if not os.path.exists(self.path):
+                return
+            if os.path.getsize(self.path) < self.offset:
+                self.offset = 0
+            with open(self.path, "r", encoding="utf-8") as feed:
+                feed.seek(self.offset)
+                while True:
+                    line = feed.readline()
+                    if not line or not line.endswith("\n"):
+                        break # Leave a partially written last line for the next call
+                    self.offset = feed.tell()
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    text = entry.get("headline") or entry.get("text")
+                    ticker = entry.get("ticker")
+                    if ticker and text and isinstance(text, str):
+                        yield NewsItem(str(ticker).upper(), "feed", parse_news_date(entry.get("date"), time.time()), text)
+
+class DecayedSentiment:
+    """
+    Exponentially time-decayed mean of compound scores: an item published `age` seconds before
+    the newest one weighs 0.5 ** (age / half_life). Kept as a decayed weighted sum and total
+    weight as of the newest item, so adding an item is O(1).
+    """
+
+    def __init__(self, half_life_seconds):
+        self.half_life_seconds = half_life_seconds
+        self.as_of = None # Publication time of the newest item folded in
+        self.weighted_sum = 0.0
+        self.total_weight = 0.0
+        self.items = 0
+        self.seen = {} # item_id -> published_at, for items within the horizon
+
+    def _decay(self, seconds):
+        return math.pow(0.5, seconds / self.half_life_seconds)
+
+    @property
+    def horizon_start(self):
+        if self.as_of is None:
+            return None
+        return self.as_of - HORIZON_HALF_LIVES * self.half_life_seconds
+
+    def add(self, item_id, published_at, score):
+        """Folds in one scored item; returns False if it was already counted or is too old to matter."""
+        if item_id in self.seen or (self.as_of is not None and published_at < self.horizon_start):
+            return False
+        if self.as_of is None:
+            self.as_of = published_at
+        elif published_at > self.as_of:
+            factor = self._decay(published_at - self.as_of)
+            self.weighted_sum *= factor
+            self.total_weight *= factor
+            self.as_of = published_at
+            horizon_start = self.horizon_start
+            self.seen = {seen_id: seen_at for seen_id, seen_at in self.seen.items() if seen_at >= horizon_start}
+        weight = self._decay(self.as_of - published_at)
+        self.weighted_sum += weight * score
+        self.total_weight += weight
+        self.items += 1
+        self.seen[item_id] = published_at
+        return True
+
+    def is_new(self, item):
+        return item.item_id not in self.seen and (self.as_of is None or item.published_at >= self.horizon_start)
+
+    @property
+    def value(self):
+        return self.weighted_sum / self.total_weight if self.total_weight > 0 else 0.0
+
+    def to_dict(self):
+        return {"half_life_seconds": self.half_life_seconds, "as_of": self.as_of, "weighted_sum": self.weighted_sum,
+                "total_weight": self.total_weight, "items": self.items, "seen": self.seen}
+
+    @classmethod
+    def from_dict(cls, data):
+        aggregate = cls(data["half_life_seconds"])
+        aggregate.as_of = data["as_of"]
+        aggregate.weighted_sum = data["weighted_sum"]
+        aggregate.total_weight = data["total_weight"]
+        aggregate.items = data["items"]
+        aggregate.seen = data["seen"]
+        return aggregate
+
+class NewsSentimentTracker:
+    """
+    Per-ticker DecayedSentiment aggregates, fed from the news generators above and optionally
+    persisted to a SQLite file (db_path) so they survive restarts and are shared by worker
+    processes. Each update re-reads the stored state of its tickers, and folds the new items into
+    the state read again inside a write transaction, so concurrent writers add to each other's
+    items instead of overwriting them. Feed items of tickers nobody analyzes are kept up to
+    MAX_PENDING_FEED_TOTAL.
+    """
+
+    def __init__(self, half_life_days=7.0, db_path=None, feed_path=None):
+        self.half_life_seconds = half_life_days * SECONDS_PER_DAY
+        self.db_path = db_path
+        self.feed_reader = NewsFeedReader(feed_path) if feed_path else None
+        self._aggregates = {}
+        self._pending_feed_items = {} # ticker -> items read from the feed but not folded in yet, oldest ticker first
+        self._pending_count = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.items_scored = 0
+        if db_path:
+            directory = os.path.dirname(db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with self._connection() as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("CREATE TABLE IF NOT EXISTS news_sentiment (ticker TEXT PRIMARY KEY, state TEXT NOT NULL)")
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            self._local.conn = conn
+        return conn
+
+    def _load(self, ticker):
+        # Caller holds self._lock
+        aggregate = self._aggregates.get(ticker)
+        if aggregate is None:
+            aggregate = self._aggregates[ticker] = DecayedSentiment(self.half_life_seconds)
+        return aggregate
+
+    def _read_stored(self, tickers):
+        # Caller holds self._lock. Replaces the cached aggregates of tickers with their stored state,
+        # which other processes may have updated since it was last read.
+        conn = self._connection()
+        for start in range(0, len(tickers), STATE_READ_BATCH):
+            batch = tickers[start:start + STATE_READ_BATCH]
+            rows = conn.execute(f"SELECT ticker, state FROM news_sentiment WHERE ticker IN ({', '.join('?' * len(batch))})", batch)
+            for ticker, state in rows:
+                aggregate = DecayedSentiment.from_dict(json.loads(state))
+                if aggregate.half_life_seconds == self.half_life_seconds: # Else configuration changed: rebuild from the news still available
+                    self._aggregates[ticker] = aggregate
+
+    def _fold(self, scored_items):
+        # Caller holds self._lock. Oldest first, so the horizon only ever moves forward within a batch.
+        changed = {}
+        for item, score in sorted(scored_items, key=lambda pair: pair[0].published_at):
+            aggregate = self._load(item.ticker)
+            if aggregate.add(item.item_id, item.published_at, score):
+                changed[item.ticker] = aggregate
+        return changed
+
+    def _ingest_feed(self):
+        # Caller holds self._lock
+        if self.feed_reader is None:
+            return
+        for item in self.feed_reader.read_new():
+            pending = self._pending_feed_items.setdefault(item.ticker, [])
+            pending.append(item)
+            self._pending_count += 1
+            if len(pending) > MAX_PENDING_FEED_ITEMS:
+                self._pending_count -= len(pending) - MAX_PENDING_FEED_ITEMS
+                del pending[:len(pending) - MAX_PENDING_FEED_ITEMS]
+        while self._pending_count > MAX_PENDING_FEED_TOTAL:
+            self._pending_count -= len(self._pending_feed_items.pop(next(iter(self._pending_feed_items))))
+
+    def _take_pending(self, ticker):
+        # Caller holds self._lock
+        items = self._pending_feed_items.pop(ticker, [])
+        self._pending_count -= len(items)
+        return items
+
+    def update_many(self, aggregated_data, sentiment_analyzer):
+        """
+        Folds the news items not seen before for every stock into its aggregate, scoring all of
+        them with one sentiment_analyzer.score_texts call.
+        :param aggregated_data: List of DataAggregator dictionaries.
+        :return: List of decayed sentiment scores (same order), 0.0 for stocks without news.
+        """
+        fetched_at = time.time()
+        with self._lock:
+            self._ingest_feed()
+            if self.db_path:
+                self._read_stored(sorted({stock_data["ticker"] for stock_data in aggregated_data if stock_data.get("ticker")}))
+            new_items = []
+            queued = set()
+            for stock_data in aggregated_data:
+                ticker = stock_data.get("ticker")
+                if not ticker:
+                    continue
+                aggregate = self._load(ticker)
+                stock_items = list(iter_stock_news(stock_data, fetched_at)) + self._take_pending(ticker)
+                for item in stock_items:
+                    if item.item_id not in queued and aggregate.is_new(item):
+                        queued.add(item.item_id)
+                        new_items.append(item)
+
+        scores = sentiment_analyzer.score_texts([item.text for item in new_items]) if new_items else []
+
+        with self._lock:
+            if new_items and self.db_path:
+                conn = self._connection()
+                conn.execute("BEGIN IMMEDIATE") # Other processes' updates wait until this one is written
+                try:
+                    # Another process may have folded in items since the read above: add to its state
+                    self._read_stored(sorted({item.ticker for item in new_items}))
+                    changed = self._fold(zip(new_items, scores))
+                    conn.executemany("INSERT OR REPLACE INTO news_sentiment VALUES (?, ?)",
+                                     [(ticker, json.dumps(aggregate.to_dict())) for ticker, aggregate in changed.items()])
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+            else:
+                self._fold(zip(new_items, scores))
+            self.items_scored += len(new_items)
+            return [self._load(stock_data["ticker"]).value if stock_data.get("ticker") else 0.0 for stock_data in aggregated_data]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "tickers": len(self._aggregates),
+                "items_scored": self.items_scored,
+                "half_life_days": self.half_life_seconds / SECONDS_PER_DAY,
+                "pending_feed_items": self._pending_count,
+            }
+
+_news_sentiment_tracker = None
+_news_sentiment_tracker_lock = threading.Lock()
+
+def get_news_sentiment_tracker():
+    """
+    Returns the process-wide NewsSentimentTracker, or None when time-decayed sentiment is
+    disabled (NEWS_SENTIMENT_HALF_LIFE_DAYS = 0).
+    """
+    global _news_sentiment_tracker
+    half_life_days = current_app.config.get("NEWS_SENTIMENT_HALF_LIFE_DAYS", 7.0)
+    if not half_life_days:
+        return None
+    if _news_sentiment_tracker is None:
+        with _news_sentiment_tracker_lock:
+            if _news_sentiment_tracker is None:
+                _news_sentiment_tracker = NewsSentimentTracker(
+                    half_life_days=half_life_days,
+                    db_path=current_app.config.get("NEWS_SENTIMENT_DB_PATH") or None,
+                    feed_path=current_app.config.get("NEWS_FEED_PATH") or None,
+                )
+    return _news_sentiment_tracker
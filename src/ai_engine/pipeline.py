@@ -0,0 +1,285 @@
+# src/ai_engine/pipeline.py
+# A staged producer/consumer pipeline: each stage has its own worker threads and reads from a
+# bounded queue fed by the stage before it, so I/O-bound and CPU-bound stages overlap (item N+1
+# is fetched while item N is analyzed). Stages take micro-batches of whatever is waiting in their
+# queue, which keeps vectorized work (feature prefetch, sentiment scoring, rule evaluation)
+# batched. The number of items in flight is capped, so memory stays bounded however many
+# items are fed in, and results come out in input order.
+
+import itertools
+import queue
+import threading
+import time
+from collections import deque
+
+_DONE = object() # End-of-stream marker, one per worker of the receiving stage
+_POLL_SECONDS = 0.1
+_RECENT_RUNS = deque(maxlen=10)
+_active_runs = {}
+_runs_lock = threading.Lock()
+_run_ids = itertools.count(1)
+
+class Stage:
+    """
+    One pipeline stage.
+    :param func: Called with a list of items (at most batch_size); returns a list of results of the same length.
+    :param workers: Worker threads for this stage.
+    :param batch_size: Upper bound on items per call; a call takes whatever is already queued, without waiting to fill up.
+    """
+
+    def __init__(self, name, func, workers=1, batch_size=1):
+        self.name = name
+        self.func = func
+        self.workers = max(1, int(workers))
+        self.batch_size = max(1, int(batch_size))
+
+class _StageStats:
+    def __init__(self, stage, input_queue):
+        self.stage = stage
+        self.input_queue = input_queue
+        self.items_in = 0
+        self.items_out = 0
+        self.errors = 0
+        self.batches = 0
+        self.busy_seconds = 0.0
+        self.max_queue_depth = 0
+        self.lock = threading.Lock()
+
+    def snapshot(self, elapsed):
+        with self.lock:
+            return {
+                "stage": self.stage.name,
+                "workers": self.stage.workers,
+                "batch_size": self.stage.batch_size,
+                "queue_depth": self.input_queue.qsize(),
+                "max_queue_depth": self.max_queue_depth,
+                "items_in": self.items_in,
+                "items_out": self.items_out,
+                "errors": self.errors,
+                "batches": self.batches,
+                "busy_seconds": round(self.busy_seconds, 3),
+                "items_per_second": round(self.items_out / elapsed, 2) if elapsed > 0 else None,
+                # Share of the stage's worker time spent in func; near 1 means this stage is the bottleneck
+                "utilization": round(self.busy_seconds / (elapsed * self.stage.workers), 3) if elapsed > 0 else None,
+            }
+
+class StagedPipeline:
+    """
+    Runs items through stages in order. An item whose stage raises is handed to on_error(item,
+    exception), and what that returns is emitted as its result without running later stages.
+    :param queue_size: Capacity of each inter-stage queue.
+    :param max_in_flight: Items fed in but not yet returned to the caller (default: enough to keep every stage busy).
+    :param app: Flask app to push an app context for in worker threads (for current_app).
+    """
+
+    def __init__(self, name, stages, queue_size=64, max_in_flight=None, on_error=None, app=None):
+        self.name = name
+        self.stages = list(stages)
+        self.queue_size = max(1, int(queue_size))
+        self.max_in_flight = max_in_flight or self.queue_size * (len(self.stages) + 1) + sum(stage.workers * stage.batch_size for stage in self.stages)
+        self.on_error = on_error or (lambda item, exception: exception)
+        self.app = app
+        self._queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        self._output = queue.Queue() # Unbounded, but max_in_flight caps what can be in it
+        self._stats = [_StageStats(stage, input_queue) for stage, input_queue in zip(self.stages, self._queues)]
+        self._remaining_workers = [stage.workers for stage in self.stages]
+        self._remaining_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._started_at = None
+        self._finished_at = None
+        self._items_fed = 0
+        self._items_returned = 0
+        self._max_in_flight_seen = 0
+        self._feed_error = None
+
+    def _put(self, target, entry):
+        # Blocking put that gives up once the run is abandoned, so no thread is left stuck
+        while not self._stop.is_set():
+            try:
+                target.put(entry, timeout=_POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, source):
+        while not self._stop.is_set():
+            try:
+                return source.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    @staticmethod
+    def _call(stage, batch, is_last):
+        results = stage.func([item for _, item in batch])
+        if len(results) != len(batch):
+            raise RuntimeError(f"Stage {stage.name} returned {len(results)} results for {len(batch)} items")
+        return [(index, result, is_last, False) for (index, _), result in zip(batch, results)]
+
+    def _failed(self, item, exception):
+        # Failed items skip the remaining stages
+        try:
+            return self.on_error(item, exception)
+        except Exception as e:
+            return e
+
+    def _stage_worker(self, position):
+        if self.app is not None:
+            with self.app.app_context():
+                self._stage_loop(position)
+        else:
+            self._stage_loop(position)
+
+    def _stage_loop(self, position):
+        stage, stats = self.stages[position], self._stats[position]
+        source = self._queues[position]
+        is_last = position == len(self.stages) - 1
+        target = self._output if is_last else self._queues[position + 1]
+        finished = False
+        while not finished:
+            entry = self._get(source)
+            if entry is _DONE:
+                break
+            batch = [entry]
+            while len(batch) < stage.batch_size:
+                try:
+                    entry = source.get_nowait()
+                except queue.Empty:
+                    break
+                if entry is _DONE:
+                    finished = True
+                    break
+                batch.append(entry)
+
+            with stats.lock:
+                stats.items_in += len(batch)
+                stats.batches += 1
+            started = time.monotonic()
+            try:
+                outputs = self._call(stage, batch, is_last)
+            except Exception as e:
+                if len(batch) == 1:
+                    outputs = [(batch[0][0], self._failed(batch[0][1], e), True, True)]
+                else:
+                    # Retry one at a time, so one bad item does not fail the whole batch
+                    outputs = []
+                    for single in batch:
+                        try:
+                            outputs += self._call(stage, [single], is_last)
+                        except Exception as single_error:
+                            outputs.append((single[0], self._failed(single[1], single_error), True, True))
+            failed = sum(1 for _, _, _, error in outputs if error)
+            busy = time.monotonic() - started
+            with stats.lock:
+                stats.busy_seconds += busy
+                stats.items_out += len(batch) - failed
+                stats.errors += failed
+
+            for index, result, final, _ in outputs:
+                if not self._put(self._output if final else target, (index, result)):
+                    return
+                if not final:
+                    next_stats = self._stats[position + 1]
+                    next_stats.max_queue_depth = max(next_stats.max_queue_depth, target.qsize())
+        # The last worker of a stage to finish passes end-of-stream on to every worker of the next stage
+        with self._remaining_lock:
+            self._remaining_workers[position] -= 1
+            last_worker = self._remaining_workers[position] == 0
+        if last_worker and not is_last:
+            for _ in range(self.stages[position + 1].workers):
+                self._put(self._queues[position + 1], _DONE)
+        elif last_worker:
+            self._output.put(_DONE)
+
+    def _feed(self, items, in_flight):
+        if self.app is not None:
+            with self.app.app_context():
+                self._feed_items(items, in_flight)
+        else:
+            self._feed_items(items, in_flight)
+
+    def _feed_items(self, items, in_flight):
+        try:
+            for index, item in enumerate(items):
+                while not in_flight.acquire(timeout=_POLL_SECONDS):
+                    if self._stop.is_set():
+                        return
+                self._items_fed = index + 1
+                first_queue = self._queues[0]
+                if not self._put(first_queue, (index, item)):
+                    return
+                self._stats[0].max_queue_depth = max(self._stats[0].max_queue_depth, first_queue.qsize())
+        except Exception as e:
+            self._feed_error = e # Re-raised to the caller once the items already fed are through
+        finally:
+            for _ in range(self.stages[0].workers):
+                self._put(self._queues[0], _DONE)
+
+    def run(self, items):
+        """
+        Feeds items (any iterable, consumed lazily) through the stages.
+        :return: Generator of results in input order.
+        """
+        run_id = next(_run_ids)
+        in_flight = threading.BoundedSemaphore(self.max_in_flight)
+        self._started_at = time.monotonic()
+        threads = [threading.Thread(target=self._feed, args=(items, in_flight), name=f"{self.name}-feed", daemon=True)]
+        for position, stage in enumerate(self.stages):
+            threads += [threading.Thread(target=self._stage_worker, args=(position,), name=f"{self.name}-{stage.name}-{worker}", daemon=True)
+                        for worker in range(stage.workers)]
+        with _runs_lock:
+            _active_runs[run_id] = self
+        for thread in threads:
+            thread.start()
+
+        pending = {} # Results that finished ahead of an earlier item
+        next_index = 0
+        try:
+            while True:
+                entry = self._get(self._output)
+                if entry is _DONE:
+                    break
+                index, result = entry
+                pending[index] = result
+                self._max_in_flight_seen = max(self._max_in_flight_seen, self._items_fed - self._items_returned)
+                while next_index in pending:
+                    result = pending.pop(next_index)
+                    next_index += 1
+                    self._items_returned += 1
+                    in_flight.release()
+                    yield result
+            if self._feed_error is not None:
+                raise self._feed_error
+        finally:
+            self._stop.set() # Also reached when the caller stops iterating early
+            for thread in threads:
+                thread.join()
+            self._finished_at = time.monotonic()
+            with _runs_lock:
+                _active_runs.pop(run_id, None)
+                _RECENT_RUNS.append(self.stats())
+
+    def stats(self):
+        """Per-stage queue depth, throughput and utilization of this run (so far, if it is still running)."""
+        if self._started_at is None:
+            elapsed = 0.0
+        else:
+            elapsed = (self._finished_at or time.monotonic()) - self._started_at
+        return {
+            "pipeline": self.name,
+            "running": self._started_at is not None and self._finished_at is None,
+            "elapsed_seconds": round(elapsed, 3),
+            "items_fed": self._items_fed,
+            "items_returned": self._items_returned,
+            "max_in_flight": self.max_in_flight,
+            "max_in_flight_seen": self._max_in_flight_seen,
+            "stages": [stats.snapshot(elapsed) for stats in self._stats],
+        }
+
+def get_pipeline_stats():
+    """Stats of the pipelines running in this process and of the last few finished runs."""
+    with _runs_lock:
+        active = list(_active_runs.values())
+        recent = list(_RECENT_RUNS)
+    return {"running": [pipeline.stats() for pipeline in active], "recent": recent}
@@ -0,0 +1,350 @@
+# src/ai_engine/risk_engine.py
+# Portfolio-level risk: position weights, unrealized P&L, return covariance/correlation,
+# per-holding beta and historical/parametric value at risk.
+#
+# Daily returns of every ticker are aligned on a common index of trading days (UTC dates). The
+# covariance of the whole ticker universe seen by the process is kept as running sums over a
+# sliding window of days (ReturnCovariance), so a request only folds in the days and tickers that
+# changed since the previous one, O(changed days x n^2), instead of recomputing O(n^2 x T).
+
+import math
+import threading
+from collections import OrderedDict
+from statistics import NormalDist
+import numpy as np
+from flask import current_app
+
+SECONDS_PER_DAY = 86400
+TRADING_DAYS_PER_YEAR = 252
+DEFAULT_LOOKBACK_DAYS = 252
+DEFAULT_MAX_TICKERS = 500
+DEFAULT_CONFIDENCE_LEVELS = (0.95, 0.99)
+MIN_OBSERVATIONS = 20 # Fewer overlapping returns than this and no volatility/beta/VaR is reported
+
+def daily_returns(price_series):
+    """
+    Simple close-to-close returns of a PriceSeries, indexed by UTC day number (epoch seconds // 86400),
+    so exchanges that stamp their daily bars at different times of day still line up.
+    :return: (int64 day numbers, float64 returns), one entry per valid bar after the first.
+    """
+    if price_series is None or len(price_series) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    days = price_series.timestamps[price_series.valid] // SECONDS_PER_DAY
+    closes = price_series.valid_closes()
+    if len(days) > 1:
+        last_of_day = np.append(days[1:] != days[:-1], True) # Keep the last bar of a day (intraday revisions)
+        days, closes = days[last_of_day], closes[last_of_day]
+    if len(closes) < 2:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    return days[1:], closes[1:] / closes[:-1] - 1
+
+def align_returns(returns_by_ticker, days=None):
+    """
+    Lays out {ticker: (days, returns)} as a (days x tickers) matrix on a common index, NaN where a
+    ticker has no return for a day (not listed yet, exchange holiday).
+    :param days: Index to align on; defaults to the union of all tickers' days.
+    :return: (days, matrix), with columns in returns_by_ticker order.
+    """
+    if days is None:
+        days = np.unique(np.concatenate([ticker_days for ticker_days, _ in returns_by_ticker.values()] or [np.empty(0, dtype=np.int64)]))
+    matrix = np.full((len(days), len(returns_by_ticker)), np.nan)
+    for column, (ticker_days, returns) in enumerate(returns_by_ticker.values()):
+        rows = np.searchsorted(days, ticker_days)
+        inside = (rows < len(days)) & (days[np.minimum(rows, len(days) - 1)] == ticker_days) if len(days) else np.zeros(len(ticker_days), dtype=bool)
+        matrix[rows[inside], column] = returns[inside]
+    return days, matrix
+
+def _row_terms(rows):
+    # Per-row contributions to the pairwise sums: sum x_i x_j, sum x_i [j present], sum [i and j present]
+    present = ~np.isnan(rows)
+    values = np.where(present, rows, 0.0)
+    present = present.astype(np.float64)
+    return values.T @ values, values.T @ present, present.T @ present
+
+class ReturnCovariance:
+    """
+    Pairwise-complete covariance of daily returns for a universe of tickers over the last
+    `lookback_days` days of the common index. Keeps the aligned return window plus three running
+    (n x n) sums; days entering or leaving the window, or whose returns were revised, are added
+    and removed as row updates. The universe grows as tickers are seen and is capped at
+    max_tickers (least recently used tickers are dropped). Thread-safe.
+    """
+
+    def __init__(self, lookback_days=DEFAULT_LOOKBACK_DAYS, max_tickers=DEFAULT_MAX_TICKERS):
+        self.lookback_days = lookback_days
+        self.max_tickers = max_tickers
+        self.tickers = OrderedDict() # ticker -> column, in least recently used order
+        self.days = np.empty(0, dtype=np.int64)
+        self.returns = np.empty((0, 0))
+        self._sum_xx = np.zeros((0, 0))
+        self._sum_x = np.zeros((0, 0))
+        self._count = np.zeros((0, 0))
+        self._rows_since_rebuild = 0
+        self._lock = threading.Lock()
+        self.row_updates = 0
+        self.rebuilds = 0
+
+    def _apply(self, old_rows, new_rows):
+        if len(old_rows):
+            xx, x, n = _row_terms(old_rows)
+            self._sum_xx -= xx
+            self._sum_x -= x
+            self._count -= n
+        if len(new_rows):
+            xx, x, n = _row_terms(new_rows)
+            self._sum_xx += xx
+            self._sum_x += x
+            self._count += n
+        self.row_updates += max(len(old_rows), len(new_rows))
+        self._rows_since_rebuild += max(len(old_rows), len(new_rows))
+
+    def _rebuild(self):
+        # Recompute the sums from the window, so add/remove rounding cannot accumulate
+        self._sum_xx, self._sum_x, self._count = _row_terms(self.returns)
+        self._rows_since_rebuild = 0
+        self.rebuilds += 1
+
+    def _add_tickers(self, tickers):
+        new = [ticker for ticker in tickers if ticker not in self.tickers]
+        for ticker in new:
+            self.tickers[ticker] = len(self.tickers)
+        if new:
+            size = len(self.tickers)
+            self.returns = np.hstack([self.returns, np.full((len(self.days), len(new)), np.nan)])
+            for name in ("_sum_xx", "_sum_x", "_count"):
+                grown = np.zeros((size, size))
+                old = getattr(self, name)
+                grown[:old.shape[0], :old.shape[1]] = old
+                setattr(self, name, grown)
+        for ticker in tickers:
+            self.tickers.move_to_end(ticker)
+
+    def _evict(self, keep):
+        excess = len(self.tickers) - self.max_tickers
+        if excess <= 0:
+            return
+        evicted = [ticker for ticker in self.tickers if ticker not in keep][:excess]
+        if not evicted:
+            return
+        drop = [self.tickers[ticker] for ticker in evicted]
+        self.returns = np.delete(self.returns, drop, axis=1)
+        for name in ("_sum_xx", "_sum_x", "_count"):
+            setattr(self, name, np.delete(np.delete(getattr(self, name), drop, axis=0), drop, axis=1))
+        for ticker in evicted:
+            del self.tickers[ticker]
+        remaining = sorted(self.tickers.items(), key=lambda item: item[1]) # Renumber columns, keeping LRU order
+        columns = {ticker: column for column, (ticker, _) in enumerate(remaining)}
+        for ticker in self.tickers:
+            self.tickers[ticker] = columns[ticker]
+
+    def update(self, returns_by_ticker):
+        """
+        Folds {ticker: (days, returns)} (see daily_returns) into the window: new tickers become
+        columns, new days become rows (the oldest days beyond the lookback drop out), and only
+        rows whose returns differ from the stored ones update the running sums.
+        """
+        with self._lock:
+            self._add_tickers(list(returns_by_ticker))
+
+            supplied_days = [days for days, _ in returns_by_ticker.values()]
+            window_days = np.unique(np.concatenate([self.days] + supplied_days))[-self.lookback_days:]
+            dropped = ~np.isin(self.days, window_days)
+            if dropped.any():
+                self._apply(self.returns[dropped], [])
+                self.days, self.returns = self.days[~dropped], self.returns[~dropped]
+            added = window_days[~np.isin(window_days, self.days)]
+            if len(added):
+                order = np.argsort(np.concatenate([self.days, added]), kind="stable")
+                self.days = np.concatenate([self.days, added])[order]
+                self.returns = np.vstack([self.returns, np.full((len(added), len(self.tickers)), np.nan)])[order]
+
+            columns = [self.tickers[ticker] for ticker in returns_by_ticker]
+            _, supplied = align_returns(returns_by_ticker, self.days)
+            current = self.returns[:, columns]
+            differs = ~((current == supplied) | (np.isnan(current) & np.isnan(supplied)))
+            first_days = np.array([days[0] if len(days) else np.iinfo(np.int64).max for days, _ in returns_by_ticker.values()], dtype=np.int64)
+            differs &= self.days[:, None] >= first_days[None, :] # A shorter history leaves older stored returns alone
+            changed = np.flatnonzero(differs.any(axis=1))
+            if len(changed):
+                old_rows = self.returns[changed]
+                new_rows = old_rows.copy()
+                new_rows[:, columns] = np.where(differs[changed], supplied[changed], old_rows[:, columns])
+                self.returns[changed] = new_rows
+                self._apply(old_rows, new_rows)
+
+            self._evict(set(returns_by_ticker))
+            if self._rows_since_rebuild > self.lookback_days:
+                self._rebuild()
+
+    def moments(self, tickers):
+        """
+        Mean daily return, covariance matrix and pairwise observation counts for tickers (which
+        must have been passed to update), plus the aligned return window for those tickers.
+        :return: (means, covariance, counts, days, returns), all copies.
+        """
+        with self._lock:
+            columns = [self.tickers[ticker] for ticker in tickers]
+            index = np.ix_(columns, columns)
+            sum_xx, sum_x, count = self._sum_xx[index], self._sum_x[index], self._count[index]
+            days, returns = self.days.copy(), self.returns[:, columns]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            # Over the days both i and j have returns: cov = (sum x_i x_j - sum x_i * sum x_j / n) / (n - 1)
+            covariance = (sum_xx - sum_x * sum_x.T / count) / (count - 1)
+            means = np.diag(sum_x) / np.diag(count)
+        covariance[count < 2] = np.nan
+        return means, covariance, count, days, returns
+
+    def stats(self):
+        with self._lock:
+            return {
+                "tickers": len(self.tickers),
+                "max_tickers": self.max_tickers,
+                "days": int(len(self.days)),
+                "lookback_days": self.lookback_days,
+                "row_updates": self.row_updates,
+                "rebuilds": self.rebuilds,
+            }
+
+def _finite(value, digits):
+    return round(float(value), digits) if value is not None and math.isfinite(value) else None # NaN/inf -> None, for JSON
+
+class PortfolioRiskAnalyzer:
+    """
+    Risk report for one portfolio (a list of DataAggregator dictionaries, one per lot). Lots of the
+    same ticker are combined into one position for the covariance-based figures.
+    """
+
+    def __init__(self, covariance=None, confidence_levels=DEFAULT_CONFIDENCE_LEVELS, min_observations=MIN_OBSERVATIONS):
+        self.covariance = covariance or ReturnCovariance()
+        self.confidence_levels = tuple(confidence_levels)
+        self.min_observations = min_observations
+
+    @staticmethod
+    def _lot(stock_data):
+        price_series = stock_data.get("yahoo_finance", {}).get("price_series")
+        current_price = price_series.last_close if price_series is not None and len(price_series) else None
+        quantity = stock_data.get("quantity") or 0
+        purchase_price = stock_data.get("purchase_price")
+        # A merged position's purchase price is the average over its priced lots only, so cost and
+        # P&L are taken over those shares; a single lot is priced as a whole
+        priced_quantity = stock_data.get("priced_quantity")
+        cost_quantity = quantity if priced_quantity is None else priced_quantity
+        lot = {
+            "ticker": stock_data.get("ticker"),
+            "quantity": quantity,
+            "purchase_price": purchase_price,
+            "current_price": current_price,
+            "cost_basis": cost_quantity * purchase_price if purchase_price is not None else None,
+            "market_value": quantity * current_price if current_price is not None else None,
+            "unrealized_pnl": None,
+            "unrealized_pnl_percentage": None,
+        }
+        if current_price is not None and purchase_price:
+            lot["unrealized_pnl"] = cost_quantity * (current_price - purchase_price)
+            lot["unrealized_pnl_percentage"] = (current_price / purchase_price - 1) * 100
+        return lot
+
+    def analyze(self, aggregated_data):
+        """
+        :param aggregated_data: List of DataAggregator dictionaries (quantity, purchase_price, priced_quantity, price_series).
+        :return: {"holdings": [per-lot figures, in input order], "portfolio": {...}, "correlation": {...}}
+        """
+        lots = [self._lot(stock_data) for stock_data in aggregated_data]
+        total_cost = sum(lot["cost_basis"] for lot in lots if lot["cost_basis"] is not None)
+        total_value = sum(lot["market_value"] for lot in lots if lot["market_value"] is not None)
+        pnl_lots = [lot for lot in lots if lot["unrealized_pnl"] is not None]
+        pnl_cost = sum(lot["cost_basis"] for lot in pnl_lots)
+        for lot in lots:
+            lot["cost_weight"] = lot["cost_basis"] / total_cost if lot["cost_basis"] is not None and total_cost else None
+            lot["weight"] = lot["market_value"] / total_value if lot["market_value"] is not None and total_value else None
+
+        # Positions: market value per ticker, for tickers with enough price history
+        position_values = OrderedDict()
+        returns_by_ticker = {}
+        for stock_data, lot in zip(aggregated_data, lots):
+            ticker = lot["ticker"]
+            if lot["market_value"] is None or ticker is None:
+                continue
+            if ticker not in returns_by_ticker:
+                days, returns = daily_returns(stock_data.get("yahoo_finance", {}).get("price_series"))
+                if len(returns) == 0:
+                    continue
+                returns_by_ticker[ticker] = (days, returns)
+            position_values[ticker] = position_values.get(ticker, 0.0) + lot["market_value"]
+
+        portfolio = {
+            "total_cost_basis": _finite(total_cost, 2),
+            "total_market_value": _finite(total_value, 2),
+            "unrealized_pnl": _finite(sum(lot["unrealized_pnl"] for lot in pnl_lots), 2) if pnl_lots else None,
+            "unrealized_pnl_percentage": _finite(sum(lot["unrealized_pnl"] for lot in pnl_lots) / pnl_cost * 100, 2) if pnl_cost else None,
+            "observations": 0,
+            "volatility_annualized": None,
+            "var_historical": None,
+            "var_parametric": None,
+        }
+        betas, volatilities, correlation = {}, {}, None
+        tickers = list(position_values)
+        if tickers and total_value:
+            self.covariance.update(returns_by_ticker)
+            means, covariance, counts, _, window = self.covariance.moments(tickers)
+            weights = np.array([position_values[ticker] for ticker in tickers]) / total_value
+            covered = ~np.all(np.isnan(window), axis=1) # Days on which at least one position has a return
+            portfolio_returns = np.nan_to_num(window[covered]) @ weights # A position without a return that day counts as flat
+            observations = int(covered.sum())
+            portfolio["observations"] = observations
+
+            with np.errstate(invalid="ignore", divide="ignore"):
+                volatility = np.sqrt(np.diag(covariance))
+                correlation_matrix = np.clip(covariance / np.outer(volatility, volatility), -1.0, 1.0)
+            if observations >= self.min_observations:
+                filled = np.nan_to_num(covariance)
+                variance = max(float(weights @ filled @ weights), 0.0)
+                sigma, mu = math.sqrt(variance), float(np.nan_to_num(means) @ weights)
+                portfolio["volatility_annualized"] = _finite(sigma * math.sqrt(TRADING_DAYS_PER_YEAR), 4)
+                portfolio["var_historical"] = {
+                    str(level): _finite(-np.quantile(portfolio_returns, 1 - level) * total_value, 2) for level in self.confidence_levels
+                }
+                portfolio["var_parametric"] = {
+                    str(level): _finite((NormalDist().inv_cdf(level) * sigma - mu) * total_value, 2) for level in self.confidence_levels
+                }
+                # Beta of each position against the portfolio: cov(r_i, r_p) / var(r_p)
+                contributions = filled @ weights
+                for column, ticker in enumerate(tickers):
+                    betas[ticker] = _finite(contributions[column] / variance, 4) if variance > 0 and counts[column, column] >= self.min_observations else None
+                    volatilities[ticker] = _finite(volatility[column] * math.sqrt(TRADING_DAYS_PER_YEAR), 4)
+            correlation = {
+                "tickers": tickers,
+                "matrix": [[_finite(value, 4) for value in row] for row in correlation_matrix.tolist()],
+            }
+
+        holdings = []
+        for lot in lots:
+            holdings.append({
+                "ticker": lot["ticker"],
+                "quantity": lot["quantity"],
+                "current_price": _finite(lot["current_price"], 4),
+                "cost_basis": _finite(lot["cost_basis"], 2),
+                "market_value": _finite(lot["market_value"], 2),
+                "cost_weight": _finite(lot["cost_weight"], 6),
+                "current_holding_percentage": _finite(lot["weight"] * 100, 4) if lot["weight"] is not None else None,
+                "unrealized_pnl": _finite(lot["unrealized_pnl"], 2),
+                "unrealized_pnl_percentage": _finite(lot["unrealized_pnl_percentage"], 4),
+                "beta": betas.get(lot["ticker"]),
+                "volatility_annualized": volatilities.get(lot["ticker"]),
+            })
+        return {"holdings": holdings, "portfolio": portfolio, "correlation": correlation}
+
+_return_covariance = None
+_return_covariance_lock = threading.Lock()
+
+def get_return_covariance():
+    """Returns the process-wide ReturnCovariance, sized by RISK_LOOKBACK_DAYS and RISK_UNIVERSE_MAX_TICKERS."""
+    global _return_covariance
+    if _return_covariance is None:
+        with _return_covariance_lock:
+            if _return_covariance is None:
+                _return_covariance = ReturnCovariance(
+                    lookback_days=current_app.config.get("RISK_LOOKBACK_DAYS", DEFAULT_LOOKBACK_DAYS),
+                    max_tickers=current_app.config.get("RISK_UNIVERSE_MAX_TICKERS", DEFAULT_MAX_TICKERS),
+                )
+    return _return_covariance
@@ -0,0 +1,220 @@
+# src/ai_engine/rule_compiler.py
+# Declarative advice rules (see advice_rules.json) compiled into vectorized NumPy evaluation
+# over a (holdings x features) matrix.
+#
+# A rule set has "thresholds" (named numbers), a "default" outcome and an ordered list of
+# "rules". Each rule has:
+#   when       all-of conditions [feature, op, value]; value is a number, a threshold name or
+#              {"feature": name, "times": number or threshold name}. Missing features (NaN)
+#              never satisfy a condition.
+#   unless     names of earlier rules whose conditions exclude this one (if/elif chains)
+#   conflicts  [{"advice_in": [...], "then": action}]: the first branch whose advice_in holds
+#              the advice as it stood before this rule replaces the rule's own action
+#   then       action: "advice" label, "reason" template (or {"append": template}) formatted
+#              with the holding's features, and "confidence" {"set"|"max"|"min"|"add": number}
+#   enabled    false to keep a rule in the file without applying it
+# Rules apply in order; each sees the outcome of the rules before it.
+
+import json
+import string
+import numpy as np
+
+OPERATORS = {
+    "<": np.less, "<=": np.less_equal, ">": np.greater, ">=": np.greater_equal,
+    "==": np.equal, "!=": np.not_equal,
+}
+CONFIDENCE_MODES = ("set", "max", "min", "add")
+
+class RuleSetError(ValueError):
+    """Raised when a rule set is malformed."""
+
+def _template_fields(template):
+    return {field for _, field, _, _ in string.Formatter().parse(template) if field}
+
+class _Action:
+    __slots__ = ("advice", "reason", "append", "confidence_mode", "confidence_value")
+
+    def __init__(self, spec, advice_codes, reasons, rule_name):
+        advice = spec.get("advice")
+        self.advice = advice_codes.setdefault(advice, len(advice_codes)) if advice is not None else None
+        reason = spec.get("reason")
+        self.append = isinstance(reason, dict)
+        template = reason.get("append") if self.append else reason
+        if template is not None and not isinstance(template, str):
+            raise RuleSetError(f"Rule {rule_name}: reason must be a string or {{\"append\": string}}")
+        self.reason = None
+        if template is not None:
+            reasons.append(template)
+            self.reason = len(reasons) - 1
+        confidence = spec.get("confidence")
+        self.confidence_mode = None
+        if confidence is not None:
+            if not isinstance(confidence, dict) or len(confidence) != 1 or next(iter(confidence)) not in CONFIDENCE_MODES:
+                raise RuleSetError(f"Rule {rule_name}: confidence must be one of {CONFIDENCE_MODES} with a number")
+            self.confidence_mode, self.confidence_value = next(iter(confidence.items()))
+            self.confidence_value = float(self.confidence_value)
+
+class _Rule:
+    __slots__ = ("name", "enabled", "evaluated", "conditions", "unless", "conflicts", "action")
+
+class CompiledRuleSet:
+    """
+    A validated rule set ready for evaluation. `features` lists the matrix columns it reads,
+    in order; `thresholds` holds the named numbers the conditions use.
+    """
+
+    def __init__(self, spec):
+        if not isinstance(spec, dict) or not isinstance(spec.get("rules"), list):
+            raise RuleSetError("A rule set must be an object with a \"rules\" list")
+        self.thresholds = {name: float(value) for name, value in spec.get("thresholds", {}).items()}
+        self.advice_labels = {}
+        self.reasons = []
+        default = spec.get("default", {})
+        self.default_action = _Action(
+            {"advice": default.get("advice", "Hold"), "reason": default.get("reason", ""), "confidence": {"set": default.get("confidence", 0.5)}},
+            self.advice_labels, self.reasons, "default"
+        )
+
+        self.rules = []
+        rules_by_name = {}
+        for position, rule_spec in enumerate(spec["rules"]):
+            rule = _Rule()
+            rule.name = rule_spec.get("name") or f"rule_{position}"
+            rule.enabled = rule_spec.get("enabled", True)
+            rule.conditions = [self._compile_condition(condition, rule.name) for condition in rule_spec.get("when", [])]
+            if not rule.conditions:
+                raise RuleSetError(f"Rule {rule.name} has no conditions")
+            rule.unless = []
+            for name in rule_spec.get("unless", []):
+                if name not in rules_by_name:
+                    raise RuleSetError(f"Rule {rule.name}: unless refers to unknown or later rule {name}")
+                rule.unless.append(rules_by_name[name])
+            rule.conflicts = []
+            for conflict in rule_spec.get("conflicts", []):
+                advice_in = [self.advice_labels.setdefault(label, len(self.advice_labels)) for label in conflict.get("advice_in", [])]
+                rule.conflicts.append((advice_in, _Action(conflict.get("then", {}), self.advice_labels, self.reasons, rule.name)))
+            rule.action = _Action(rule_spec.get("then", {}), self.advice_labels, self.reasons, rule.name)
+            rules_by_name[rule.name] = rule
+            self.rules.append(rule)
+
+        # Conditions evaluated: those of enabled rules and of the rules they exclude via "unless"
+        evaluated = {id(rule) for rule in self.rules if rule.enabled}
+        evaluated |= {id(excluded) for rule in self.rules if rule.enabled for excluded in rule.unless}
+        features = []
+        for rule in self.rules:
+            rule.evaluated = id(rule) in evaluated
+            if not rule.evaluated:
+                continue
+            names = [feature for feature, _, _ in rule.conditions]
+            names += [operand[0] for _, _, operand in rule.conditions if isinstance(operand, tuple)]
+            if rule.enabled:
+                for action in [rule.action] + [action for _, action in rule.conflicts]:
+                    if action.reason is not None:
+                        names += sorted(_template_fields(self.reasons[action.reason]))
+            for name in names:
+                if name not in features:
+                    features.append(name)
+        self.features = tuple(features)
+        self.reason_fields = [_template_fields(template) for template in self.reasons]
+        self.advice_names = {code: label for label, code in self.advice_labels.items()}
+
+    def _resolve_number(self, value, rule_name):
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return float(value)
+        if isinstance(value, str) and value in self.thresholds:
+            return self.thresholds[value]
+        raise RuleSetError(f"Rule {rule_name}: {value!r} is neither a number nor a threshold name")
+
+    def _compile_condition(self, condition, rule_name):
+        if not isinstance(condition, list) or len(condition) != 3 or condition[1] not in OPERATORS:
+            raise RuleSetError(f"Rule {rule_name}: conditions are [feature, operator, value] with operator in {tuple(OPERATORS)}")
+        feature, operator, value = condition
+        if isinstance(value, dict):
+            operand = (value["feature"], self._resolve_number(value.get("times", 1), rule_name)) # Another feature, scaled
+        else:
+            operand = self._resolve_number(value, rule_name)
+        return feature, OPERATORS[operator], operand
+
+    def _condition_mask(self, rule, columns):
+        mask = None
+        with np.errstate(invalid="ignore"):
+            for feature, operator, operand in rule.conditions:
+                right = columns[operand[0]] * operand[1] if isinstance(operand, tuple) else operand
+                condition = operator(columns[feature], right)
+                mask = condition if mask is None else mask & condition
+        return mask
+
+    def evaluate(self, matrix):
+        """
+        Applies the rules to every row of matrix (columns in self.features order) at once.
+        :return: (advice codes, reason codes, list of (append reason code, mask), confidence),
+                 the first two and the last as arrays with one entry per row.
+        """
+        rows = matrix.shape[0]
+        columns = {name: matrix[:, index] for index, name in enumerate(self.features)}
+        advice = np.full(rows, self.default_action.advice, dtype=np.int64)
+        reason = np.full(rows, self.default_action.reason, dtype=np.int64)
+        confidence = np.full(rows, self.default_action.confidence_value)
+        appended = []
+        condition_masks = {}
+
+        for rule in self.rules:
+            if not rule.evaluated:
+                continue
+            mask = self._condition_mask(rule, columns)
+            condition_masks[rule.name] = mask
+            if not rule.enabled:
+                continue
+            for excluded in rule.unless:
+                mask = mask & ~condition_masks[excluded.name]
+            if not mask.any():
+                continue
+
+            remaining = mask.copy()
+            branches = []
+            for advice_in, action in rule.conflicts:
+                branch = remaining & np.isin(advice, advice_in) # Advice as it stood before this rule
+                branches.append((branch, action))
+                remaining &= ~branch
+            branches.append((remaining, rule.action))
+
+            for branch, action in branches:
+                if not branch.any():
+                    continue
+                if action.advice is not None:
+                    advice[branch] = action.advice
+                if action.reason is not None and action.append:
+                    appended.append((action.reason, branch))
+                elif action.reason is not None:
+                    reason[branch] = action.reason
+                    appended = [(code, append_mask & ~branch) for code, append_mask in appended] # Replaced reasons drop earlier appends
+                if action.confidence_mode == "set":
+                    confidence[branch] = action.confidence_value
+                elif action.confidence_mode == "max":
+                    confidence[branch] = np.maximum(confidence[branch], action.confidence_value)
+                elif action.confidence_mode == "min":
+                    confidence[branch] = np.minimum(confidence[branch], action.confidence_value)
+                elif action.confidence_mode == "add":
+                    confidence[branch] = np.clip(confidence[branch] + action.confidence_value, 0.0, 1.0)
+        return advice, reason, appended, confidence
+
+    def format_reason(self, code, values):
+        """Fills a reason template with a holding's feature values ({name: float})."""
+        template = self.reasons[code]
+        return template.format(**values) if self.reason_fields[code] else template
+
+def load_rule_set(path, threshold_overrides=None):
+    """
+    Reads and compiles a rules file.
+    :param threshold_overrides: Optional {threshold name: value} replacing values from the file.
+    """
+    with open(path, "r", encoding="utf-8") as rules_file:
+        try:
+            spec = json.load(rules_file)
+        except ValueError as e:
+            raise RuleSetError(f"{path} is not valid JSON: {e}")
+    for name, value in (threshold_overrides or {}).items():
+        if name not in spec.get("thresholds", {}):
+            raise RuleSetError(f"Unknown threshold {name}")
+        spec["thresholds"][name] = value
+    return CompiledRuleSet(spec)
@@ -1,122 +1,128 @@
 # src/ai_engine/rule_engine.py
 
+import math
+import os
+import threading
+import numpy as np
 from flask import current_app
+from .rule_compiler import RuleSetError, load_rule_set
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(__file__), "advice_rules.json")
+SENTIMENT_COLUMN = "sentiment_score" # Supplied by the caller rather than read from the features
+DETAIL_FEATURES = ("rsi_14_day",) # Reported in every recommendation's details
+
+_rule_sets = {} # path -> (file mtime, CompiledRuleSet)
+_rule_sets_lock = threading.Lock()
+
+def get_rule_set(path):
+    """
+    Returns the compiled rules in path, recompiling them whenever the file changes so edited
+    thresholds and rules take effect without a restart. If an edit leaves the file invalid,
+    the previously compiled rules stay in use (and the error is logged) until it is fixed.
+    """
+    mtime = os.stat(path).st_mtime_ns
+    cached = _rule_sets.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with _rule_sets_lock:
+        cached = _rule_sets.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        try:
+            rule_set = load_rule_set(path)
+        except (RuleSetError, OSError) as e:
+            if cached is None:
+                raise
+            current_app.logger.error(f"Advice rules in {path} are invalid, keeping the previous version: {e}")
+            _rule_sets[path] = (mtime, cached[1]) # Do not retry until the file changes again
+            return cached[1]
+        _rule_sets[path] = (mtime, rule_set)
+        current_app.logger.info(f"Loaded {len(rule_set.rules)} advice rules from {path}")
+        return rule_set
+
+def _as_float(value):
+    if isinstance(value, (int, float, np.number)) and not isinstance(value, bool):
+        return float(value)
+    return math.nan
 
 class RuleEngine:
-    def __init__(self):
+    def __init__(self, rules_path=None):
+        # Thresholds and rules live in a declarative rules file (see rule_compiler)
+        self.rules_path = rules_path or current_app.config.get("ADVICE_RULES_PATH") or DEFAULT_RULES_PATH
         current_app.logger.info("RuleEngine initialized.")
-        # Define thresholds or more complex rule configurations here if needed
-        self.thresholds = {
-            "rsi_oversold": 30,
-            "rsi_overbought": 70,
-            "sentiment_positive_strong": 0.5,
-            "sentiment_negative_strong": -0.5,
-            "pe_ratio_low_threshold": 15, # Example: Lower P/E might indicate undervaluation
-            "pe_ratio_high_threshold": 25, # Example: Higher P/E might indicate overvaluation
-            "moving_avg_short_vs_long_buy_signal_margin": 1.02, # e.g. short term MA is 2% above long term MA
-            "moving_avg_short_vs_long_sell_signal_margin": 0.98 # e.g. short term MA is 2% below long term MA
-        }
 
-    def generate_advice(self, ticker, engineered_features, sentiment_score, market_data):
-        """
-        Applies a set of rules to the engineered features and sentiment score 
-        to generate buy/sell/hold advice for a given stock.
-        `market_data` is the aggregated data which might include price, P/E, etc.
-        `engineered_features` might include RSI, moving averages, etc.
-        """
-        advice = "Hold"
-        reason = "Default recommendation; no strong signals detected."
-        confidence_score = 0.5 # Neutral confidence
+    @property
+    def rule_set(self):
+        return get_rule_set(self.rules_path)
 
-        # --- Basic Price & Volume checks (from market_data if available) ---
-        # Example: Check for unusual volume spikes if volume data is present
-        # current_price = market_data.get("chart", {}).get("meta", {}).get("regularMarketPrice")
-        # current_volume = market_data.get("chart", {}).get("meta", {}).get("regularMarketVolume")
-        # historical_avg_volume = engineered_features.get("average_volume_30d") # Assuming this feature exists
-        # if current_volume and historical_avg_volume and current_volume > historical_avg_volume * 2:
-        #     reason += " Significant volume spike detected."
-        #     confidence_score = min(1.0, confidence_score + 0.1)
+    @property
+    def thresholds(self):
+        return self.rule_set.thresholds
 
-        # --- Sentiment-based rules ---
-        if sentiment_score > self.thresholds["sentiment_positive_strong"]:
-            advice = "Consider Buy"
-            reason = "Strong positive sentiment detected from news and analyst opinions."
-            confidence_score = 0.7
-        elif sentiment_score < self.thresholds["sentiment_negative_strong"]:
-            advice = "Consider Sell"
-            reason = "Strong negative sentiment detected from news and analyst opinions."
-            confidence_score = 0.7
+    @property
+    def required_features(self):
+        """Features generate_advice reads; they are prefetched in bulk, anything else is computed on demand."""
+        names = [name for name in self.rule_set.features if name != SENTIMENT_COLUMN]
+        return tuple(names + [name for name in DETAIL_FEATURES if name not in names])
 
-        # --- Technical Indicator-based rules (from engineered_features) ---
-        rsi = engineered_features.get("rsi_14d")
-        if rsi is not None:
-            if rsi < self.thresholds["rsi_oversold"]:
-                if advice == "Consider Sell": # Conflicting signals
-                    advice = "Hold"
-                    reason = f"Conflicting signals: RSI ({rsi:.2f}) indicates oversold, but sentiment is negative. Recommending Hold."
-                    confidence_score = 0.4
-                else:
-                    advice = "Buy"
-                    reason = f"RSI ({rsi:.2f}) indicates the stock may be oversold."
-                    confidence_score = max(confidence_score, 0.75)
-            elif rsi > self.thresholds["rsi_overbought"]:
-                if advice == "Consider Buy": # Conflicting signals
-                    advice = "Hold"
-                    reason = f"Conflicting signals: RSI ({rsi:.2f}) indicates overbought, but sentiment is positive. Recommending Hold."
-                    confidence_score = 0.4
-                else:
-                    advice = "Sell"
-                    reason = f"RSI ({rsi:.2f}) indicates the stock may be overbought."
-                    confidence_score = max(confidence_score, 0.75)
-        
-        # --- Moving Average Crossover (from engineered_features) ---
-        # sma_short = engineered_features.get("sma_20d")
-        # sma_long = engineered_features.get("sma_50d")
-        # if sma_short and sma_long:
-        #     if sma_short > sma_long * self.thresholds["moving_avg_short_vs_long_buy_signal_margin"]:
-        #         # Golden Cross (simplified)
-        #         if advice == "Sell" or advice == "Consider Sell":
-        #             advice = "Hold"
-        #             reason = f"Conflicting signals: SMA crossover suggests bullish, but other indicators bearish. Hold."
-        #             confidence_score = 0.4
-        #         else:
-        #             advice = "Buy"
-        #             reason += " Short-term moving average crossed above long-term, potential bullish signal."
-        #             confidence_score = min(1.0, confidence_score + 0.15)
-        #     elif sma_short < sma_long * self.thresholds["moving_avg_short_vs_long_sell_signal_margin"]:
-        #         # Death Cross (simplified)
-        #         if advice == "Buy" or advice == "Consider Buy":
-        #             advice = "Hold"
-        #             reason = f"Conflicting signals: SMA crossover suggests bearish, but other indicators bullish. Hold."
-        #             confidence_score = 0.4
-        #         else:
-        #             advice = "Sell"
-        #             reason += " Short-term moving average crossed below long-term, potential bearish signal."
-        #             confidence_score = min(1.0, confidence_score + 0.15)
+    @staticmethod
+    def build_feature_matrix(rule_set, features_list, sentiment_scores):
+        """Lays out the (holdings x rule features) float matrix, with NaN for missing values."""
+        matrix = np.full((len(features_list), len(rule_set.features)), np.nan)
+        for column, name in enumerate(rule_set.features):
+            if name == SENTIMENT_COLUMN:
+                matrix[:, column] = [_as_float(score) for score in sentiment_scores]
+            else:
+                matrix[:, column] = [_as_float(features.get(name)) for features in features_list]
+        return matrix
 
-        # --- Fundamental data based rules (example, if P/E ratio is available in market_data -> insights) ---
-        # pe_ratio = market_data.get("insights", {}).get("valuation", {}).get("peRatio") # Path might vary
-        # if pe_ratio:
-        #     if pe_ratio < self.thresholds["pe_ratio_low_threshold"] and sentiment_score > 0:
-        #         reason += f" Potentially undervalued with P/E of {pe_ratio:.2f} and positive sentiment."
-        #         if advice == "Hold" or advice == "Consider Buy": advice = "Buy"
-        #         confidence_score = min(1.0, confidence_score + 0.1)
-        #     elif pe_ratio > self.thresholds["pe_ratio_high_threshold"] and sentiment_score < 0:
-        #         reason += f" Potentially overvalued with P/E of {pe_ratio:.2f} and negative sentiment."
-        #         if advice == "Hold" or advice == "Consider Sell": advice = "Sell"
-        #         confidence_score = min(1.0, confidence_score + 0.1)
+    def generate_advice_batch(self, tickers, features_list, sentiment_scores, market_data_list=None):
+        """
+        Applies the rule set to many holdings at once: conditions and actions are evaluated as
+        NumPy operations over the feature matrix, then one recommendation dict is built per holding.
+        :param tickers: Ticker per holding.
+        :param features_list: Engineered features per holding (dicts or LazyFeatures mappings).
+        :param sentiment_scores: Sentiment score per holding.
+        :param market_data_list: Optional aggregated data per holding (for the current price).
+        :return: List of recommendation dicts, in holding order.
+        """
+        rule_set = self.rule_set
+        market_data_list = market_data_list or [None] * len(tickers)
+        matrix = self.build_feature_matrix(rule_set, features_list, sentiment_scores)
+        advice_codes, reason_codes, appended, confidence = rule_set.evaluate(matrix)
+
+        results = []
+        for row, (ticker, engineered_features, sentiment_score, market_data) in enumerate(zip(tickers, features_list, sentiment_scores, market_data_list)):
+            values = dict(zip(rule_set.features, matrix[row].tolist()))
+            reason = rule_set.format_reason(reason_codes[row], values)
+            reason += "".join(rule_set.format_reason(code, values) for code, mask in appended if mask[row])
+
+            price_series = (market_data or {}).get("yahoo_finance", {}).get("price_series")
+            current_price = price_series.last_close if price_series is not None else engineered_features.get("current_price")
+            rsi = engineered_features.get("rsi_14_day")
+            results.append({
+                "symbol": ticker,
+                "recommendation": rule_set.advice_names[int(advice_codes[row])],
+                "reason": reason.strip(),
+                "confidence_score": round(float(confidence[row]), 2),
+                "details": {
+                    "rsi_14d": f"{rsi:.2f}" if rsi is not None else "N/A",
+                    "sentiment_score": f"{sentiment_score:.4f}",
+                    "current_price": f"{current_price:.2f}" if current_price is not None else "N/A",
+                    # Add other relevant features/data points used in decision making
+                }
+            })
+        current_app.logger.info(f"Generated recommendations for {len(results)} holdings with {len(rule_set.rules)} rules")
+        return results
 
-        result = {
-            "symbol": ticker,
-            "recommendation": advice,
-            "reason": reason.strip(),
-            "confidence_score": round(confidence_score, 2),
-            "details": {
-                "rsi_14d": f"{rsi:.2f}" if rsi is not None else "N/A",
-                "sentiment_score": f"{sentiment_score:.4f}",
-                # Add other relevant features/data points used in decision making
-            }
-        }
+    def generate_advice(self, ticker, engineered_features, sentiment_score, market_data):
+        """
+        Applies the rules to the engineered features and sentiment score
+        to generate buy/sell/hold advice for a given stock.
+        `market_data` is the aggregated data which might include price, P/E, etc.
+        `engineered_features` might include RSI, moving averages, etc. It may be a plain dict or a
+        LazyFeatures mapping, in which case only the features the rules read are computed.
+        """
+        result = self.generate_advice_batch([ticker], [engineered_features], [sentiment_score], [market_data])[0]
         current_app.logger.info(f"Generated recommendation for {ticker}: {result['recommendation']} with confidence {result['confidence_score']}")
         return result
-
@@ -1,15 +1,132 @@
 # src/ai_engine/sentiment_analyzer.py
 
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from flask import current_app
 # Ensure vaderSentiment is installed and in requirements.txt
 # pip install vaderSentiment
 from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+from .sentiment_cache import SentimentScoreCache, lexicon_version
+
+_vader_analyzer = None
+_vader_lexicon_version = None
+_vader_lock = threading.Lock()
+
+def get_vader_analyzer():
+    """
+    Returns this process's SentimentIntensityAnalyzer and its lexicon version. The lexicon and
+    emoji files are parsed once; loading it in the gunicorn master (see preload in src/main.py)
+    lets forked workers share those pages copy-on-write instead of each parsing its own copy.
+    """
+    global _vader_analyzer, _vader_lexicon_version
+    if _vader_analyzer is None:
+        with _vader_lock:
+            if _vader_analyzer is None:
+                analyzer = SentimentIntensityAnalyzer()
+                _vader_lexicon_version = lexicon_version(analyzer)
+                _vader_analyzer = analyzer
+    return _vader_analyzer, _vader_lexicon_version
+
+def _score_chunk(texts):
+    # Runs in a pool process, which has (or loads) its own shared analyzer
+    analyzer, _ = get_vader_analyzer()
+    return [analyzer.polarity_scores(text)["compound"] for text in texts]
+
+_process_pool = None
+_process_pool_pid = None
+_process_pool_lock = threading.Lock()
+
+def get_sentiment_process_pool(workers):
+    """Returns this process's scoring pool (created on first use, and again after a fork)."""
+    global _process_pool, _process_pool_pid
+    if _process_pool_pid != os.getpid():
+        with _process_pool_lock:
+            if _process_pool_pid != os.getpid():
+                _process_pool = ProcessPoolExecutor(max_workers=workers)
+                _process_pool_pid = os.getpid()
+    return _process_pool
 
 class SentimentAnalyzer:
-    def __init__(self):
-        self.analyzer = SentimentIntensityAnalyzer()
+    def __init__(self, cache=None, process_workers=0, process_min_texts=2000):
+        self.analyzer, self.lexicon_version = get_vader_analyzer()
+        # Optional SentimentScoreCache: texts already scored (by this or another session) are not re-scored
+        self.cache = cache
+        # Batches of at least process_min_texts uncached texts are sharded across process_workers
+        # processes (0 disables the pool)
+        self.process_workers = process_workers
+        self.process_min_texts = process_min_texts
         current_app.logger.info("SentimentAnalyzer initialized with VADER.")
 
+    def _polarity_compounds(self, texts):
+        """Compound scores of texts (same order), sharded across the process pool for large batches."""
+        if self.process_workers > 1 and len(texts) >= max(self.process_min_texts, 2):
+            try:
+                pool = get_sentiment_process_pool(self.process_workers)
+                chunk_size = -(-len(texts) // self.process_workers) # Ceiling division: one shard per worker
+                chunks = [texts[start:start + chunk_size] for start in range(0, len(texts), chunk_size)]
+                return [score for chunk_scores in pool.map(_score_chunk, chunks) for score in chunk_scores]
+            except Exception as e:
+                current_app.logger.warning(f"Process pool sentiment scoring failed, scoring in-process: {e}")
+        return [self.analyzer.polarity_scores(text)["compound"] for text in texts]
+
+    @staticmethod
+    def _extract_text(text_item):
+        """Returns the text of a headline string or an opinion dict, or "" if there is none."""
+        if isinstance(text_item, dict):
+            # Try to extract text from common keys if it's a list of opinion dicts
+            actual_text = text_item.get("abstract", text_item.get("headline", text_item.get("title", "")))
+        else:
+            actual_text = text_item
+        return actual_text if actual_text and isinstance(actual_text, str) else ""
+
+    def score_texts(self, texts):
+        """
+        Returns the VADER compound score of every text (same order). Each distinct text is scored
+        at most once per call, and not at all if the cache already holds its score.
+        :param texts: List of strings.
+        """
+        if self.cache is None:
+            return self._polarity_compounds(texts)
+
+        keys = [SentimentScoreCache.make_key(text, self.lexicon_version) for text in texts]
+        try:
+            scores = self.cache.get_many(list(dict.fromkeys(keys)))
+        except Exception as e:
+            current_app.logger.warning(f"Sentiment cache lookup failed, scoring without it: {e}")
+            scores = {}
+        uncached = {}
+        for key, text in zip(keys, texts):
+            if key not in scores and key not in uncached:
+                uncached[key] = text
+        new_scores = dict(zip(uncached, self._polarity_compounds(list(uncached.values()))))
+        try:
+            self.cache.set_many(new_scores)
+        except Exception as e:
+            current_app.logger.warning(f"Sentiment cache write failed: {e}")
+        scores.update(new_scores)
+        return [scores[key] for key in keys]
+
+    def analyze_sentiment_batch(self, text_lists):
+        """
+        Aggregated sentiment scores for several stocks at once: every text of every stock goes
+        through one score_texts call, so texts shared between stocks are scored once.
+        :param text_lists: List (one per stock) of texts as accepted by analyze_sentiment.
+        :return: List of average compound scores, 0.0 for stocks without usable text.
+        """
+        per_stock = [[self._extract_text(item) for item in (texts or [])] for texts in text_lists]
+        per_stock = [[text for text in texts if text] for texts in per_stock]
+        try:
+            scores = iter(self.score_texts([text for texts in per_stock for text in texts]))
+        except Exception as e:
+            current_app.logger.error(f"Error during batch sentiment analysis: {e}")
+            return [0.0] * len(per_stock)
+        results = []
+        for texts in per_stock:
+            stock_scores = [next(scores) for _ in texts]
+            results.append(sum(stock_scores) / len(stock_scores) if stock_scores else 0.0)
+        return results
+
     def analyze_sentiment(self, texts):
         """
         Analyzes the sentiment of a given text or list of texts (e.g., news headlines, analyst opinions).
@@ -25,19 +142,14 @@ class SentimentAnalyzer:
         
         compound_scores = []
         try:
+            actual_texts = []
             for text_item in texts: # texts could be a list of strings or a list of dicts
-                actual_text = ""
-                if isinstance(text_item, dict):
-                    # Try to extract text from common keys if it's a list of opinion dicts
-                    actual_text = text_item.get("abstract", text_item.get("headline", text_item.get("title", "")))
-                elif isinstance(text_item, str):
-                    actual_text = text_item
-                
-                if actual_text and isinstance(actual_text, str):
-                    vs = self.analyzer.polarity_scores(actual_text)
-                    compound_scores.append(vs["compound"])
+                actual_text = self._extract_text(text_item)
+                if actual_text:
+                    actual_texts.append(actual_text)
                 else:
                     current_app.logger.debug(f"Skipping non-string or empty item in sentiment analysis: {text_item}")
+            compound_scores = self.score_texts(actual_texts)
 
         except Exception as e:
             # Ensure text_excerpt is well-defined for logging
@@ -0,0 +1,130 @@
+# src/ai_engine/sentiment_cache.py
+
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from flask import current_app
+
+DEFAULT_MAX_ENTRIES = 50000
+
+def normalize_text(text):
+    """
+    Collapses runs of whitespace and trims the ends. Case and punctuation are kept because
+    VADER scores them (capitalised words and "!" amplify sentiment).
+    """
+    return " ".join(text.split())
+
+def lexicon_version(analyzer):
+    """Short fingerprint of a SentimentIntensityAnalyzer's lexicon and emoji files."""
+    digest = hashlib.sha256()
+    # vaderSentiment keeps the raw file contents in these (misleadingly named) attributes
+    digest.update(analyzer.lexicon_full_filepath.encode("utf-8"))
+    digest.update(analyzer.emoji_full_filepath.encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+class SentimentScoreCache:
+    """
+    LRU cache of VADER compound scores keyed by a hash of the normalized text and the lexicon
+    version, so a lexicon change never serves old scores. With db_path set, scores are also
+    persisted to a SQLite file that survives restarts and is shared by worker processes.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, db_path=None):
+        self.max_entries = max_entries
+        self.db_path = db_path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+        if db_path:
+            directory = os.path.dirname(db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with self._connection() as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("CREATE TABLE IF NOT EXISTS sentiment_scores (text_key TEXT PRIMARY KEY, compound REAL NOT NULL)")
+
+    @staticmethod
+    def make_key(text, version):
+        return f"{version}:{hashlib.sha1(normalize_text(text).encode('utf-8')).hexdigest()}"
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            self._local.conn = conn
+        return conn
+
+    def _remember(self, key, score):
+        # Caller holds self._lock
+        self._entries[key] = score
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_many(self, keys):
+        """Returns {key: compound score} for the keys that are cached (memory first, then disk)."""
+        found = {}
+        with self._lock:
+            for key in keys:
+                score = self._entries.get(key)
+                if score is not None:
+                    self._entries.move_to_end(key)
+                    found[key] = score
+        remaining = [key for key in keys if key not in found]
+        if remaining and self.db_path:
+            for start in range(0, len(remaining), 500): # Stay below SQLite's bound parameter limit
+                chunk = remaining[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._connection().execute(
+                    f"SELECT text_key, compound FROM sentiment_scores WHERE text_key IN ({placeholders})", chunk
+                ).fetchall()
+                with self._lock:
+                    for key, score in rows:
+                        self._remember(key, score)
+                        found[key] = score
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def set_many(self, scores):
+        """Stores {key: compound score}."""
+        if not scores:
+            return
+        with self._lock:
+            for key, score in scores.items():
+                self._remember(key, score)
+        if self.db_path:
+            with self._connection() as conn:
+                conn.executemany("INSERT OR REPLACE INTO sentiment_scores VALUES (?, ?)", list(scores.items()))
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "persistent": bool(self.db_path),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+_sentiment_cache = None
+_sentiment_cache_lock = threading.Lock()
+
+def get_sentiment_cache():
+    """Returns the process-wide SentimentScoreCache, configured from the app config on first use."""
+    global _sentiment_cache
+    if _sentiment_cache is None:
+        with _sentiment_cache_lock:
+            if _sentiment_cache is None:
+                _sentiment_cache = SentimentScoreCache(
+                    max_entries=current_app.config.get("SENTIMENT_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES),
+                    db_path=current_app.config.get("SENTIMENT_CACHE_DB_PATH") or None,
+                )
+    return _sentiment_cache
@@ -0,0 +1,234 @@
+# src/ai_engine/streaming_indicators.py
+# Stateful technical indicators that are updated one bar at a time in O(1) and can be persisted.
+# Definitions match FeatureEngineer / batch_indicators (simple-mean RSI by default, EMAs seeded
+# with the first observation as pandas ewm(adjust=False) does).
+
+import copy
+import numpy as np
+
+class StreamingSMA:
+    """Simple moving average over a fixed window, backed by a ring buffer and a running sum."""
+
+    def __init__(self, window):
+        self.window = window
+        self.buffer = np.zeros(window)
+        self.count = 0 # Total values seen
+        self.total = 0.0
+
+    def update(self, value):
+        index = self.count % self.window
+        if self.count >= self.window:
+            self.total -= self.buffer[index]
+        self.buffer[index] = value
+        self.total += value
+        self.count += 1
+        if index == self.window - 1:
+            self.total = float(self.buffer.sum()) # Re-anchor once per lap so rounding error cannot accumulate
+        return self.value
+
+    @property
+    def value(self):
+        return self.total / self.window if self.count >= self.window else None
+
+    def to_dict(self):
+        return {"window": self.window, "buffer": self.buffer.tolist(), "count": self.count, "total": self.total}
+
+    @classmethod
+    def from_dict(cls, data):
+        sma = cls(data["window"])
+        sma.buffer = np.array(data["buffer"], dtype=np.float64)
+        sma.count = data["count"]
+        sma.total = data["total"]
+        return sma
+
+class StreamingEMA:
+    """Exponential moving average with span-based smoothing, seeded by the first value."""
+
+    def __init__(self, span):
+        self.span = span
+        self.alpha = 2.0 / (span + 1)
+        self.value = None
+        self.count = 0
+
+    def update(self, value):
+        self.value = value if self.value is None else self.alpha * value + (1 - self.alpha) * self.value
+        self.count += 1
+        return self.value
+
+    def to_dict(self):
+        return {"span": self.span, "value": self.value, "count": self.count}
+
+    @classmethod
+    def from_dict(cls, data):
+        ema = cls(data["span"])
+        ema.value = data["value"]
+        ema.count = data["count"]
+        return ema
+
+class StreamingRSI:
+    """
+    Relative Strength Index over `window` price changes.
+    smoothing="simple" uses rolling means of gains/losses (as FeatureEngineer.calculate_rsi);
+    smoothing="wilder" uses Wilder's recursive smoothing, seeded with the first window's means.
+    """
+
+    def __init__(self, window=14, smoothing="simple"):
+        if smoothing not in ("simple", "wilder"):
+            raise ValueError(f"Unknown RSI smoothing: {smoothing}")
+        self.window = window
+        self.smoothing = smoothing
+        self.previous_price = None
+        self.gains = StreamingSMA(window)
+        self.losses = StreamingSMA(window)
+        self.avg_gain = None # Wilder only
+        self.avg_loss = None
+
+    def update(self, price):
+        if self.previous_price is not None:
+            delta = price - self.previous_price
+            gain, loss = max(delta, 0.0), max(-delta, 0.0)
+            if self.smoothing == "wilder" and self.avg_gain is not None:
+                self.avg_gain = (self.avg_gain * (self.window - 1) + gain) / self.window
+                self.avg_loss = (self.avg_loss * (self.window - 1) + loss) / self.window
+            else:
+                self.gains.update(gain)
+                self.losses.update(loss)
+                if self.smoothing == "wilder" and self.gains.value is not None:
+                    self.avg_gain, self.avg_loss = self.gains.value, self.losses.value
+        self.previous_price = price
+        return self.value
+
+    @property
+    def value(self):
+        if self.smoothing == "wilder":
+            gain, loss = self.avg_gain, self.avg_loss
+        else:
+            gain, loss = self.gains.value, self.losses.value
+        if gain is None:
+            return None
+        if loss == 0:
+            return 100.0 if gain > 0 else 50.0
+        return 100 - (100 / (1 + gain / loss))
+
+    def to_dict(self):
+        return {
+            "window": self.window, "smoothing": self.smoothing, "previous_price": self.previous_price,
+            "gains": self.gains.to_dict(), "losses": self.losses.to_dict(),
+            "avg_gain": self.avg_gain, "avg_loss": self.avg_loss,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        rsi = cls(data["window"], data["smoothing"])
+        rsi.previous_price = data["previous_price"]
+        rsi.gains = StreamingSMA.from_dict(data["gains"])
+        rsi.losses = StreamingSMA.from_dict(data["losses"])
+        rsi.avg_gain = data["avg_gain"]
+        rsi.avg_loss = data["avg_loss"]
+        return rsi
+
+class StreamingMACD:
+    """MACD line (short EMA - long EMA), its signal EMA and histogram; defined once long_window bars are seen."""
+
+    def __init__(self, short_window=12, long_window=26, signal_window=9):
+        self.long_window = long_window
+        self.short_ema = StreamingEMA(short_window)
+        self.long_ema = StreamingEMA(long_window)
+        self.signal_ema = StreamingEMA(signal_window)
+
+    def update(self, price):
+        self.short_ema.update(price)
+        self.long_ema.update(price)
+        self.signal_ema.update(self.short_ema.value - self.long_ema.value)
+        return self.value
+
+    @property
+    def value(self):
+        if self.long_ema.count < self.long_window:
+            return None, None, None
+        macd_line = self.short_ema.value - self.long_ema.value
+        return macd_line, self.signal_ema.value, macd_line - self.signal_ema.value
+
+    def to_dict(self):
+        return {"long_window": self.long_window, "short_ema": self.short_ema.to_dict(),
+                "long_ema": self.long_ema.to_dict(), "signal_ema": self.signal_ema.to_dict()}
+
+    @classmethod
+    def from_dict(cls, data):
+        macd = cls(long_window=data["long_window"])
+        macd.short_ema = StreamingEMA.from_dict(data["short_ema"])
+        macd.long_ema = StreamingEMA.from_dict(data["long_ema"])
+        macd.signal_ema = StreamingEMA.from_dict(data["signal_ema"])
+        return macd
+
+class TickerIndicatorState:
+    """
+    All streaming indicators FeatureEngineer needs for one ticker, plus the timestamp of the last
+    bar folded in. Bars are committed in timestamp order; older or repeated bars are ignored.
+    """
+
+    def __init__(self):
+        self.sma_20 = StreamingSMA(20)
+        self.sma_50 = StreamingSMA(50)
+        self.sma_200 = StreamingSMA(200)
+        self.rsi_14 = StreamingRSI(14)
+        self.macd = StreamingMACD()
+        self.last_timestamp = None
+        self.bars = 0
+
+    @classmethod
+    def from_history(cls, timestamps, closes):
+        """Bulk-loads a state from a full close history (oldest first)."""
+        state = cls()
+        for timestamp, close in zip(timestamps, closes):
+            state.update(int(timestamp), float(close))
+        return state
+
+    def update(self, timestamp, close):
+        if self.last_timestamp is not None and timestamp <= self.last_timestamp:
+            return False
+        self.sma_20.update(close)
+        self.sma_50.update(close)
+        self.sma_200.update(close)
+        self.rsi_14.update(close)
+        self.macd.update(close)
+        self.last_timestamp = timestamp
+        self.bars += 1
+        return True
+
+    def preview(self, timestamp, close):
+        """Returns the features as if (timestamp, close) were added, without changing this state."""
+        provisional = copy.deepcopy(self)
+        provisional.update(timestamp, close)
+        return provisional.features()
+
+    def features(self):
+        macd_line, macd_signal, macd_histogram = self.macd.value
+        return {
+            "sma_20_day": self.sma_20.value,
+            "sma_50_day": self.sma_50.value,
+            "sma_200_day": self.sma_200.value,
+            "rsi_14_day": self.rsi_14.value,
+            "macd_line": macd_line,
+            "macd_signal": macd_signal,
+            "macd_histogram": macd_histogram,
+        }
+
+    def to_dict(self):
+        return {
+            "sma_20": self.sma_20.to_dict(), "sma_50": self.sma_50.to_dict(), "sma_200": self.sma_200.to_dict(),
+            "rsi_14": self.rsi_14.to_dict(), "macd": self.macd.to_dict(),
+            "last_timestamp": self.last_timestamp, "bars": self.bars,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        state = cls()
+        state.sma_20 = StreamingSMA.from_dict(data["sma_20"])
+        state.sma_50 = StreamingSMA.from_dict(data["sma_50"])
+        state.sma_200 = StreamingSMA.from_dict(data["sma_200"])
+        state.rsi_14 = StreamingRSI.from_dict(data["rsi_14"])
+        state.macd = StreamingMACD.from_dict(data["macd"])
+        state.last_timestamp = data["last_timestamp"]
+        state.bars = data["bars"]
+        return state
@@ -1,92 +1,175 @@
 # src/data_services/data_aggregator.py
 
+from concurrent.futures import ThreadPoolExecutor
 from flask import current_app
 from .yahoo_finance_client import YahooFinanceClient
 from .data_bank_client import DataBankClient
+from .macro_indicator_cache import get_macro_indicator_cache
+from .market_data_cache import get_cached_yahoo_finance_client, get_market_data_single_flight
+from .price_history_store import IncrementalChartLoader, get_price_history_store, DEFAULT_INITIAL_RANGE
 # from src.models.portfolio_holding import PortfolioHolding # Assuming this will be passed in
 
+DEFAULT_MAX_WORKERS = 8 # Upper bound on concurrent upstream calls per aggregation
+
+# DataBank indicators attached to every holding: (data_bank key, indicator code, country code, error label).
+# In a real app, country and indicators would be more dynamic or configurable
+# (e.g. derived from the stock exchange/company info); for V1 we use USA-wide defaults.
+MACRO_INDICATORS = [
+    ("gdp_us", "NY.GDP.MKTP.CD", "USA", "GDP"), # GDP (current US$)
+    # Add more DataBank indicators as needed (e.g., inflation, interest rates)
+    ("inflation_us_cpi", "FP.CPI.TOTL.ZG", "USA", "Inflation CPI"), # Inflation (Consumer prices, annual %)
+]
+
 class DataAggregator:
-    def __init__(self):
-        self.yf_client = YahooFinanceClient()
+    def __init__(self, max_workers=None):
+        self.yf_client = get_cached_yahoo_finance_client(YahooFinanceClient()) # TTL/LRU cached, shared across requests
         self.db_client = DataBankClient()
+        # With a local price-history store, chart requests only download bars newer than the last stored one
+        price_store = get_price_history_store()
+        self.chart_loader = IncrementalChartLoader(
+            self.yf_client, price_store,
+            initial_range=current_app.config.get("PRICE_HISTORY_INITIAL_RANGE", DEFAULT_INITIAL_RANGE),
+            single_flight=get_market_data_single_flight()
+        ) if price_store else None
+        # 1 (or less) keeps the original sequential behaviour; anything higher enables the concurrent mode.
+        # Can be tuned per deployment via the DATA_AGGREGATOR_MAX_WORKERS config key.
+        if max_workers is None:
+            max_workers = current_app.config.get("DATA_AGGREGATOR_MAX_WORKERS", DEFAULT_MAX_WORKERS)
+        self.max_workers = max(1, int(max_workers))
+
+    def _build_fetch_plan(self, ticker):
+        """
+        Lists every per-ticker upstream call, in the order their results
+        (and errors) are recorded on the stock data dict.
+        Each entry is (section, key, fetch_callable, error_label).
+        """
+        chart_source = self.chart_loader or self.yf_client
+        return [
+            ("yahoo_finance", "price_series", lambda: chart_source.get_price_series(symbol=ticker),
+             f"chart data for {ticker}"),
+            ("yahoo_finance", "insights", lambda: self.yf_client.get_stock_insights_data(symbol=ticker),
+             f"insights data for {ticker}"),
+            ("yahoo_finance", "analyst_opinions", lambda: self.yf_client.get_analyst_opinions(symbol=ticker),
+             f"analyst opinions for {ticker}"),
+        ]
+
+    def get_macro_snapshot(self):
+        """
+        Fetches the DataBank indicators once for the whole portfolio through the process-wide cache.
+        :return: (data_bank dict shared by every holding, list of error messages for failed indicators)
+        """
+        macro_cache = get_macro_indicator_cache()
+        snapshot = {"data_bank": {}, "errors": []}
+        for key, indicator_code, country_code, label in MACRO_INDICATORS:
+            data = self._run_fetch(lambda: macro_cache.get_indicator_data(self.db_client, indicator_code, country_code))
+            self._record_result(snapshot, "data_bank", key, f"{label} data for {country_code}", data)
+        return snapshot["data_bank"], snapshot["errors"]
 
-    def get_aggregated_data_for_holdings(self, portfolio_holdings):
+    @staticmethod
+    def _run_fetch(fetch):
+        """Runs a single upstream call, turning an unexpected exception into an error payload."""
+        try:
+            return fetch()
+        except Exception as e:
+            current_app.logger.error(f"Upstream call raised: {e}")
+            return {"error": str(e)}
+
+    @staticmethod
+    def _record_result(stock_data, section, key, label, data):
+        """Stores a fetched payload on stock_data, or appends the matching error message."""
+        # Analyst opinions come back as a list, so only dict payloads can carry an "error" key.
+        if data and not (isinstance(data, dict) and data.get("error")):
+            stock_data[section][key] = data
+        else:
+            err_msg = f"Failed to fetch {label}: {data.get('error', 'Unknown error') if data else 'No response'}"
+            current_app.logger.warning(err_msg)
+            stock_data["errors"].append(err_msg)
+
+    @staticmethod
+    def _new_stock_data(holding, macro_data):
+        return {
+            "ticker": holding.ticker_symbol,
+            "quantity": holding.quantity,
+            "purchase_price": holding.purchase_price,
+            "priced_quantity": getattr(holding, "priced_quantity", None), # Set for positions (PortfolioPosition), None for lots
+            "purchase_date": holding.purchase_date.isoformat() if holding.purchase_date else None,
+            "yahoo_finance": {},
+            "data_bank": macro_data, # Shared, read-only reference: identical for every holding
+            "errors": []
+        }
+
+    def get_aggregated_data_for_holdings(self, portfolio_holdings, progress=None):
         """
         Aggregates data from YahooFinance and DataBank for a list of portfolio holdings.
+        When max_workers > 1, every upstream call for every holding is submitted to a bounded
+        thread pool; results are still assembled in holding order and per-endpoint order.
         :param portfolio_holdings: A list of PortfolioHolding model instances.
+        :param progress: Optional callable(done, total), called as each holding's data is complete.
         :return: A list of dictionaries, each containing aggregated data for a stock.
         """
-        aggregated_results = []
+        if not portfolio_holdings:
+            aggregated_results = []
+        else:
+            macro_data, macro_errors = self.get_macro_snapshot()
+            if self.max_workers > 1:
+                aggregated_results = self._aggregate_concurrently(portfolio_holdings, macro_data, macro_errors, progress)
+            else:
+                aggregated_results = self._aggregate_sequentially(portfolio_holdings, macro_data, macro_errors, progress)
+
+        current_app.logger.info(f"Finished aggregating data for {len(portfolio_holdings)} holdings.")
+        return aggregated_results
 
+    def aggregate_holding(self, holding, macro_data, macro_errors):
+        """
+        Aggregates data for one holding, fetching its endpoints one after another.
+        :param macro_data, macro_errors: The portfolio's get_macro_snapshot() result.
+        """
+        stock_data = self._new_stock_data(holding, macro_data)
+        current_app.logger.info(f"Aggregating data for ticker: {stock_data['ticker']}")
+        for section, key, fetch, label in self._build_fetch_plan(stock_data["ticker"]):
+            self._record_result(stock_data, section, key, label, self._run_fetch(fetch))
+        stock_data["errors"].extend(macro_errors)
+        return stock_data
+
+    def _aggregate_sequentially(self, portfolio_holdings, macro_data, macro_errors, progress=None):
+        aggregated_results = []
         for holding in portfolio_holdings:
-            ticker = holding.ticker_symbol
-            current_app.logger.info(f"Aggregating data for ticker: {ticker}")
-            stock_data = {
-                "ticker": ticker,
-                "quantity": holding.quantity,
-                "purchase_price": holding.purchase_price,
-                "purchase_date": holding.purchase_date.isoformat() if holding.purchase_date else None,
-                "yahoo_finance": {},
-                "data_bank": {},
-                "errors": []
-            }
-
-            # 1. Fetch Yahoo Finance Data
-            chart_data = self.yf_client.get_stock_chart_data(symbol=ticker)
-            if chart_data and not chart_data.get("error"):
-                stock_data["yahoo_finance"]["chart"] = chart_data
-            else:
-                err_msg = f"Failed to fetch chart data for {ticker}: {chart_data.get('error', 'Unknown error') if chart_data else 'No response'}"
-                current_app.logger.warning(err_msg)
-                stock_data["errors"].append(err_msg)
+            aggregated_results.append(self.aggregate_holding(holding, macro_data, macro_errors))
+            if progress:
+                progress(len(aggregated_results), len(portfolio_holdings))
+        return aggregated_results
 
-            insights_data = self.yf_client.get_stock_insights_data(symbol=ticker)
-            if insights_data and not insights_data.get("error"):
-                stock_data["yahoo_finance"]["insights"] = insights_data
-            else:
-                err_msg = err_msg = f"Failed to fetch insights data for {ticker}: {insights_data.get('error', 'Unknown error') if insights_data else 'No response'}"
-                current_app.logger.warning(err_msg)
-                stock_data["errors"].append(err_msg)
-            
-            analyst_opinions = self.yf_client.get_analyst_opinions(symbol=ticker)
-            if analyst_opinions and not analyst_opinions.get("error"):
-                stock_data["yahoo_finance"]["analyst_opinions"] = analyst_opinions
-            else:
-                err_msg = f"Failed to fetch analyst opinions for {ticker}: {analyst_opinions.get('error', 'Unknown error') if analyst_opinions else 'No response'}"
-                current_app.logger.warning(err_msg)
-                stock_data["errors"].append(err_msg)
-
-            # 2. Fetch DataBank Data (Example: GDP for USA - NY.GDP.MKTP.CD)
-            # In a real app, country and indicators would be more dynamic or configurable
-            # For V1, we can use a default or make assumptions.
-            # This part needs more sophisticated logic to determine relevant country and indicators per stock.
-            # For now, let's fetch a common indicator for a default region (e.g., USA)
-            # This is a placeholder for more complex logic.
-            country_code = "USA" # Default or derived from stock exchange/company info
-            gdp_indicator_code = "NY.GDP.MKTP.CD" # Example: GDP (current US$)
-            
-            gdp_data = self.db_client.get_indicator_data(indicator_code=gdp_indicator_code, country_code=country_code)
-            if gdp_data and not gdp_data.get("error"):
-                stock_data["data_bank"]["gdp_us"] = gdp_data # Store under a descriptive key
-            else:
-                err_msg = f"Failed to fetch GDP data for {country_code}: {gdp_data.get('error', 'Unknown error') if gdp_data else 'No response'}"
-                current_app.logger.warning(err_msg)
-                stock_data["errors"].append(err_msg)
-            
-            # Add more DataBank indicators as needed (e.g., inflation, interest rates)
-            # Example: Inflation (Consumer prices, annual %) - FP.CPI.TOTL.ZG
-            inflation_indicator_code = "FP.CPI.TOTL.ZG"
-            inflation_data = self.db_client.get_indicator_data(indicator_code=inflation_indicator_code, country_code=country_code)
-            if inflation_data and not inflation_data.get("error"):
-                stock_data["data_bank"]["inflation_us_cpi"] = inflation_data
-            else:
-                err_msg = f"Failed to fetch Inflation CPI data for {country_code}: {inflation_data.get('error', 'Unknown error') if inflation_data else 'No response'}"
-                current_app.logger.warning(err_msg)
-                stock_data["errors"].append(err_msg)
+    def _aggregate_concurrently(self, portfolio_holdings, macro_data, macro_errors, progress=None):
+        # Workers run outside the request thread, so they need the app pushed explicitly
+        # for current_app.logger (used here and inside the API clients) to resolve.
+        app = current_app._get_current_object()
+
+        def run_in_app_context(fetch):
+            with app.app_context():
+                return self._run_fetch(fetch)
+
+        current_app.logger.info(
+            f"Aggregating data for {len(portfolio_holdings)} holdings with up to {self.max_workers} concurrent requests."
+        )
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="data-aggregator") as executor:
+            pending = []
+            for holding in portfolio_holdings:
+                stock_data = self._new_stock_data(holding, macro_data)
+                futures = [
+                    (section, key, label, executor.submit(run_in_app_context, fetch))
+                    for section, key, fetch, label in self._build_fetch_plan(stock_data["ticker"])
+                ]
+                pending.append((stock_data, futures))
+
+            aggregated_results = []
+            for stock_data, futures in pending:
+                for section, key, label, future in futures:
+                    self._record_result(stock_data, section, key, label, future.result())
+                stock_data["errors"].extend(macro_errors)
+                aggregated_results.append(stock_data)
+                if progress:
+                    progress(len(aggregated_results), len(portfolio_holdings))
 
-            aggregated_results.append(stock_data)
-        
-        current_app.logger.info(f"Finished aggregating data for {len(portfolio_holdings)} holdings.")
         return aggregated_results
 
 # Example usage (for testing - requires Flask app context for logger and API clients)
@@ -97,7 +180,7 @@ class DataAggregator:
 #             self.quantity = quantity
 #             self.purchase_price = purchase_price
 #             self.purchase_date = purchase_date
-# 
+#
 #     # This would need to be run within a Flask app context
 #     # from flask import Flask
 #     # app = Flask(__name__)
@@ -107,4 +190,3 @@ class DataAggregator:
 #     #     results = aggregator.get_aggregated_data_for_holdings(mock_holdings)
 #     #     import json
 #     #     print(json.dumps(results, indent=4))
-
@@ -2,12 +2,23 @@
 # STUBBED VERSION FOR DEPLOYMENT WITHOUT data_api
 
 from flask import current_app
+from .http_transport import get_transport, TransportError
 
 class DataBankClient:
-    def __init__(self):
+    def __init__(self, transport=None):
         # self.client = ApiClient() # Removed data_api dependency
+        # Shared pooled/rate-limited/circuit-broken transport for the real (non-stubbed) endpoints
+        self.transport = transport or get_transport("data_bank")
         current_app.logger.info("[STUBBED] DataBankClient initialized (no actual API client)")
 
+    def _get_json(self, path, params=None):
+        """Calls the upstream through the shared transport, returning an error payload instead of raising."""
+        try:
+            return self.transport.get_json(path, params=params)
+        except TransportError as e:
+            current_app.logger.warning(f"{self.transport.upstream} request failed: {e}")
+            return {"error": str(e)}
+
     def get_indicator_list(self, query_string=None, page=1, page_size=10):
         """Fetches a list of World Development Indicators - STUBBED."""
         current_app.logger.info(f"[STUBBED] get_indicator_list with query: {query_string}")
@@ -0,0 +1,241 @@
+# src/data_services/http_transport.py
+
+import os
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from flask import current_app
+
+DEFAULT_POOL_MAXSIZE = 32
+DEFAULT_TIMEOUT_SECONDS = 10.0
+DEFAULT_MAX_RETRIES = 2
+DEFAULT_BACKOFF_BASE_SECONDS = 0.2
+DEFAULT_BACKOFF_MAX_SECONDS = 2.0
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_SECONDS = 30.0
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+class TransportError(Exception):
+    """Raised when an upstream request fails after all retries."""
+
+class CircuitOpenError(TransportError):
+    """Raised without contacting the upstream while its circuit breaker is open."""
+
+class TokenBucket:
+    """Thread-safe token-bucket rate limiter: `rate_per_second` sustained, bursts of up to `capacity`."""
+
+    def __init__(self, rate_per_second, capacity=None):
+        self.rate_per_second = float(rate_per_second)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate_per_second))
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate_per_second)
+        self._updated_at = now
+
+    def acquire(self, timeout=None):
+        """
+        Takes one token, sleeping until one is available.
+        :return: True if a token was taken, False if `timeout` seconds passed first.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate_per_second
+            if deadline is not None and now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def available_tokens(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+class CircuitBreaker:
+    """
+    Classic three-state breaker. After `failure_threshold` consecutive failures the circuit opens
+    and requests fail fast for `reset_seconds`; then a single trial request is let through
+    (half-open) and its outcome closes or re-opens the circuit.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=DEFAULT_FAILURE_THRESHOLD, reset_seconds=DEFAULT_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self._opened_at = 0.0
+        self._trial_in_progress = False
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+                self.state = self.HALF_OPEN
+                self._trial_in_progress = False
+            if self.state == self.HALF_OPEN and not self._trial_in_progress:
+                self._trial_in_progress = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._trial_in_progress = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+            self._trial_in_progress = False
+
+    def release(self):
+        """Gives up a request let through without contacting the upstream: a half-open trial may be retried."""
+        with self._lock:
+            self._trial_in_progress = False
+
+_shared_session = None
+_shared_session_pid = None
+_shared_session_lock = threading.Lock()
+
+def get_shared_session(pool_maxsize=DEFAULT_POOL_MAXSIZE):
+    """
+    Returns the process-wide requests.Session with keep-alive connection pools sized for our
+    concurrency. A new session is created after fork so workers never share sockets.
+    """
+    global _shared_session, _shared_session_pid
+    if _shared_session is None or _shared_session_pid != os.getpid():
+        with _shared_session_lock:
+            if _shared_session is None or _shared_session_pid != os.getpid():
+                session = requests.Session()
+                # Retries are handled by HttpTransport (with jitter and breaker accounting), not urllib3
+                adapter = HTTPAdapter(pool_connections=8, pool_maxsize=pool_maxsize, max_retries=0)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _shared_session = session
+                _shared_session_pid = os.getpid()
+    return _shared_session
+
+class HttpTransport:
+    """
+    JSON-over-HTTP transport for one upstream, shared by all clients talking to it.
+    Every request passes the circuit breaker (an open circuit fails fast without taking a
+    rate-limit token), then the rate limiter, then goes out on the pooled session. Connection
+    errors, timeouts, retryable status codes and undecodable bodies are retried with full-jitter
+    exponential backoff; the breaker counts one failure per request whose retries ran out.
+    """
+
+    def __init__(self, upstream, base_url, session=None, timeout=DEFAULT_TIMEOUT_SECONDS,
+                 max_retries=DEFAULT_MAX_RETRIES, backoff_base=DEFAULT_BACKOFF_BASE_SECONDS,
+                 backoff_max=DEFAULT_BACKOFF_MAX_SECONDS, rate_limiter=None, circuit_breaker=None):
+        self.upstream = upstream
+        self.base_url = base_url.rstrip("/")
+        self.session = session or get_shared_session()
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.rate_limiter = rate_limiter
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def get_json(self, path, params=None, headers=None):
+        """
+        Performs a GET request against base_url + path and returns the decoded JSON body.
+        :raises CircuitOpenError: if the upstream is currently considered down.
+        :raises TransportError: if the request still fails after all retries.
+        """
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        if not self.circuit_breaker.allow_request():
+            raise CircuitOpenError(f"Circuit open for {self.upstream}; failing fast")
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter is not None and not self.rate_limiter.acquire(timeout=self.timeout):
+                self.circuit_breaker.release() # Not the upstream's fault
+                raise TransportError(f"Rate limit wait for {self.upstream} exceeded {self.timeout}s")
+
+            try:
+                response = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+            except requests.RequestException as e:
+                last_error = f"{type(e).__name__}: {e}"
+            else:
+                if response.status_code < 400:
+                    try:
+                        data = response.json()
+                    except ValueError as e: # Truncated or non-JSON body, e.g. a proxy's error page
+                        last_error = f"Invalid JSON body: {e}"
+                    else:
+                        self.circuit_breaker.record_success()
+                        return data
+                elif response.status_code in RETRYABLE_STATUS_CODES:
+                    last_error = f"HTTP {response.status_code}"
+                else:
+                    # The upstream is healthy, the request itself is bad: do not count against the breaker
+                    self.circuit_breaker.record_success()
+                    raise TransportError(f"{self.upstream} returned HTTP {response.status_code} for {path}")
+
+            current_app.logger.warning(f"{self.upstream} request to {path} failed (attempt {attempt + 1}): {last_error}")
+            if attempt < self.max_retries:
+                time.sleep(self._backoff(attempt))
+
+        self.circuit_breaker.record_failure()
+        raise TransportError(f"{self.upstream} request to {path} failed after {self.max_retries + 1} attempts: {last_error}")
+
+    def stats(self):
+        return {
+            "base_url": self.base_url,
+            "circuit_state": self.circuit_breaker.state,
+            "consecutive_failures": self.circuit_breaker.consecutive_failures,
+            "available_tokens": round(self.rate_limiter.available_tokens(), 2) if self.rate_limiter else None,
+        }
+
+_transports = {}
+_transports_lock = threading.Lock()
+
+def get_transport(upstream):
+    """
+    Returns the process-wide HttpTransport for an upstream named in the HTTP_UPSTREAMS config
+    (e.g. "yahoo_finance", "data_bank"), so its rate limiter and circuit breaker are shared.
+    """
+    with _transports_lock:
+        transport = _transports.get(upstream)
+        if transport is None:
+            config = current_app.config
+            upstream_config = config.get("HTTP_UPSTREAMS", {}).get(upstream, {})
+            rate = upstream_config.get("rate_per_second")
+            transport = HttpTransport(
+                upstream,
+                upstream_config.get("base_url", ""),
+                session=get_shared_session(config.get("HTTP_POOL_MAXSIZE", DEFAULT_POOL_MAXSIZE)),
+                timeout=config.get("HTTP_TIMEOUT_SECONDS", DEFAULT_TIMEOUT_SECONDS),
+                max_retries=config.get("HTTP_MAX_RETRIES", DEFAULT_MAX_RETRIES),
+                rate_limiter=TokenBucket(rate, upstream_config.get("burst")) if rate else None,
+                circuit_breaker=CircuitBreaker(
+                    failure_threshold=config.get("CIRCUIT_BREAKER_FAILURE_THRESHOLD", DEFAULT_FAILURE_THRESHOLD),
+                    reset_seconds=config.get("CIRCUIT_BREAKER_RESET_SECONDS", DEFAULT_RESET_SECONDS),
+                ),
+            )
+            _transports[upstream] = transport
+        return transport
+
+def get_transport_stats():
+    with _transports_lock:
+        return {name: transport.stats() for name, transport in _transports.items()}
@@ -0,0 +1,111 @@
+# src/data_services/local_upstream.py
+# Local stand-in for the YahooFinance/DataBank HTTP APIs, used to exercise HttpTransport
+# (pooling, retries, rate limiting, circuit breaking) without network access.
+
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+class LocalUpstreamServer:
+    """
+    Threaded HTTP server on localhost that answers every GET with a JSON echo of the request.
+    Faults can be injected (and changed while running) through these attributes:
+      latency_seconds - delay before every response
+      error_rate      - probability (0..1) of answering with error_status instead
+      error_status    - HTTP status used for injected errors (default 503)
+      fail_next       - number of upcoming requests that must fail, regardless of error_rate
+      malformed_next  - number of upcoming requests answered 200 with a truncated JSON body
+    Usage:
+        with LocalUpstreamServer(latency_seconds=0.05, error_rate=0.2) as server:
+            transport = HttpTransport("yahoo_finance", server.base_url)
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency_seconds=0.0, error_rate=0.0, error_status=503):
+        self.latency_seconds = latency_seconds
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.fail_next = 0
+        self.malformed_next = 0
+        self.request_count = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _should_fail(self):
+        with self._lock:
+            self.request_count += 1
+            if self.fail_next > 0:
+                self.fail_next -= 1
+                return True
+        return random.random() < self.error_rate
+
+    def _should_malform(self):
+        with self._lock:
+            if self.malformed_next > 0:
+                self.malformed_next -= 1
+                return True
+        return False
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1" # Keep-alive, so connection pooling is exercised
+
+            def do_GET(self):
+                if server.latency_seconds:
+                    time.sleep(server.latency_seconds)
+                parsed = urlparse(self.path)
+                if server._should_fail():
+                    status, body = server.error_status, {"error": f"Injected failure ({server.error_status})"}
+                else:
+                    status, body = 200, {"path": parsed.path, "params": {k: v[0] for k, v in parse_qs(parsed.query).items()}}
+                payload = json.dumps(body).encode("utf-8")
+                if status == 200 and server._should_malform():
+                    payload = payload[:len(payload) // 2]
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass # Keep test output quiet
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="local-upstream", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Run a local stand-in upstream with injectable latency and errors.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds of delay per response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probability of an injected error response")
+    parser.add_argument("--error-status", type=int, default=503)
+    args = parser.parse_args()
+    upstream = LocalUpstreamServer(port=args.port, latency_seconds=args.latency, error_rate=args.error_rate, error_status=args.error_status)
+    print(f"Local upstream listening on {upstream.base_url}")
+    upstream._httpd.serve_forever()
@@ -0,0 +1,69 @@
+# src/data_services/macro_indicator_cache.py
+
+import threading
+import time
+from flask import current_app
+
+DEFAULT_MACRO_TTL_SECONDS = 24 * 60 * 60 # World Development Indicators are published yearly
+
+class MacroIndicatorCache:
+    """
+    Process-wide cache for DataBank indicator series.
+    Each (indicator_code, country_code) pair is fetched at most once per TTL window, no matter
+    how many requests or aggregation worker threads ask for it concurrently.
+    Cached payloads are shared by reference and must be treated as read-only by callers.
+    """
+
+    def __init__(self, ttl_seconds=DEFAULT_MACRO_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._entries = {} # (indicator_code, country_code) -> (expires_at, data)
+        self._key_locks = {}
+        self._lock = threading.Lock()
+
+    def _lock_for(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _fresh_entry(self, key):
+        entry = self._entries.get(key)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+        return None
+
+    def get_indicator_data(self, db_client, indicator_code, country_code):
+        """
+        Returns the indicator payload from cache, fetching it through db_client on a miss.
+        Error payloads are returned to the caller but never cached, so the next call retries.
+        """
+        key = (indicator_code, country_code)
+        data = self._fresh_entry(key)
+        if data is not None:
+            return data
+
+        # Only one thread per key performs the fetch; the others wait and then read the cache.
+        with self._lock_for(key):
+            data = self._fresh_entry(key)
+            if data is not None:
+                return data
+            data = db_client.get_indicator_data(indicator_code=indicator_code, country_code=country_code)
+            if data and not data.get("error"):
+                self._entries[key] = (time.monotonic() + self.ttl_seconds, data)
+                current_app.logger.info(f"Cached DataBank indicator {indicator_code} for {country_code} for {self.ttl_seconds}s")
+            return data
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+_macro_indicator_cache = None
+_macro_indicator_cache_lock = threading.Lock()
+
+def get_macro_indicator_cache():
+    """Returns the process-wide MacroIndicatorCache, creating it from app config on first use."""
+    global _macro_indicator_cache
+    if _macro_indicator_cache is None:
+        with _macro_indicator_cache_lock:
+            if _macro_indicator_cache is None:
+                ttl_seconds = current_app.config.get("MACRO_INDICATOR_TTL_SECONDS", DEFAULT_MACRO_TTL_SECONDS)
+                _macro_indicator_cache = MacroIndicatorCache(ttl_seconds=ttl_seconds)
+    return _macro_indicator_cache
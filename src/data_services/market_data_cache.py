@@ -0,0 +1,213 @@
+# src/data_services/market_data_cache.py
+
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+from .single_flight import SingleFlight
+
+# Default freshness per YahooFinance endpoint, in seconds
+DEFAULT_ENDPOINT_TTLS = {
+    "chart": 5 * 60, # Intraday prices move constantly
+    "insights": 4 * 60 * 60, # Technical outlooks/valuations are recomputed a few times a day
+    "analyst_opinions": 24 * 60 * 60, # Analyst reports change at most daily
+}
+# Endpoints cached under another endpoint's TTL
+ENDPOINT_TTL_ALIASES = {"price_series": "chart"}
+DEFAULT_MAX_ENTRIES = 2000
+DEFAULT_STALE_MAX_AGE_SECONDS = 24 * 60 * 60 # How long past expiry a value may still be served while refreshing
+
+class _CacheEntry:
+    __slots__ = ("value", "fresh_until", "stale_until")
+
+    def __init__(self, value, fresh_until, stale_until):
+        self.value = value
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+
+class MarketDataCache:
+    """
+    Thread-safe, size-bounded LRU cache with per-entry TTLs.
+    An entry is "fresh" until its TTL expires, then "stale" for up to stale_max_age_seconds
+    (served while a background refresh runs, if enabled), and a miss after that.
+    Cached payloads are shared between requests and must be treated as read-only.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, stale_max_age_seconds=DEFAULT_STALE_MAX_AGE_SECONDS):
+        self.max_entries = max_entries
+        self.stale_max_age_seconds = stale_max_age_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, allow_stale=False):
+        """
+        Looks up key and updates the hit/miss counters.
+        :return: (value, state) where state is "fresh", "stale" or None on a miss.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.fresh_until > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry.value, "fresh"
+                if allow_stale and entry.stale_until > now:
+                    self._entries.move_to_end(key)
+                    self.stale_hits += 1
+                    return entry.value, "stale"
+                if entry.stale_until <= now:
+                    del self._entries[key] # Too old to ever be served again
+            self.misses += 1
+            return None, None
+
+    def set(self, key, value, ttl_seconds):
+        now = time.monotonic()
+        with self._lock:
+            self._entries[key] = _CacheEntry(value, now + ttl_seconds, now + ttl_seconds + self.stale_max_age_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+class CachedYahooFinanceClient:
+    """
+    Drop-in wrapper around YahooFinanceClient that serves the three endpoints used by
+    DataAggregator from a MarketDataCache, with a separate TTL per endpoint.
+    With stale_while_revalidate enabled, an expired-but-recent value is returned immediately
+    and a background thread refreshes it.
+    Upstream fetches go through a SingleFlight, so concurrent misses for the same
+    (endpoint, symbol, params) share one in-flight request.
+    """
+
+    def __init__(self, client, cache, ttls=None, stale_while_revalidate=True, single_flight=None):
+        self.client = client
+        self.cache = cache
+        self.ttls = dict(DEFAULT_ENDPOINT_TTLS, **(ttls or {}))
+        self.stale_while_revalidate = stale_while_revalidate
+        self.single_flight = single_flight or SingleFlight()
+        self._refreshing = set()
+        self._refreshing_lock = threading.Lock()
+
+    @staticmethod
+    def _is_cacheable(data):
+        return bool(data) and not (isinstance(data, dict) and data.get("error"))
+
+    def _fetch_and_store(self, endpoint, key, fetch):
+        def fetch_and_store():
+            data = fetch()
+            if self._is_cacheable(data):
+                self.cache.set(key, data, self.ttls[ENDPOINT_TTL_ALIASES.get(endpoint, endpoint)])
+            return data
+        return self.single_flight.do(key, fetch_and_store)
+
+    def _refresh_in_background(self, endpoint, key, fetch):
+        with self._refreshing_lock:
+            if key in self._refreshing:
+                return # A refresh for this key is already running
+            self._refreshing.add(key)
+        app = current_app._get_current_object()
+
+        def refresh():
+            try:
+                with app.app_context():
+                    try:
+                        self._fetch_and_store(endpoint, key, fetch)
+                    except Exception as e:
+                        current_app.logger.warning(f"Background refresh of {key} failed: {e}")
+            finally:
+                with self._refreshing_lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, name="market-data-refresh", daemon=True).start()
+
+    def _cached_call(self, endpoint, fetch, symbol, params):
+        key = (endpoint, symbol, tuple(sorted(params.items())))
+        data, state = self.cache.get(key, allow_stale=self.stale_while_revalidate)
+        if state == "fresh":
+            return data
+        if state == "stale":
+            current_app.logger.info(f"Serving stale {endpoint} data for {symbol} while refreshing")
+            self._refresh_in_background(endpoint, key, fetch)
+            return data
+        return self._fetch_and_store(endpoint, key, fetch)
+
+    def refresh(self, endpoint, symbol, **params):
+        """Fetches an endpoint unconditionally and stores the result (used to pre-warm the cache)."""
+        fetch = self._endpoint_fetcher(endpoint, symbol, params)
+        return self._fetch_and_store(endpoint, (endpoint, symbol, tuple(sorted(params.items()))), fetch)
+
+    def _endpoint_fetcher(self, endpoint, symbol, params):
+        methods = {
+            "chart": self.client.get_stock_chart_data,
+            "price_series": self.client.get_price_series,
+            "insights": self.client.get_stock_insights_data,
+            "analyst_opinions": self.client.get_analyst_opinions,
+        }
+        return lambda: methods[endpoint](symbol=symbol, **params)
+
+    def get_stock_chart_data(self, symbol, **params):
+        return self._cached_call("chart", self._endpoint_fetcher("chart", symbol, params), symbol, params)
+
+    def get_price_series(self, symbol, **params):
+        return self._cached_call("price_series", self._endpoint_fetcher("price_series", symbol, params), symbol, params)
+
+    def get_stock_insights_data(self, symbol, **params):
+        return self._cached_call("insights", self._endpoint_fetcher("insights", symbol, params), symbol, params)
+
+    def get_analyst_opinions(self, symbol, **params):
+        return self._cached_call("analyst_opinions", self._endpoint_fetcher("analyst_opinions", symbol, params), symbol, params)
+
+_market_data_cache = None
+_market_data_cache_lock = threading.Lock()
+_market_data_single_flight = SingleFlight() # Shared by every client in this process, across request threads
+
+def get_market_data_single_flight():
+    return _market_data_single_flight
+
+def get_market_data_cache():
+    """Returns the process-wide MarketDataCache, creating it from app config on first use."""
+    global _market_data_cache
+    if _market_data_cache is None:
+        with _market_data_cache_lock:
+            if _market_data_cache is None:
+                _market_data_cache = MarketDataCache(
+                    max_entries=current_app.config.get("MARKET_DATA_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES),
+                    stale_max_age_seconds=current_app.config.get("MARKET_DATA_STALE_MAX_AGE_SECONDS", DEFAULT_STALE_MAX_AGE_SECONDS),
+                )
+    return _market_data_cache
+
+def get_cached_yahoo_finance_client(client):
+    """Wraps a YahooFinanceClient with the shared cache and the endpoint TTLs from app config."""
+    return CachedYahooFinanceClient(
+        client,
+        get_market_data_cache(),
+        ttls=current_app.config.get("MARKET_DATA_TTL_SECONDS"),
+        stale_while_revalidate=current_app.config.get("MARKET_DATA_STALE_WHILE_REVALIDATE", True),
+        single_flight=_market_data_single_flight,
+    )
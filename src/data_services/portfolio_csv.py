@@ -0,0 +1,246 @@
+# src/data_services/portfolio_csv.py
+# Column-wise validation of an uploaded portfolio CSV. Each column is coerced in one vectorized
+# pass; only the values the fast path cannot decide (text in a numeric column, dates not in
+# YYYY-MM-DD form, NaN quantities) fall back to the scalar int()/float()/pd.to_datetime() calls.
+# Uploads are read in chunks (read_csv_chunks) and each chunk is validated on its own. Every column
+# is read as text, so a row is accepted or rejected the same way whichever chunk it lands in (type
+# inference per chunk would otherwise turn quantity "2.5" into a float column in one chunk and a
+# text column in another). A batch file holds many portfolios, told apart by a PortfolioId column
+# (read_batch_csv).
+
+import math
+import numpy as np
+import pandas as pd
+from flask import current_app
+
+REQUIRED_COLUMNS = ["Ticker", "Quantity"]
+OPTIONAL_COLUMNS = ["PurchasePrice", "PurchaseDate"]
+BATCH_ID_COLUMN = "PortfolioId"
+DEFAULT_CHUNK_ROWS = 10000
+
+INTEGER_PATTERN = r"\s*[+-]?\d{1,18}\s*" # Text int() accepts and int64 holds
+DECIMAL_PATTERN = r"\s*[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?\s*" # Text float() accepts
+
+def read_csv_chunks(stream, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Reads a CSV as DataFrames of at most chunk_rows rows, so memory stays flat however large the
+    file is. Every column is read as text (empty cells are NaN), so validation does not depend on
+    where the chunks split. Row labels continue across chunks (the second chunk starts at
+    chunk_rows), and a file with only a header yields one empty frame.
+    :param chunk_rows: Rows per chunk; 0 reads the whole file as one frame.
+    """
+    if not chunk_rows:
+        yield pd.read_csv(stream, dtype=str)
+        return
+    with pd.read_csv(stream, chunksize=chunk_rows, dtype=str) as reader:
+        yield from reader
+
+class HoldingsDiff:
+    """
+    Matches a re-uploaded portfolio against the session's stored holdings, one chunk at a time.
+    An uploaded row identical to a stored lot (ticker, quantity, purchase price and date) that is
+    not matched yet leaves that lot alone; every other row is new or changed. Stored lots still
+    unmatched after the last chunk were changed or removed.
+    """
+
+    def __init__(self, stored_rows):
+        """:param stored_rows: (id, ticker_symbol, quantity, purchase_price, purchase_date) of the stored holdings."""
+        self._unmatched = {}
+        for holding_id, ticker, quantity, purchase_price, purchase_date in stored_rows:
+            self._unmatched.setdefault((ticker, quantity, purchase_price, purchase_date), []).append(holding_id)
+        self.unchanged = 0
+
+    def match(self, holdings):
+        """
+        :param holdings: Validated rows, as returned by validate_holdings.
+        :return: The rows that do not match an unmatched stored lot, i.e. the rows to insert.
+        """
+        new_rows = []
+        for holding in holdings:
+            ids = self._unmatched.get((holding["ticker_symbol"], holding["quantity"], holding["purchase_price"], holding["purchase_date"]))
+            if ids:
+                ids.pop()
+                self.unchanged += 1
+            else:
+                new_rows.append(holding)
+        return new_rows
+
+    def unmatched(self):
+        """:return: {(ticker_symbol, purchase_date): [ids]} of the stored lots no uploaded row matched."""
+        lots = {}
+        for (ticker, _, _, purchase_date), ids in self._unmatched.items():
+            if ids:
+                lots.setdefault((ticker, purchase_date), []).extend(ids)
+        return lots
+
+def _to_quantity(value):
+    """Quantity as an int; it must be a whole number ("10" and "10.0" are 10, "2.5" is rejected)."""
+    if isinstance(value, str):
+        try:
+            return int(value)
+        except ValueError as not_an_int:
+            try:
+                value = float(value)
+            except ValueError:
+                raise not_an_int from None # Text that is no number: reported with int()'s message, as before
+    if isinstance(value, float) and math.isfinite(value) and not value.is_integer():
+        raise ValueError(f"Quantity must be a whole number: {value!r}")
+    return int(value) # NaN and infinity raise here
+
+def _scalar_fallback(values, positions, func, out):
+    """
+    Applies func to values[positions], writing results into out.
+    :return: {position: exception} for the values func raised on.
+    """
+    failures = {}
+    for position in positions:
+        try:
+            out[position] = func(values[position])
+        except Exception as e:
+            failures[position] = e
+    return failures
+
+def _text_matches(column, pattern):
+    """Mask of the values that are strings matching pattern in full."""
+    return column.astype(object).where(column.map(type) == str, "").str.fullmatch(pattern).fillna(False).to_numpy(dtype=bool)
+
+def _coerce_quantities(column):
+    """_to_quantity() of every value. :return: (int64 array, {position: exception})."""
+    values = column.to_numpy()
+    quantities = np.zeros(len(values), dtype=np.int64)
+    if values.dtype.kind in "biu":
+        return values.astype(np.int64), {}
+    if values.dtype.kind == "f":
+        with np.errstate(invalid="ignore"):
+            fast = np.isfinite(values) & (np.abs(values) < 2.0 ** 63) & (np.mod(values, 1) == 0)
+        quantities[fast] = values[fast].astype(np.int64)
+    else:
+        fast = _text_matches(column, INTEGER_PATTERN) # Plain integers; everything else goes through _to_quantity
+        quantities[fast] = values[fast].astype(np.int64) # int() of each string
+    return quantities, _scalar_fallback(values, np.flatnonzero(~fast), _to_quantity, quantities)
+
+def _coerce_prices(column, present):
+    """float() of the present values. :return: (float64 array, {position: exception})."""
+    values = column.to_numpy()
+    if values.dtype.kind in "biuf":
+        return values.astype(np.float64), {}
+    prices = np.full(len(values), np.nan)
+    fast = present & _text_matches(column, DECIMAL_PATTERN)
+    prices[fast] = values[fast].astype(np.float64) # float() of each string
+    return prices, _scalar_fallback(values, np.flatnonzero(present & ~fast), float, prices)
+
+def _coerce_dates(column, present):
+    """pd.to_datetime(value).date() of the present values. :return: (object array of dates, {position: exception})."""
+    values = column.to_numpy()
+    dates = np.full(len(values), None, dtype=object)
+    if values.dtype == object:
+        parsed = pd.to_datetime(column.where(present), format="%Y-%m-%d", errors="coerce")
+        fast = present & parsed.notna().to_numpy()
+        dates[fast] = parsed[fast].dt.date.to_numpy()
+    else:
+        fast = np.zeros(len(values), dtype=bool)
+    return dates, _scalar_fallback(values, np.flatnonzero(present & ~fast), lambda value: pd.to_datetime(value).date(), dates)
+
+def validate_holdings(df):
+    """
+    Validates and coerces the rows of an uploaded portfolio. Rows are checked in this order, and
+    a row is reported for the first check it fails: Quantity is a whole number, Ticker is non-empty
+    and Quantity is positive, PurchasePrice (if given) is a non-negative number, PurchaseDate (if
+    given) is a date.
+    :param df: DataFrame read from the CSV (as text, see read_csv_chunks) or built from JSON values,
+               with at least the REQUIRED_COLUMNS.
+    :return: (holdings, error_rows). holdings are dicts of ticker_symbol, quantity, purchase_price
+             and purchase_date for the valid rows; error_rows are {"row", ["field"], "error"} dicts,
+             both in row order. Row numbers are CSV line numbers (the header is line 1).
+    """
+    count = len(df)
+    row_numbers = (df.index + 2).tolist()
+    rejected = np.zeros(count, dtype=bool)
+    errors = {} # position -> error dict
+
+    def reject(mask, error):
+        for position in np.flatnonzero(mask & ~rejected):
+            errors[position] = dict(row=row_numbers[position], **error)
+        rejected[mask] = True
+
+    def reject_exceptions(failures, field=None, message=None):
+        # Anything other than a ValueError from the price conversion was reported as-is by the row loop
+        mask = np.zeros(count, dtype=bool)
+        for position, exception in failures.items():
+            if rejected[position]:
+                continue
+            if message is not None and (field != "PurchasePrice" or isinstance(exception, ValueError)):
+                errors[position] = {"row": row_numbers[position], "field": field, "error": message}
+            else:
+                current_app.logger.error(f"Error processing row {row_numbers[position]}: {exception}")
+                errors[position] = {"row": row_numbers[position], "error": str(exception)}
+            mask[position] = True
+        rejected[mask] = True
+
+    tickers = df["Ticker"].astype(str)
+    quantities, quantity_failures = _coerce_quantities(df["Quantity"])
+    reject_exceptions(quantity_failures)
+    reject(((tickers == "").to_numpy() | (quantities <= 0)),
+           {"error": "Ticker cannot be empty and Quantity must be positive."})
+
+    prices = np.full(count, np.nan)
+    has_price = np.zeros(count, dtype=bool)
+    if "PurchasePrice" in df.columns:
+        has_price = df["PurchasePrice"].notna().to_numpy()
+        prices, price_failures = _coerce_prices(df["PurchasePrice"], has_price & ~rejected)
+        reject_exceptions(price_failures, "PurchasePrice", "Invalid format for PurchasePrice.")
+        reject(has_price & (prices < 0), {"field": "PurchasePrice", "error": "PurchasePrice cannot be negative."})
+
+    dates = np.full(count, None, dtype=object)
+    if "PurchaseDate" in df.columns:
+        has_date = df["PurchaseDate"].notna().to_numpy()
+        dates, date_failures = _coerce_dates(df["PurchaseDate"], has_date & ~rejected)
+        reject_exceptions(date_failures, "PurchaseDate", "Invalid format for PurchaseDate. Use YYYY-MM-DD.")
+
+    valid = np.flatnonzero(~rejected)
+    symbols = tickers.str.upper().to_numpy() # Standardize ticker to uppercase
+    holdings = [
+        {
+            "ticker_symbol": symbols[position],
+            "quantity": int(quantities[position]),
+            "purchase_price": float(prices[position]) if has_price[position] else None,
+            "purchase_date": dates[position],
+        }
+        for position in valid
+    ]
+    return holdings, [errors[position] for position in sorted(errors)]
+
+def group_portfolios(df):
+    """
+    Validates the rows of many portfolios (validate_holdings, plus a non-empty PortfolioId) and
+    groups the valid ones by portfolio.
+    :param df: DataFrame with a BATCH_ID_COLUMN and at least the REQUIRED_COLUMNS, with its default index.
+    :return: (portfolios, error_rows). portfolios is a list of (portfolio_id, holdings) in order of
+             first appearance, including portfolios all of whose rows were rejected; error_rows are
+             as for validate_holdings, with the "portfolio_id" of the row when it has one.
+    """
+    ids = df[BATCH_ID_COLUMN].astype(str).str.strip()
+    missing = (df[BATCH_ID_COLUMN].isna() | (ids == "")).to_numpy()
+    id_errors = [{"row": label + 2, "field": BATCH_ID_COLUMN, "error": "PortfolioId cannot be empty."} for label in df.index[missing]]
+
+    frame = df[~missing]
+    holdings, error_rows = validate_holdings(frame.drop(columns=[BATCH_ID_COLUMN]))
+    rejected = {error["row"] - 2 for error in error_rows}
+    portfolios = {portfolio_id: [] for portfolio_id in ids[~missing]}
+    valid_labels = [label for label in frame.index if label not in rejected]
+    for label, holding in zip(valid_labels, holdings):
+        portfolios[ids[label]].append(holding)
+    for error in error_rows:
+        error["portfolio_id"] = ids[error["row"] - 2]
+    return list(portfolios.items()), sorted(id_errors + error_rows, key=lambda error: error["row"])
+
+def read_batch_csv(stream):
+    """
+    Reads and validates a CSV of many portfolios (see group_portfolios). Batch files are read whole.
+    :raises ValueError: If the CSV cannot be parsed or lacks a required column.
+    """
+    df = pd.read_csv(stream, dtype=str) # As text, like uploads; also keeps ids like "007" as written
+    for col in [BATCH_ID_COLUMN] + REQUIRED_COLUMNS:
+        if col not in df.columns:
+            raise ValueError(f"Missing required column in CSV: {col}")
+    return group_portfolios(df)
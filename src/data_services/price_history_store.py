@@ -0,0 +1,181 @@
+# src/data_services/price_history_store.py
+
+import json
+import os
+import sqlite3
+import threading
+import numpy as np
+from flask import current_app
+from .price_series import PriceSeries
+
+DEFAULT_INTERVAL = "1d"
+DEFAULT_INITIAL_RANGE = "5y" # First download for a symbol; enough bars for the 200-day SMA and then some
+
+class PriceHistoryStore:
+    """
+    Local on-disk OHLCV store (SQLite) keyed by (symbol, interval).
+    Bars are upserted by timestamp, so re-appending an overlapping window is safe and
+    refreshes the latest (possibly still forming) bar.
+    Connections are kept per thread; SQLite's WAL mode lets readers and the writer overlap.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS price_bars (
+                       symbol TEXT NOT NULL,
+                       interval TEXT NOT NULL,
+                       ts INTEGER NOT NULL,
+                       open REAL, high REAL, low REAL, close REAL, adjclose REAL, volume INTEGER,
+                       PRIMARY KEY (symbol, interval, ts)
+                   ) WITHOUT ROWID"""
+            )
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS indicator_state (
+                       symbol TEXT NOT NULL,
+                       interval TEXT NOT NULL,
+                       state TEXT NOT NULL,
+                       PRIMARY KEY (symbol, interval)
+                   )"""
+            )
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            self._local.conn = conn
+        return conn
+
+    def last_timestamp(self, symbol, interval=DEFAULT_INTERVAL):
+        """Returns the newest stored bar timestamp (epoch seconds) for symbol/interval, or None."""
+        row = self._connection().execute(
+            "SELECT MAX(ts) FROM price_bars WHERE symbol = ? AND interval = ?", (symbol, interval)
+        ).fetchone()
+        return row[0] if row else None
+
+    def append_chart(self, symbol, chart_data, interval=DEFAULT_INTERVAL):
+        """
+        Upserts the bars of a YahooFinance chart payload.
+        :return: Number of bars written.
+        """
+        timestamps = chart_data.get("timestamp") or []
+        quote = (chart_data.get("indicators", {}).get("quote") or [{}])[0]
+        adjclose = (chart_data.get("indicators", {}).get("adjclose") or [{}])[0].get("adjclose") or []
+
+        def column(values, i):
+            return values[i] if i < len(values) else None
+
+        rows = [
+            (symbol, interval, int(ts),
+             column(quote.get("open") or [], i), column(quote.get("high") or [], i),
+             column(quote.get("low") or [], i), column(quote.get("close") or [], i),
+             column(adjclose, i), column(quote.get("volume") or [], i))
+            for i, ts in enumerate(timestamps) if ts is not None
+        ]
+        with self._connection() as conn:
+            conn.executemany("INSERT OR REPLACE INTO price_bars VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def symbols(self, interval=DEFAULT_INTERVAL):
+        """Symbols with stored bars for the interval, in alphabetical order."""
+        rows = self._connection().execute(
+            "SELECT DISTINCT symbol FROM price_bars WHERE interval = ? ORDER BY symbol", (interval,)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def _load_rows(self, columns, symbol, interval, limit):
+        # Newest `limit` bars, returned oldest first
+        query = f"SELECT {columns} FROM price_bars WHERE symbol = ? AND interval = ? ORDER BY ts DESC"
+        params = [symbol, interval]
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        rows = self._connection().execute(query, params).fetchall()
+        rows.reverse()
+        return rows
+
+    def load_closes(self, symbol, interval=DEFAULT_INTERVAL, limit=None):
+        """Returns the stored close prices (oldest first, missing closes skipped) as a float64 array."""
+        closes = np.array([r[0] for r in self._load_rows("close", symbol, interval, limit)], dtype=np.float64)
+        return closes[~np.isnan(closes)]
+
+    def load_series(self, symbol, interval=DEFAULT_INTERVAL, limit=None):
+        """Returns the stored bars as a PriceSeries, or None if there are none."""
+        rows = self._load_rows("ts, open, high, low, close, volume", symbol, interval, limit)
+        if not rows:
+            return None
+        timestamps = np.array([r[0] for r in rows], dtype=np.int64)
+        ohlcv = np.array([r[1:] for r in rows], dtype=np.float64) # None -> NaN
+        return PriceSeries(symbol, timestamps, ohlcv[:, 0], ohlcv[:, 1], ohlcv[:, 2], ohlcv[:, 3], ohlcv[:, 4], interval=interval)
+
+    def load_indicator_state(self, symbol, interval=DEFAULT_INTERVAL):
+        """Returns the persisted streaming-indicator state dict for symbol/interval, or None."""
+        row = self._connection().execute(
+            "SELECT state FROM indicator_state WHERE symbol = ? AND interval = ?", (symbol, interval)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_indicator_state(self, symbol, state, interval=DEFAULT_INTERVAL):
+        with self._connection() as conn:
+            conn.execute("INSERT OR REPLACE INTO indicator_state VALUES (?, ?, ?)", (symbol, interval, json.dumps(state)))
+
+class IncrementalChartLoader:
+    """
+    Chart fetch path backed by a PriceHistoryStore: only bars from the last stored timestamp
+    onwards are requested from the upstream client, appended, and the full stored history is
+    returned as a PriceSeries.
+    When a SingleFlight is given, concurrent loads of the same symbol/interval share one sync.
+    """
+
+    def __init__(self, yf_client, store, initial_range=DEFAULT_INITIAL_RANGE, single_flight=None):
+        self.yf_client = yf_client
+        self.store = store
+        self.initial_range = initial_range
+        self.single_flight = single_flight
+
+    def get_price_series(self, symbol, interval=DEFAULT_INTERVAL):
+        if self.single_flight is None:
+            return self._sync_and_load(symbol, interval)
+        return self.single_flight.do(("chart_history", symbol, interval), lambda: self._sync_and_load(symbol, interval))
+
+    def _sync_and_load(self, symbol, interval):
+        last_ts = self.store.last_timestamp(symbol, interval)
+        if last_ts is None:
+            chart_data = self.yf_client.get_stock_chart_data(symbol=symbol, interval=interval, range=self.initial_range)
+        else:
+            # Re-request the last stored bar too, since it may have been captured mid-session
+            chart_data = self.yf_client.get_stock_chart_data(symbol=symbol, interval=interval, period1=last_ts)
+
+        if chart_data and not chart_data.get("error"):
+            written = self.store.append_chart(symbol, chart_data, interval)
+            current_app.logger.info(f"Stored {written} {interval} bars for {symbol} (previous last bar: {last_ts})")
+        elif last_ts is None:
+            return chart_data # Nothing stored to fall back on; surface the upstream error
+        else:
+            current_app.logger.warning(f"Incremental chart fetch failed for {symbol}; serving stored history")
+
+        return self.store.load_series(symbol, interval)
+
+_price_history_store = None
+_price_history_store_lock = threading.Lock()
+
+def get_price_history_store():
+    """
+    Returns the process-wide PriceHistoryStore configured by PRICE_HISTORY_DB_PATH,
+    or None when the store is disabled (empty path).
+    """
+    global _price_history_store
+    db_path = current_app.config.get("PRICE_HISTORY_DB_PATH")
+    if not db_path:
+        return None
+    if _price_history_store is None or _price_history_store.db_path != db_path:
+        with _price_history_store_lock:
+            if _price_history_store is None or _price_history_store.db_path != db_path:
+                _price_history_store = PriceHistoryStore(db_path)
+    return _price_history_store
@@ -0,0 +1,93 @@
+# src/data_services/price_series.py
+
+import numpy as np
+
+class PriceSeries:
+    """
+    Compact columnar OHLCV history for one symbol, backed by contiguous NumPy arrays:
+    int64 epoch-second timestamps, float64 open/high/low/close, int64 volume, and a boolean
+    `valid` mask marking bars with a usable close (missing values are NaN in the float columns).
+    This replaces the nested dict-of-lists chart payload as it moves through the pipeline.
+    """
+    __slots__ = ("symbol", "interval", "timestamps", "open", "high", "low", "close", "volume", "valid")
+
+    def __init__(self, symbol, timestamps, open, high, low, close, volume=None, interval="1d"):
+        self.symbol = symbol
+        self.interval = interval
+        self.timestamps = np.ascontiguousarray(timestamps, dtype=np.int64)
+        self.open = np.ascontiguousarray(open, dtype=np.float64)
+        self.high = np.ascontiguousarray(high, dtype=np.float64)
+        self.low = np.ascontiguousarray(low, dtype=np.float64)
+        self.close = np.ascontiguousarray(close, dtype=np.float64)
+        if volume is None:
+            self.volume = np.zeros(len(self.timestamps), dtype=np.int64)
+        else:
+            self.volume = np.nan_to_num(np.asarray(volume, dtype=np.float64)).astype(np.int64)
+        self.valid = ~np.isnan(self.close)
+
+    @staticmethod
+    def _float_column(values, length):
+        # None -> NaN; short or missing columns are padded with NaN
+        column = np.full(length, np.nan)
+        if values:
+            values = np.asarray(values[:length], dtype=np.float64)
+            column[:len(values)] = values
+        return column
+
+    @classmethod
+    def from_chart(cls, chart_data, symbol=None):
+        """Builds a PriceSeries from a YahooFinance chart payload (timestamp + indicators.quote[0])."""
+        timestamps = chart_data.get("timestamp") or []
+        quote = (chart_data.get("indicators", {}).get("quote") or [{}])[0]
+        keep = [i for i, ts in enumerate(timestamps) if ts is not None]
+        if len(keep) != len(timestamps):
+            timestamps = [timestamps[i] for i in keep]
+            quote = {k: [v[i] if i < len(v) else None for i in keep] for k, v in quote.items() if v}
+        length = len(timestamps)
+        return cls(
+            symbol or chart_data.get("meta", {}).get("symbol"),
+            timestamps,
+            cls._float_column(quote.get("open"), length),
+            cls._float_column(quote.get("high"), length),
+            cls._float_column(quote.get("low"), length),
+            cls._float_column(quote.get("close"), length),
+            cls._float_column(quote.get("volume"), length),
+            interval=chart_data.get("meta", {}).get("dataGranularity", "1d"),
+        )
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __repr__(self):
+        return f"<PriceSeries {self.symbol} {self.interval} ({len(self)} bars)>"
+
+    def valid_closes(self):
+        """Close prices of the valid bars, oldest first, as a new float64 array."""
+        return self.close[self.valid]
+
+    @property
+    def last_close(self):
+        closes = self.valid_closes()
+        return float(closes[-1]) if len(closes) else None
+
+    @property
+    def last_timestamp(self):
+        return int(self.timestamps[-1]) if len(self.timestamps) else None
+
+    def tail(self, bars):
+        """Returns a PriceSeries holding only the newest `bars` bars."""
+        return PriceSeries(self.symbol, self.timestamps[-bars:], self.open[-bars:], self.high[-bars:],
+                           self.low[-bars:], self.close[-bars:], self.volume[-bars:], interval=self.interval)
+
+    def to_chart(self):
+        """Converts back to the YahooFinance chart payload shape, for code that still expects it."""
+        def as_list(values):
+            return [None if np.isnan(v) else float(v) for v in values]
+        return {
+            "meta": {"symbol": self.symbol, "dataGranularity": self.interval},
+            "timestamp": self.timestamps.tolist(),
+            "indicators": {
+                "quote": [{"open": as_list(self.open), "high": as_list(self.high), "low": as_list(self.low),
+                           "close": as_list(self.close), "volume": self.volume.tolist()}]
+            }
+        }
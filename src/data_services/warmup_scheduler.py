@@ -0,0 +1,234 @@
+# src/data_services/warmup_scheduler.py
+
+import datetime
+import os
+import threading
+import time
+from flask import current_app
+
+DEFAULT_RUN_AT_UTC = "12:00" # 08:00 New York (EDT): before the US market opens
+DEFAULT_REQUEST_BUDGET = 300
+SHARED_ENDPOINTS = ("price_series",) # Kept in the on-disk price history store, which every process reads
+IN_MEMORY_ENDPOINTS = ("insights", "analyst_opinions") # Kept only in the in-memory cache of the process that fetched them
+WARMUP_ENDPOINTS = SHARED_ENDPOINTS + IN_MEMORY_ENDPOINTS
+
+class WarmupScheduler:
+    """
+    Pre-market cache warm-up for tickers our users hold.
+    Once a day (at run_at_utc, "HH:MM") it ranks the distinct ticker_symbol values in
+    portfolio_holding by how many upload sessions hold them and refreshes their chart,
+    insights and analyst data in that order until request_budget upstream calls are spent.
+    The budget is per day, not per process: every scheduler running that day takes its requests
+    from the day's WarmupRun row.
+
+    Chart data goes to the on-disk price history store, which every process reads, so each
+    ticker's chart is refreshed by one process only. Insights and analyst data are only kept in
+    the in-memory cache of the process that fetched them, so they are refreshed by each process
+    that runs analysis jobs (warm_memory): the web workers with ANALYSIS_WORKER_IN_APP and the
+    `worker` process. The separate `warmup` process (`python -m src.data_services.warmup_scheduler`)
+    only refreshes chart data. Without a price history store chart data is in-memory as well.
+    """
+
+    def __init__(self, app, run_at_utc=DEFAULT_RUN_AT_UTC, request_budget=DEFAULT_REQUEST_BUDGET, warm_memory=True):
+        """:param warm_memory: Also refresh the in-memory-only endpoints (for a process that runs analysis jobs)."""
+        self.app = app
+        self.run_at = datetime.datetime.strptime(run_at_utc, "%H:%M").time()
+        self.request_budget = request_budget
+        self.warm_memory = warm_memory
+        self.last_run = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def rank_tickers(self):
+        """Returns [(ticker_symbol, holding_sessions)] ordered by popularity, most held first."""
+        from sqlalchemy import func
+        from src.main import db
+        from src.models.portfolio_holding import PortfolioHolding
+
+        sessions = func.count(func.distinct(PortfolioHolding.session_id))
+        rows = (
+            db.session.query(PortfolioHolding.ticker_symbol, sessions)
+            .group_by(PortfolioHolding.ticker_symbol)
+            .order_by(sessions.desc(), PortfolioHolding.ticker_symbol)
+            .all()
+        )
+        return [(ticker, count) for ticker, count in rows]
+
+    def _start_shared_run(self, run_date):
+        """Creates the day's WarmupRun row with this scheduler's request budget, unless another process already has."""
+        from sqlalchemy.exc import IntegrityError
+        from src.main import db
+        from src.models.warmup_run import WarmupRun
+
+        if WarmupRun.query.filter_by(run_date=run_date).first() is not None:
+            return
+        db.session.add(WarmupRun(run_date=run_date, request_budget=self.request_budget))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback() # Started concurrently by another process
+
+    def reserve_requests(self, run_date, requests, rank=None):
+        """
+        Atomically takes requests from the day's shared budget.
+        :param rank: Popularity rank (0 for the most widely held) of a ticker whose shared endpoints
+                     the requests are for: only taken if no process has taken that ticker yet.
+        :return: True if the requests (and the ticker) were taken; False if the budget cannot cover
+                 them or another process has taken the ticker.
+        """
+        from src.main import db
+        from src.models.warmup_run import WarmupRun
+
+        conditions = [WarmupRun.run_date == run_date, WarmupRun.requests_reserved + requests <= WarmupRun.request_budget]
+        fields = {"requests_reserved": WarmupRun.requests_reserved + requests, "updated_at": datetime.datetime.utcnow()}
+        if rank is not None:
+            conditions.append(WarmupRun.tickers_claimed <= rank) # Tickers are taken in rank order
+            fields["tickers_claimed"] = rank + 1
+        reserved = WarmupRun.query.filter(*conditions).update(fields, synchronize_session=False)
+        if reserved:
+            db.session.commit()
+        else:
+            db.session.rollback()
+        return bool(reserved)
+
+    def requests_left(self, run_date):
+        """:return: Requests of the day's shared budget no process has taken yet."""
+        from src.main import db
+        from src.models.warmup_run import WarmupRun
+
+        left = db.session.query(WarmupRun.request_budget - WarmupRun.requests_reserved).filter_by(run_date=run_date).scalar()
+        db.session.commit()
+        return left
+
+    def _warm(self, aggregator, endpoint, ticker):
+        """Refreshes one endpoint of a ticker; returns True if it failed."""
+        try:
+            if endpoint == "price_series" and aggregator.chart_loader is not None:
+                data = aggregator.chart_loader.get_price_series(ticker) # Syncs the on-disk store
+            else:
+                data = aggregator.yf_client.refresh(endpoint, ticker)
+            return not data or (isinstance(data, dict) and bool(data.get("error")))
+        except Exception as e:
+            current_app.logger.warning(f"Warm-up of {endpoint} for {ticker} failed: {e}")
+            return True
+
+    def run_once(self):
+        """Performs one warm-up pass within the day's shared request budget and returns a summary dict."""
+        from .data_aggregator import DataAggregator
+
+        started = time.monotonic()
+        run_date = datetime.datetime.utcnow().date()
+        with self.app.app_context():
+            aggregator = DataAggregator(max_workers=1)
+            shared = SHARED_ENDPOINTS if aggregator.chart_loader is not None else ()
+            own = tuple(endpoint for endpoint in WARMUP_ENDPOINTS if endpoint not in shared) if self.warm_memory else ()
+            groups = [group for group in (shared, own) if group]
+            ranked = self.rank_tickers() if groups else [] # Nothing to warm in a process without either
+            self._start_shared_run(run_date)
+            requests_made = 0
+            tickers_warmed = 0
+            failures = 0
+            for rank, (ticker, _sessions) in enumerate(ranked):
+                endpoints = ()
+                if shared and self.reserve_requests(run_date, len(shared), rank=rank):
+                    endpoints += shared
+                if own and self.reserve_requests(run_date, len(own)):
+                    endpoints += own
+                if not endpoints:
+                    if self.requests_left(run_date) < min(len(group) for group in groups):
+                        break # The day's budget is spent
+                    continue # Its chart data is another process's, and this one has nothing else to warm
+                for endpoint in endpoints:
+                    requests_made += 1
+                    failures += self._warm(aggregator, endpoint, ticker)
+                tickers_warmed += 1
+
+            self.last_run = {
+                "run_date": run_date.isoformat(),
+                "finished_at": datetime.datetime.utcnow().isoformat(),
+                "duration_seconds": round(time.monotonic() - started, 2),
+                "endpoints": list(shared + own),
+                "tickers_held": len(ranked),
+                "tickers_warmed": tickers_warmed,
+                "requests_made": requests_made, # By this process; the budget is shared by every process
+                "failures": failures,
+                "request_budget": self.request_budget,
+            }
+            current_app.logger.info(f"Market data warm-up finished: {self.last_run}")
+        return self.last_run
+
+    def seconds_until_next_run(self, now=None):
+        now = now or datetime.datetime.utcnow()
+        next_run = datetime.datetime.combine(now.date(), self.run_at)
+        if next_run <= now:
+            next_run += datetime.timedelta(days=1)
+        return (next_run - now).total_seconds()
+
+    def _loop(self):
+        while not self._stop.wait(self.seconds_until_next_run()):
+            try:
+                self.run_once()
+            except Exception as e:
+                self.app.logger.error(f"Market data warm-up failed: {e}", exc_info=True)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name="market-data-warmup", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def status(self):
+        return {
+            "running": bool(self._thread and self._thread.is_alive()),
+            "next_run_in_seconds": round(self.seconds_until_next_run()),
+            "last_run": self.last_run,
+        }
+
+_scheduler = None
+_scheduler_pid = None
+_scheduler_lock = threading.Lock()
+
+def ensure_warmup_scheduler_started(app, warm_memory=None):
+    """
+    Starts the in-app scheduler once per process (threads do not survive a gunicorn fork,
+    so this is called lazily from a request hook rather than at import time).
+    :param warm_memory: See WarmupScheduler; None warms the in-memory cache if the process runs
+                        analysis jobs (ANALYSIS_WORKER_IN_APP).
+    """
+    global _scheduler, _scheduler_pid
+    if _scheduler_pid == os.getpid():
+        return _scheduler
+    with _scheduler_lock:
+        if _scheduler_pid != os.getpid():
+            _scheduler = WarmupScheduler(
+                app,
+                run_at_utc=app.config.get("WARMUP_RUN_AT_UTC", DEFAULT_RUN_AT_UTC),
+                request_budget=app.config.get("WARMUP_REQUEST_BUDGET", DEFAULT_REQUEST_BUDGET),
+                warm_memory=app.config.get("ANALYSIS_WORKER_IN_APP", False) if warm_memory is None else warm_memory,
+            ).start()
+            _scheduler_pid = os.getpid()
+    return _scheduler
+
+def get_warmup_scheduler():
+    return _scheduler if _scheduler_pid == os.getpid() else None
+
+if __name__ == "__main__":
+    import argparse
+    from src.main import app
+
+    parser = argparse.ArgumentParser(description="Pre-market warm-up of market data for held tickers.")
+    parser.add_argument("--once", action="store_true", help="Run a single warm-up pass now and exit")
+    args = parser.parse_args()
+
+    scheduler = WarmupScheduler(
+        app,
+        run_at_utc=app.config.get("WARMUP_RUN_AT_UTC", DEFAULT_RUN_AT_UTC),
+        request_budget=app.config.get("WARMUP_REQUEST_BUDGET", DEFAULT_REQUEST_BUDGET),
+        warm_memory=False, # Its in-memory cache serves no analysis
+    )
+    if args.once:
+        print(scheduler.run_once())
+    else:
+        scheduler._loop()
@@ -2,17 +2,32 @@
 # STUBBED VERSION FOR DEPLOYMENT WITHOUT data_api
 
 from flask import current_app
+from .http_transport import get_transport, TransportError
+from .price_series import PriceSeries
 
 class YahooFinanceClient:
-    def __init__(self):
+    def __init__(self, transport=None):
         # self.client = ApiClient() # Removed data_api dependency
+        # Shared pooled/rate-limited/circuit-broken transport for the real (non-stubbed) endpoints
+        self.transport = transport or get_transport("yahoo_finance")
         current_app.logger.info("[STUBBED] YahooFinanceClient initialized (no actual API client)")
 
-    def get_stock_chart_data(self, symbol, interval="1d", range="1y", region="US", include_adjusted_close=True):
-        """Fetches historical stock chart data - STUBBED."""
-        current_app.logger.info(f"[STUBBED] get_stock_chart_data for {symbol}")
+    def _get_json(self, path, params=None):
+        """Calls the upstream through the shared transport, returning an error payload instead of raising."""
+        try:
+            return self.transport.get_json(path, params=params)
+        except TransportError as e:
+            current_app.logger.warning(f"{self.transport.upstream} request failed: {e}")
+            return {"error": str(e)}
+
+    def get_stock_chart_data(self, symbol, interval="1d", range="1y", region="US", include_adjusted_close=True, period1=None, period2=None):
+        """
+        Fetches historical stock chart data - STUBBED.
+        period1/period2 (epoch seconds) select an explicit window and take precedence over range, as in the real API.
+        """
+        current_app.logger.info(f"[STUBBED] get_stock_chart_data for {symbol} (range={range}, period1={period1}, period2={period2})")
         # Return minimal valid-looking dummy data
-        return {
+        chart_data = {
             "meta": {"symbol": symbol, "currency": "USD", "exchangeName": "NMS", "instrumentType": "EQUITY", "firstTradeDate": 1588000000, "regularMarketTime": 1688000000, "gmtoffset": -14400, "timezone": "EDT", "exchangeTimezoneName": "America/New_York", "regularMarketPrice": 150.0, "chartPreviousClose": 149.0, "priceHint": 2, "currentTradingPeriod": {"pre": {}, "regular": {}, "post": {}}, "dataGranularity": "1d", "range": "1y", "validRanges": ["1d", "5d", "1mo", "3mo", "6mo", "1y", "2y", "5y", "10y", "ytd", "max"]},
             "timestamp": [1687000000, 1687100000], 
             "indicators": {
@@ -28,6 +43,23 @@ class YahooFinanceClient:
                 }]
             }
         }
+        if period1 is not None or period2 is not None:
+            keep = [i for i, ts in enumerate(chart_data["timestamp"])
+                    if (period1 is None or ts >= period1) and (period2 is None or ts < period2)]
+            chart_data["timestamp"] = [chart_data["timestamp"][i] for i in keep]
+            quote = chart_data["indicators"]["quote"][0]
+            for field in quote:
+                quote[field] = [quote[field][i] for i in keep]
+            adjclose = chart_data["indicators"]["adjclose"][0]
+            adjclose["adjclose"] = [adjclose["adjclose"][i] for i in keep]
+        return chart_data
+
+    def get_price_series(self, symbol, interval="1d", range="1y", period1=None, period2=None):
+        """Fetches chart data and returns it as a compact PriceSeries (or the error payload on failure)."""
+        chart_data = self.get_stock_chart_data(symbol, interval=interval, range=range, period1=period1, period2=period2)
+        if not chart_data or chart_data.get("error"):
+            return chart_data
+        return PriceSeries.from_chart(chart_data, symbol=symbol)
 
     def get_stock_insights_data(self, symbol, region="US"): 
         """Fetches stock insights data - STUBBED."""
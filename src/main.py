@@ -14,18 +14,131 @@ app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev_secret_key_please_c
 # Database Configuration (SQLite for development)
 app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///portfolio_app.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+# Market data fetching: max concurrent upstream calls per portfolio aggregation (1 = sequential)
+app.config['DATA_AGGREGATOR_MAX_WORKERS'] = int(os.environ.get('DATA_AGGREGATOR_MAX_WORKERS', 8))
+# DataBank macro indicators are shared by every holding and cached process-wide for this long
+app.config['MACRO_INDICATOR_TTL_SECONDS'] = int(os.environ.get('MACRO_INDICATOR_TTL_SECONDS', 24 * 60 * 60))
+# YahooFinance response cache: per-endpoint TTLs, LRU size bound and stale-while-revalidate
+app.config['MARKET_DATA_TTL_SECONDS'] = {
+    'chart': int(os.environ.get('MARKET_DATA_CHART_TTL_SECONDS', 5 * 60)),
+    'insights': int(os.environ.get('MARKET_DATA_INSIGHTS_TTL_SECONDS', 4 * 60 * 60)),
+    'analyst_opinions': int(os.environ.get('MARKET_DATA_ANALYST_OPINIONS_TTL_SECONDS', 24 * 60 * 60)),
+}
+app.config['MARKET_DATA_CACHE_MAX_ENTRIES'] = int(os.environ.get('MARKET_DATA_CACHE_MAX_ENTRIES', 2000))
+app.config['MARKET_DATA_STALE_WHILE_REVALIDATE'] = os.environ.get('MARKET_DATA_STALE_WHILE_REVALIDATE', 'true').lower() == 'true'
+app.config['MARKET_DATA_STALE_MAX_AGE_SECONDS'] = int(os.environ.get('MARKET_DATA_STALE_MAX_AGE_SECONDS', 24 * 60 * 60))
+# Local OHLCV store for incremental chart downloads (set PRICE_HISTORY_DB_PATH to an empty string to disable)
+app.config['PRICE_HISTORY_DB_PATH'] = os.environ.get('PRICE_HISTORY_DB_PATH', os.path.join(app.instance_path, 'price_history.sqlite3'))
+app.config['PRICE_HISTORY_INITIAL_RANGE'] = os.environ.get('PRICE_HISTORY_INITIAL_RANGE', '5y')
+# Keep per-ticker indicator state in the price history store and advance it bar by bar instead of recomputing
+app.config['STREAMING_INDICATORS_ENABLED'] = os.environ.get('STREAMING_INDICATORS_ENABLED', 'true').lower() == 'true'
+# Computed features shared across sessions and worker processes (set FEATURE_STORE_DB_PATH to an empty string to disable)
+app.config['FEATURE_STORE_DB_PATH'] = os.environ.get('FEATURE_STORE_DB_PATH', os.path.join(app.instance_path, 'feature_store.sqlite3'))
+app.config['FEATURE_STORE_MAX_ENTRIES'] = int(os.environ.get('FEATURE_STORE_MAX_ENTRIES', 50000))
+# VADER scores keyed by text hash and lexicon version (set SENTIMENT_CACHE_DB_PATH to an empty string to keep them in memory only)
+app.config['SENTIMENT_CACHE_DB_PATH'] = os.environ.get('SENTIMENT_CACHE_DB_PATH', os.path.join(app.instance_path, 'sentiment_cache.sqlite3'))
+app.config['SENTIMENT_CACHE_MAX_ENTRIES'] = int(os.environ.get('SENTIMENT_CACHE_MAX_ENTRIES', 50000))
+# Load the VADER lexicon at import time, so with `gunicorn --preload` workers inherit it from the master
+app.config['SENTIMENT_PRELOAD'] = os.environ.get('SENTIMENT_PRELOAD', 'true').lower() == 'true'
+# Shard large uncached sentiment batches across this many processes (0 = score in the request thread)
+app.config['SENTIMENT_PROCESS_WORKERS'] = int(os.environ.get('SENTIMENT_PROCESS_WORKERS', 0))
+app.config['SENTIMENT_PROCESS_MIN_TEXTS'] = int(os.environ.get('SENTIMENT_PROCESS_MIN_TEXTS', 2000))
+# Per-ticker news sentiment as an exponentially time-decayed mean, updated with new items only (0 = plain mean of current news)
+app.config['NEWS_SENTIMENT_HALF_LIFE_DAYS'] = float(os.environ.get('NEWS_SENTIMENT_HALF_LIFE_DAYS', 7))
+app.config['NEWS_SENTIMENT_DB_PATH'] = os.environ.get('NEWS_SENTIMENT_DB_PATH', os.path.join(app.instance_path, 'news_sentiment.sqlite3'))
+app.config['NEWS_FEED_PATH'] = os.environ.get('NEWS_FEED_PATH', '') # Optional local JSON-lines news feed
+# Declarative advice rules and thresholds; edits to the file are picked up without a restart
+app.config['ADVICE_RULES_PATH'] = os.environ.get('ADVICE_RULES_PATH', os.path.join(os.path.dirname(__file__), 'ai_engine', 'advice_rules.json'))
+# Portfolio CSV uploads are read, validated and inserted this many rows at a time (0 = whole file at once)
+app.config['UPLOAD_CHUNK_ROWS'] = int(os.environ.get('UPLOAD_CHUNK_ROWS', 10000))
+# Re-uploads are applied as a diff against the stored holdings (up to this many), so only changed tickers are re-analyzed
+app.config['UPLOAD_DIFF_ENABLED'] = os.environ.get('UPLOAD_DIFF_ENABLED', 'true').lower() == 'true'
+app.config['UPLOAD_DIFF_MAX_ROWS'] = int(os.environ.get('UPLOAD_DIFF_MAX_ROWS', 100000))
+# Largest number of holdings (all portfolios together) accepted by one POST /api/batch/analyze
+app.config['BATCH_ANALYSIS_MAX_HOLDINGS'] = int(os.environ.get('BATCH_ANALYSIS_MAX_HOLDINGS', 100000))
+# Staged analysis pipeline (MainAnalyzer.iter_portfolio_advice): worker threads per stage, bounded queue size, micro-batch size
+app.config['ANALYSIS_PIPELINE_WORKERS'] = {
+    'fetch': int(os.environ.get('ANALYSIS_PIPELINE_FETCH_WORKERS', 8)),
+    'features': int(os.environ.get('ANALYSIS_PIPELINE_FEATURES_WORKERS', 1)),
+    'sentiment': int(os.environ.get('ANALYSIS_PIPELINE_SENTIMENT_WORKERS', 1)),
+    'rules': int(os.environ.get('ANALYSIS_PIPELINE_RULES_WORKERS', 1)),
+}
+app.config['ANALYSIS_PIPELINE_QUEUE_SIZE'] = int(os.environ.get('ANALYSIS_PIPELINE_QUEUE_SIZE', 32))
+app.config['ANALYSIS_PIPELINE_BATCH_SIZE'] = int(os.environ.get('ANALYSIS_PIPELINE_BATCH_SIZE', 32))
+# Background analysis jobs: run by a worker thread in each web process (ANALYSIS_WORKER_IN_APP) and/or the Procfile worker
+app.config['ANALYSIS_WORKER_IN_APP'] = os.environ.get('ANALYSIS_WORKER_IN_APP', 'true').lower() == 'true'
+app.config['ANALYSIS_JOB_POLL_SECONDS'] = float(os.environ.get('ANALYSIS_JOB_POLL_SECONDS', 1))
+app.config['ANALYSIS_JOB_STALE_SECONDS'] = int(os.environ.get('ANALYSIS_JOB_STALE_SECONDS', 120))
+app.config['ANALYSIS_JOB_MAX_ATTEMPTS'] = int(os.environ.get('ANALYSIS_JOB_MAX_ATTEMPTS', 3))
+# After a differential re-upload, stored advice for unchanged tickers is reused only if it is younger than this
+app.config['ANALYSIS_REUSE_MAX_AGE_SECONDS'] = int(os.environ.get('ANALYSIS_REUSE_MAX_AGE_SECONDS', 4 * 60 * 60))
+# Portfolio risk: covariance of daily returns over this many days, kept incrementally for up to this many tickers
+app.config['RISK_LOOKBACK_DAYS'] = int(os.environ.get('RISK_LOOKBACK_DAYS', 252))
+app.config['RISK_UNIVERSE_MAX_TICKERS'] = int(os.environ.get('RISK_UNIVERSE_MAX_TICKERS', 500))
+app.config['RISK_VAR_CONFIDENCE_LEVELS'] = tuple(float(level) for level in os.environ.get('RISK_VAR_CONFIDENCE_LEVELS', '0.95,0.99').split(','))
+# Shared HTTP transport for the market data APIs: pooled keep-alive session, per-upstream rate limits, retries, circuit breaker
+app.config['HTTP_UPSTREAMS'] = {
+    'yahoo_finance': {
+        'base_url': os.environ.get('YAHOO_FINANCE_BASE_URL', 'https://query1.finance.yahoo.com'),
+        'rate_per_second': float(os.environ.get('YAHOO_FINANCE_RATE_LIMIT', 10)),
+    },
+    'data_bank': {
+        'base_url': os.environ.get('DATA_BANK_BASE_URL', 'https://api.worldbank.org/v2'),
+        'rate_per_second': float(os.environ.get('DATA_BANK_RATE_LIMIT', 5)),
+    },
+}
+app.config['HTTP_POOL_MAXSIZE'] = int(os.environ.get('HTTP_POOL_MAXSIZE', 32))
+app.config['HTTP_TIMEOUT_SECONDS'] = float(os.environ.get('HTTP_TIMEOUT_SECONDS', 10))
+app.config['HTTP_MAX_RETRIES'] = int(os.environ.get('HTTP_MAX_RETRIES', 2))
+app.config['CIRCUIT_BREAKER_FAILURE_THRESHOLD'] = int(os.environ.get('CIRCUIT_BREAKER_FAILURE_THRESHOLD', 5))
+app.config['CIRCUIT_BREAKER_RESET_SECONDS'] = float(os.environ.get('CIRCUIT_BREAKER_RESET_SECONDS', 30))
+# Daily pre-market warm-up of market data for held tickers, most widely held first, within a request budget (per day, shared by all processes)
+app.config['WARMUP_ENABLED'] = os.environ.get('WARMUP_ENABLED', 'false').lower() == 'true'
+app.config['WARMUP_RUN_AT_UTC'] = os.environ.get('WARMUP_RUN_AT_UTC', '12:00')
+app.config['WARMUP_REQUEST_BUDGET'] = int(os.environ.get('WARMUP_REQUEST_BUDGET', 300))
 db = SQLAlchemy(app) # Initialize SQLAlchemy with the app instance
 # Import and register blueprints after db is initialized and models are defined
 from src.routes.upload_routes import upload_bp
 from src.routes.view_routes import view_bp
+from src.routes.system_routes import system_bp
+from src.routes.job_routes import job_bp
+from src.routes.batch_routes import batch_bp
 app.register_blueprint(upload_bp, url_prefix="/api") # Corrected quoting for url_prefix
 app.register_blueprint(view_bp) # Register view_bp, typically without a prefix for root views like '/' and '/dashboard'
+app.register_blueprint(system_bp, url_prefix="/api/system") # Operational endpoints (cache statistics, etc.)
+app.register_blueprint(job_bp, url_prefix="/api/jobs") # Analysis job status and results
+app.register_blueprint(batch_bp, url_prefix="/api/batch") # Many portfolios analyzed as one queued job
 
 # Import models here to ensure they are registered with SQLAlchemy before db.create_all()
 from src.models.portfolio_holding import PortfolioHolding # Example, will be created later
+from src.models.portfolio_position import PortfolioPosition
+from src.models.analysis_job import AnalysisJob
+from src.models.upload_progress import UploadProgress
+from src.models.batch_input import BatchInput
+from src.models.warmup_run import WarmupRun
 
 with app.app_context():
     db.create_all() # Create database tables if they don't exist
+    db.engine.dispose() # Do not hand pooled connections opened here to forked (--preload) workers
+
+if app.config['SENTIMENT_PRELOAD']:
+    from src.ai_engine.sentiment_analyzer import get_vader_analyzer
+    get_vader_analyzer()
+
+if app.config['ANALYSIS_WORKER_IN_APP']:
+    from src.ai_engine.analysis_jobs import ensure_analysis_worker_started
+
+    @app.before_request
+    def start_analysis_worker():
+        ensure_analysis_worker_started(app) # No-op after the first request in each worker process
+
+if app.config['WARMUP_ENABLED']:
+    from src.data_services.warmup_scheduler import ensure_warmup_scheduler_started
+
+    @app.before_request
+    def start_warmup_scheduler():
+        ensure_warmup_scheduler_started(app) # No-op after the first request in each worker process
 
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
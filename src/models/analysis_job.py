@@ -0,0 +1,50 @@
+from src.main import db # Import db instance from main.py
+import datetime
+import json
+
+class AnalysisJob(db.Model):
+    __tablename__ = 'analysis_job'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    # One job per upload session: re-uploading re-queues the same row instead of adding a second job
+    session_id = db.Column(db.String(255), nullable=False, unique=True, index=True)
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True) # queued, running, succeeded, failed
+    phase = db.Column(db.String(20), nullable=True) # analyzing (holdings streaming through the pipeline), risk while running
+    progress_done = db.Column(db.Integer, nullable=False, default=0)
+    progress_total = db.Column(db.Integer, nullable=False, default=0)
+    # Bumped on every enqueue; a run only stores its result if the holdings did not change meanwhile
+    revision = db.Column(db.Integer, nullable=False, default=1)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    worker_id = db.Column(db.String(255), nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    result = db.Column(db.Text, nullable=True) # JSON: {"recommendations": [...], "portfolio_risk": {...}}
+    # JSON list of the tickers whose lots changed since the stored result; NULL means analyze every holding
+    changed_tickers = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<AnalysisJob {self.session_id} {self.status}>'
+
+    def result_data(self):
+        return json.loads(self.result) if self.result else None
+
+    def changed_ticker_set(self):
+        return set(json.loads(self.changed_tickers)) if self.changed_tickers is not None else None
+
+    def to_dict(self):
+        return {
+            'session_id': self.session_id,
+            'status': self.status,
+            'phase': self.phase,
+            'progress_done': self.progress_done,
+            'progress_total': self.progress_total,
+            'attempts': self.attempts,
+            'changed_tickers': sorted(self.changed_ticker_set()) if self.changed_tickers is not None else None,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
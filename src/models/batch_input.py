@@ -0,0 +1,45 @@
+from src.main import db # Import db instance from main.py
+import datetime
+import json
+
+class BatchInput(db.Model):
+    """
+    The validated portfolios of a queued batch analysis (POST /api/batch/analyze), kept until its
+    AnalysisJob (same session_id) has stored the result.
+    """
+    __tablename__ = 'batch_input'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    session_id = db.Column(db.String(255), nullable=False, unique=True, index=True) # The batch's AnalysisJob key
+    # JSON: [{"portfolio_id", "holdings": [{"ticker_symbol", "quantity", "purchase_price", "purchase_date"}]}]
+    portfolios = db.Column(db.Text, nullable=False)
+    error_rows = db.Column(db.Text, nullable=False) # JSON: the rows rejected by validation
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+
+    def __repr__(self):
+        return f'<BatchInput {self.session_id}>'
+
+    @classmethod
+    def from_portfolios(cls, session_id, portfolios, error_rows):
+        """:param portfolios: List of (portfolio_id, holdings) as returned by portfolio_csv.group_portfolios."""
+        return cls(
+            session_id=session_id,
+            portfolios=json.dumps([{
+                "portfolio_id": portfolio_id,
+                "holdings": [dict(holding, purchase_date=holding["purchase_date"].isoformat() if holding["purchase_date"] else None)
+                             for holding in holdings],
+            } for portfolio_id, holdings in portfolios]),
+            error_rows=json.dumps(error_rows),
+        )
+
+    def portfolio_list(self):
+        """:return: List of (portfolio_id, holdings), as stored by from_portfolios."""
+        portfolios = []
+        for portfolio in json.loads(self.portfolios):
+            holdings = [dict(holding, purchase_date=datetime.date.fromisoformat(holding["purchase_date"]) if holding["purchase_date"] else None)
+                        for holding in portfolio["holdings"]]
+            portfolios.append((portfolio["portfolio_id"], holdings))
+        return portfolios
+
+    def error_list(self):
+        return json.loads(self.error_rows)
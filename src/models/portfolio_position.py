@@ -0,0 +1,88 @@
+from src.main import db # Import db instance from main.py
+from sqlalchemy import case, func, insert
+import datetime
+
+REFRESH_BATCH = 500 # Tickers per IN (...) list
+
+class PortfolioPosition(db.Model):
+    """
+    One row per ticker of an upload session: its PortfolioHolding lots merged. Maintained by the
+    upload (refresh) and analyzed instead of the individual lots; the lots stay for display.
+    """
+    __tablename__ = 'portfolio_position'
+    __table_args__ = (db.UniqueConstraint('session_id', 'ticker_symbol'),)
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    session_id = db.Column(db.String(255), nullable=False, index=True)
+    ticker_symbol = db.Column(db.String(20), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False) # Total over the lots
+    # Quantity-weighted average of the lots' purchase prices (lots without one are left out of the average)
+    purchase_price = db.Column(db.Float, nullable=True)
+    # Quantity of the lots with a purchase price: cost basis and unrealized P&L cover only these shares
+    priced_quantity = db.Column(db.Integer, nullable=False, default=0)
+    purchase_date = db.Column(db.Date, nullable=True) # Earliest purchase date of the lots
+    lot_count = db.Column(db.Integer, nullable=False, default=1)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+
+    def __repr__(self):
+        return f'<PortfolioPosition {self.ticker_symbol} ({self.quantity} in {self.lot_count} lots) for session {self.session_id}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'session_id': self.session_id,
+            'ticker_symbol': self.ticker_symbol,
+            'quantity': self.quantity,
+            'purchase_price': self.purchase_price,
+            'priced_quantity': self.priced_quantity,
+            'purchase_date': self.purchase_date.isoformat() if self.purchase_date else None,
+            'lot_count': self.lot_count,
+            'updated_at': self.updated_at.isoformat()
+        }
+
+    @classmethod
+    def refresh(cls, session_id, tickers=None):
+        """
+        Rebuilds the session's positions from its lots with aggregate queries. Does not commit, so
+        the positions change in the same transaction as the lots.
+        :param tickers: Only rebuild these tickers' positions (the ones whose lots changed); None for all.
+        :return: Number of positions written.
+        """
+        if tickers is None:
+            return cls._rebuild(session_id, None)
+        tickers = sorted(set(tickers))
+        return sum(cls._rebuild(session_id, tickers[start:start + REFRESH_BATCH]) for start in range(0, len(tickers), REFRESH_BATCH))
+
+    @classmethod
+    def _rebuild(cls, session_id, tickers):
+        from src.models.portfolio_holding import PortfolioHolding
+
+        priced = PortfolioHolding.purchase_price.isnot(None)
+        lots = db.session.query(
+            PortfolioHolding.ticker_symbol,
+            func.sum(PortfolioHolding.quantity),
+            func.sum(case((priced, PortfolioHolding.quantity * PortfolioHolding.purchase_price))),
+            func.sum(case((priced, PortfolioHolding.quantity))),
+            func.min(PortfolioHolding.purchase_date),
+            func.count(PortfolioHolding.id),
+        ).filter(PortfolioHolding.session_id == session_id).group_by(PortfolioHolding.ticker_symbol)
+        stale = cls.query.filter(cls.session_id == session_id)
+        if tickers is not None:
+            lots = lots.filter(PortfolioHolding.ticker_symbol.in_(tickers))
+            stale = stale.filter(cls.ticker_symbol.in_(tickers))
+        stale.delete(synchronize_session=False)
+
+        now = datetime.datetime.utcnow()
+        positions = [{
+            "session_id": session_id,
+            "ticker_symbol": ticker,
+            "quantity": quantity,
+            "purchase_price": cost / priced_quantity if priced_quantity else None,
+            "priced_quantity": priced_quantity or 0,
+            "purchase_date": purchase_date,
+            "lot_count": lot_count,
+            "updated_at": now,
+        } for ticker, quantity, cost, priced_quantity, purchase_date, lot_count in lots]
+        if positions:
+            db.session.execute(insert(cls.__table__), positions)
+        return len(positions)
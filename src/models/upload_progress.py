@@ -0,0 +1,40 @@
+from src.main import db # Import db instance from main.py
+import datetime
+
+class UploadProgress(db.Model):
+    __tablename__ = 'upload_progress'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    # Chosen by the upload page (or generated by the server), so the page can poll while the upload request runs
+    upload_id = db.Column(db.String(64), nullable=False, unique=True, index=True)
+    session_id = db.Column(db.String(255), nullable=False, index=True)
+    filename = db.Column(db.String(255), nullable=True)
+    status = db.Column(db.String(20), nullable=False, default='running') # running, succeeded, failed
+    rows_processed = db.Column(db.Integer, nullable=False, default=0)
+    rows_rejected = db.Column(db.Integer, nullable=False, default=0)
+    chunks_done = db.Column(db.Integer, nullable=False, default=0)
+    bytes_read = db.Column(db.Integer, nullable=True)
+    bytes_total = db.Column(db.Integer, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    started_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<UploadProgress {self.upload_id} {self.status}>'
+
+    def to_dict(self):
+        return {
+            'upload_id': self.upload_id,
+            'filename': self.filename,
+            'status': self.status,
+            'rows_processed': self.rows_processed,
+            'rows_rejected': self.rows_rejected,
+            'chunks_done': self.chunks_done,
+            'bytes_read': self.bytes_read,
+            'bytes_total': self.bytes_total,
+            'error': self.error,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
@@ -0,0 +1,21 @@
+from src.main import db # Import db instance from main.py
+import datetime
+
+class WarmupRun(db.Model):
+    """
+    The day's market data warm-up, shared by every process that runs it (web workers, the worker
+    and warmup processes): they take their requests from this row, so the request budget holds for
+    the run as a whole, and the chart data of each ticker is refreshed by one process only.
+    """
+    __tablename__ = 'warmup_run'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    run_date = db.Column(db.Date, nullable=False, unique=True) # UTC date of the run: one run (and budget) per day
+    request_budget = db.Column(db.Integer, nullable=False)
+    requests_reserved = db.Column(db.Integer, nullable=False, default=0) # Taken by the processes so far
+    tickers_claimed = db.Column(db.Integer, nullable=False, default=0) # Chart data of the tickers ranked below this is taken
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+
+    def __repr__(self):
+        return f'<WarmupRun {self.run_date} ({self.requests_reserved} of {self.request_budget} requests)>'
@@ -0,0 +1,98 @@
+import io
+import pandas as pd
+from flask import Blueprint, request, jsonify, current_app, url_for
+from src.ai_engine.analysis_jobs import enqueue_batch_job
+from src.data_services.portfolio_csv import BATCH_ID_COLUMN, group_portfolios, read_batch_csv
+
+batch_bp = Blueprint("batch_bp", __name__)
+
+DEFAULT_MAX_HOLDINGS = 100000
+JSON_FIELDS = {"ticker": "Ticker", "quantity": "Quantity", "purchase_price": "PurchasePrice", "purchase_date": "PurchaseDate"}
+NUMERIC_FIELDS = ("quantity", "purchase_price") # JSON numbers or text, like a CSV cell; never true/false, lists or objects
+
+def _is_number_or_text(value):
+    return isinstance(value, (int, float, str)) and not isinstance(value, bool)
+
+def _portfolios_from_json(payload):
+    """
+    Validates a {"portfolios": [{"id", "holdings": [{"ticker", "quantity", "purchase_price", "purchase_date"}]}]}
+    body with the same checks as a CSV upload.
+    :return: (portfolios, error_rows); error rows name the portfolio_id and the holding's index in it.
+    :raises ValueError: If the body does not have that shape.
+    """
+    portfolios = payload.get("portfolios") if isinstance(payload, dict) else None
+    if not isinstance(portfolios, list):
+        raise ValueError('Expected a JSON object with a "portfolios" list.')
+    ids, rows, positions = [], [], []
+    errors = [] # (index over all holdings, error)
+    for portfolio in portfolios:
+        if not isinstance(portfolio, dict) or not isinstance(portfolio.get("holdings"), list):
+            raise ValueError('Each portfolio must be an object with an "id" and a "holdings" list.')
+        portfolio_id = str(portfolio.get("id") or "").strip()
+        if not portfolio_id or portfolio_id in ids:
+            raise ValueError(f"Portfolio ids must be non-empty and unique: {portfolio.get('id')!r}")
+        ids.append(portfolio_id)
+        for i, holding in enumerate(portfolio["holdings"]):
+            if not isinstance(holding, dict):
+                raise ValueError(f"Holding {i} of portfolio {portfolio_id} is not an object.")
+            # Checked before the frame is built: a true quantity would otherwise be read as 1
+            invalid = [JSON_FIELDS[field] for field in NUMERIC_FIELDS if holding.get(field) is not None and not _is_number_or_text(holding[field])]
+            if invalid:
+                error = {"field": invalid[0], "error": f"Invalid format for {invalid[0]}.", "portfolio_id": portfolio_id, "holding": i}
+                errors.append((len(rows) + len(errors), error))
+                continue
+            row = {column: holding.get(field) for field, column in JSON_FIELDS.items()}
+            row["Ticker"] = row["Ticker"] or "" # A missing ticker is rejected like an empty CSV cell
+            rows.append(dict(row, **{BATCH_ID_COLUMN: portfolio_id}))
+            positions.append((len(rows) - 1 + len(errors), i))
+
+    grouped, error_rows = group_portfolios(pd.DataFrame(rows, columns=[BATCH_ID_COLUMN, *JSON_FIELDS.values()]))
+    grouped = dict(grouped)
+    for error in error_rows:
+        order, holding_index = positions[error["row"] - 2]
+        error = dict(error, holding=holding_index)
+        del error["row"] # CSV line numbers mean nothing for a JSON body
+        errors.append((order, error))
+    errors.sort(key=lambda entry: entry[0]) # In holding order
+    return [(portfolio_id, grouped.get(portfolio_id, [])) for portfolio_id in ids], [error for _, error in errors]
+
+@batch_bp.route("/analyze", methods=["POST"])
+def analyze_portfolios():
+    """
+    Queues the analysis of many portfolios, which fetches and analyzes each distinct ticker once.
+    Accepts a JSON body (see _portfolios_from_json), or a CSV with a PortfolioId column plus the
+    upload columns, as a "file" form field or as a text/csv body. The rows are validated here; the
+    analysis runs as an analysis job, whose result is {"portfolios": [{"portfolio_id",
+    "recommendations", "portfolio_risk"}], "errors", "stats"}.
+    :return: 202 with {"job_id", "status_url", "result_url", "errors"}.
+    """
+    try:
+        if request.is_json:
+            portfolios, error_rows = _portfolios_from_json(request.get_json(silent=True))
+        elif "file" in request.files:
+            portfolios, error_rows = read_batch_csv(request.files["file"].stream)
+        elif request.mimetype == "text/csv":
+            portfolios, error_rows = read_batch_csv(io.BytesIO(request.get_data()))
+        else:
+            return jsonify({"error": "Send a JSON body, a text/csv body, or a CSV file in the 'file' field."}), 400
+    except ValueError as e: # Includes CSV parser and decoding errors
+        return jsonify({"error": f"Invalid batch: {e}"}), 400
+
+    row_count = sum(len(holdings) for _, holdings in portfolios) + len(error_rows)
+    max_holdings = current_app.config.get("BATCH_ANALYSIS_MAX_HOLDINGS", DEFAULT_MAX_HOLDINGS)
+    if row_count > max_holdings:
+        return jsonify({"error": f"Batch has {row_count} holdings; the limit is {max_holdings}."}), 413
+    if not portfolios:
+        return jsonify({"error": "The batch contains no portfolios.", "errors": error_rows}), 400
+
+    try:
+        job = enqueue_batch_job(portfolios, error_rows)
+    except Exception as e:
+        current_app.logger.error(f"Queueing batch analysis failed: {e}", exc_info=True)
+        return jsonify({"error": "System error while queueing the batch."}), 500
+    return jsonify({
+        "job_id": job.session_id,
+        "status_url": url_for("job_bp.job_status", session_id=job.session_id),
+        "result_url": url_for("job_bp.job_result", session_id=job.session_id),
+        "errors": error_rows,
+    }), 202
@@ -0,0 +1,24 @@
+from flask import Blueprint, jsonify
+from src.models.analysis_job import AnalysisJob
+
+job_bp = Blueprint("job_bp", __name__)
+
+@job_bp.route("/<session_id>", methods=["GET"])
+def job_status(session_id):
+    """Reports the status and progress of the analysis job for an upload session (or a queued batch, see batch_routes)."""
+    job = AnalysisJob.query.filter_by(session_id=session_id).first()
+    if job is None:
+        return jsonify({"error": "No analysis job for this session"}), 404
+    return jsonify(job.to_dict())
+
+@job_bp.route("/<session_id>/result", methods=["GET"])
+def job_result(session_id):
+    """Returns the stored analysis result: 200 with the result once done, 202 while queued or running, 409 if it failed."""
+    job = AnalysisJob.query.filter_by(session_id=session_id).first()
+    if job is None:
+        return jsonify({"error": "No analysis job for this session"}), 404
+    if job.status == "succeeded":
+        return jsonify(dict(job.to_dict(), result=job.result_data()))
+    if job.status == "failed":
+        return jsonify(job.to_dict()), 409
+    return jsonify(job.to_dict()), 202
@@ -0,0 +1,53 @@
+from flask import Blueprint, jsonify
+from src.ai_engine.analysis_jobs import get_analysis_worker
+from src.ai_engine.feature_store import get_feature_store
+from src.ai_engine.news_sentiment import get_news_sentiment_tracker
+from src.ai_engine.pipeline import get_pipeline_stats
+from src.ai_engine.risk_engine import get_return_covariance
+from src.ai_engine.sentiment_cache import get_sentiment_cache
+from src.data_services.market_data_cache import get_market_data_cache, get_market_data_single_flight
+from src.data_services.http_transport import get_transport_stats
+from src.data_services.warmup_scheduler import get_warmup_scheduler
+
+system_bp = Blueprint("system_bp", __name__)
+
+@system_bp.route("/cache_stats", methods=["GET"])
+def cache_stats():
+    """Reports hit/miss/eviction counters for this worker process, to help size the caches."""
+    feature_store = get_feature_store()
+    news_sentiment = get_news_sentiment_tracker()
+    return jsonify({
+        "market_data": get_market_data_cache().stats(),
+        "market_data_single_flight": get_market_data_single_flight().stats(),
+        "feature_store": feature_store.stats() if feature_store else None,
+        "sentiment": get_sentiment_cache().stats(),
+        "news_sentiment": news_sentiment.stats() if news_sentiment else None,
+        "risk_covariance": get_return_covariance().stats(),
+    })
+
+@system_bp.route("/upstreams", methods=["GET"])
+def upstream_stats():
+    """Reports circuit breaker state and rate-limiter headroom per upstream API for this worker process."""
+    return jsonify(get_transport_stats())
+
+@system_bp.route("/pipelines", methods=["GET"])
+def pipeline_stats():
+    """Reports queue depths and per-stage throughput of the analysis pipelines running in (or recently run by) this worker process."""
+    return jsonify(get_pipeline_stats())
+
+@system_bp.route("/analysis_worker", methods=["GET"])
+def analysis_worker_status():
+    """Reports the in-app analysis worker of this process and the number of jobs per status."""
+    from sqlalchemy import func
+    from src.main import db
+    from src.models.analysis_job import AnalysisJob
+
+    worker = get_analysis_worker()
+    counts = dict(db.session.query(AnalysisJob.status, func.count(AnalysisJob.id)).group_by(AnalysisJob.status).all())
+    return jsonify({"worker": worker.status() if worker else {"running": False}, "jobs": counts})
+
+@system_bp.route("/warmup", methods=["GET"])
+def warmup_status():
+    """Reports the in-app market data warm-up schedule and the outcome of its last run."""
+    scheduler = get_warmup_scheduler()
+    return jsonify(scheduler.status() if scheduler else {"running": False})
@@ -1,21 +1,99 @@
 from flask import Blueprint, request, jsonify, current_app, session, redirect, url_for, render_template
 import pandas as pd
 import os
+import re
+import itertools
 import uuid # For generating unique session IDs if needed, or use Flask session
-from datetime import datetime
+from datetime import datetime, timedelta
 from werkzeug.utils import secure_filename
+from sqlalchemy import bindparam, insert
 
 from src.main import db
 from src.models.portfolio_holding import PortfolioHolding
+from src.models.portfolio_position import PortfolioPosition
+from src.models.upload_progress import UploadProgress
+from src.data_services.portfolio_csv import DEFAULT_CHUNK_ROWS, REQUIRED_COLUMNS, HoldingsDiff, read_csv_chunks, validate_holdings
+from src.ai_engine.analysis_jobs import enqueue_analysis_job
 
 upload_bp = Blueprint("upload_bp", __name__)
 
 ALLOWED_EXTENSIONS = {"csv"}
+UPLOAD_ID_PATTERN = re.compile(r"^[A-Za-z0-9-]{8,64}$")
+PROGRESS_RETENTION = timedelta(days=1) # Finished upload progress rows are pruned after this long
+DEFAULT_DIFF_MAX_ROWS = 100000
+IN_CLAUSE_BATCH = 500 # Ids or tickers per IN (...) list
 
 def allowed_file(filename):
     return "." in filename and \
            filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def _stream_size(stream):
+    try:
+        position = stream.tell()
+        size = stream.seek(0, os.SEEK_END)
+        stream.seek(position)
+        return size
+    except Exception:
+        return None # Not seekable: progress is reported in rows only
+
+def _stream_position(stream):
+    try:
+        return stream.tell() # Ahead of the rows processed by at most the parser's read buffer
+    except Exception:
+        return None
+
+def _apply_holdings_diff(session_id, staging_session_id, diff):
+    """
+    Merges a staged re-upload into the session's holdings (not committed). A staged row with the
+    ticker and purchase date of a stored lot that no uploaded row matched updates that lot in
+    place; the other unmatched lots are deleted and the other staged rows are moved in.
+    :return: The set of tickers whose lots were inserted, updated or deleted.
+    """
+    removed = diff.unmatched()
+    changed_tickers = {ticker for ticker, _ in removed}
+    changed_tickers.update(ticker for (ticker,) in db.session.query(PortfolioHolding.ticker_symbol).filter_by(session_id=staging_session_id).distinct())
+
+    updates, deleted_ids = [], []
+    removed_tickers = sorted({ticker for ticker, _ in removed})
+    for start in range(0, len(removed_tickers), IN_CLAUSE_BATCH):
+        staged = db.session.query(
+            PortfolioHolding.id, PortfolioHolding.ticker_symbol, PortfolioHolding.purchase_date,
+            PortfolioHolding.quantity, PortfolioHolding.purchase_price,
+        ).filter(
+            PortfolioHolding.session_id == staging_session_id,
+            PortfolioHolding.ticker_symbol.in_(removed_tickers[start:start + IN_CLAUSE_BATCH]),
+        ).order_by(PortfolioHolding.id)
+        for staged_id, ticker, purchase_date, quantity, purchase_price in staged:
+            ids = removed.get((ticker, purchase_date))
+            if ids:
+                updates.append({"holding_id": ids.pop(), "new_quantity": quantity, "new_purchase_price": purchase_price})
+                deleted_ids.append(staged_id)
+
+    table = PortfolioHolding.__table__
+    if updates:
+        db.session.execute(
+            table.update().where(table.c.id == bindparam("holding_id")).values(
+                quantity=bindparam("new_quantity"), purchase_price=bindparam("new_purchase_price"), uploaded_at=datetime.utcnow()),
+            updates,
+        )
+    deleted_ids += [holding_id for ids in removed.values() for holding_id in ids]
+    for start in range(0, len(deleted_ids), IN_CLAUSE_BATCH):
+        db.session.execute(table.delete().where(table.c.id.in_(deleted_ids[start:start + IN_CLAUSE_BATCH])))
+    PortfolioHolding.query.filter_by(session_id=staging_session_id).update({"session_id": session_id})
+    return changed_tickers
+
+def _prune_uploads():
+    """
+    Deletes progress rows older than PROGRESS_RETENTION, and the staged rows of those uploads that
+    never finished (the process handling them died before it could clean up).
+    """
+    expired = UploadProgress.query.filter(UploadProgress.started_at < datetime.utcnow() - PROGRESS_RETENTION)
+    orphaned = [f"{session_id}:{upload_id}" for session_id, upload_id in
+                expired.filter(UploadProgress.status != "succeeded").with_entities(UploadProgress.session_id, UploadProgress.upload_id)]
+    for start in range(0, len(orphaned), IN_CLAUSE_BATCH):
+        PortfolioHolding.query.filter(PortfolioHolding.session_id.in_(orphaned[start:start + IN_CLAUSE_BATCH])).delete(synchronize_session=False)
+    expired.delete(synchronize_session=False)
+
 @upload_bp.route("/upload_portfolio", methods=["POST"])
 def handle_portfolio_upload():
     if "portfolio_csv" not in request.files:
@@ -29,22 +107,19 @@ def handle_portfolio_upload():
 
     if file and allowed_file(file.filename):
         filename = secure_filename(file.filename)
-        # Instead of saving the file permanently, read it into memory with pandas
-        # If you need to save, use a temporary location or a dedicated upload folder
-        # For now, we process it directly.
-
+        # The file is read and validated in chunks of UPLOAD_CHUNK_ROWS rows, so memory stays flat
+        # however large the upload is; the first chunk also gives us the header.
+        chunks = read_csv_chunks(file.stream, current_app.config.get("UPLOAD_CHUNK_ROWS", DEFAULT_CHUNK_ROWS))
         try:
-            df = pd.read_csv(file.stream)
+            df = next(chunks)
         except Exception as e:
             current_app.logger.error(f"Error reading CSV: {e}")
             return jsonify({"error": f"Could not parse CSV file: {e}"}), 400
 
         # Validate CSV structure (headers)
-        required_columns = ["Ticker", "Quantity"]
-        optional_columns = ["PurchasePrice", "PurchaseDate"]
         actual_columns = df.columns.tolist()
 
-        for col in required_columns:
+        for col in REQUIRED_COLUMNS:
             if col not in actual_columns:
                 return jsonify({"error": f"Missing required column in CSV: {col}"}), 400
 
@@ -55,55 +130,80 @@ def handle_portfolio_upload():
             session["upload_session_id"] = str(uuid.uuid4())
         current_upload_session_id = session["upload_session_id"]
 
-        # Clear previous holdings for this session to avoid duplicates if re-uploading
-        PortfolioHolding.query.filter_by(session_id=current_upload_session_id).delete()
-        db.session.commit() # Commit the deletion
+        upload_id = request.form.get("upload_id", "")
+        if not UPLOAD_ID_PATTERN.match(upload_id) or UploadProgress.query.filter_by(upload_id=upload_id).first():
+            upload_id = str(uuid.uuid4())
+        _prune_uploads()
+        progress = UploadProgress(upload_id=upload_id, session_id=current_upload_session_id, filename=filename, bytes_total=_stream_size(file.stream))
+        db.session.add(progress)
+        db.session.commit()
 
+        # Chunks are inserted under a staging session id and only replace (or, in diff mode, are merged
+        # into) the session's holdings once the whole file has been read, so the dashboard and analysis
+        # jobs never see a half-uploaded portfolio, and a file that turns out to be malformed part-way
+        # through leaves the previous holdings in place.
+        staging_session_id = f"{current_upload_session_id}:{upload_id}"
+        diff = None
+        if current_app.config.get("UPLOAD_DIFF_ENABLED", True):
+            stored_count = PortfolioHolding.query.filter_by(session_id=current_upload_session_id).count()
+            if 0 < stored_count <= current_app.config.get("UPLOAD_DIFF_MAX_ROWS", DEFAULT_DIFF_MAX_ROWS):
+                # Re-upload: only rows that differ from a stored lot are staged
+                diff = HoldingsDiff(db.session.query(
+                    PortfolioHolding.id, PortfolioHolding.ticker_symbol, PortfolioHolding.quantity,
+                    PortfolioHolding.purchase_price, PortfolioHolding.purchase_date,
+                ).filter_by(session_id=current_upload_session_id))
         processed_rows = 0
         error_rows = []
+        try:
+            for chunk in itertools.chain([df], chunks):
+                holdings, chunk_errors = validate_holdings(chunk)
+                staged = diff.match(holdings) if diff is not None else holdings
+                if staged:
+                    # One executemany per chunk instead of an ORM object per row
+                    db.session.execute(insert(PortfolioHolding.__table__), [dict(holding, session_id=staging_session_id) for holding in staged])
+                processed_rows += len(holdings)
+                error_rows += chunk_errors
+                progress.rows_processed = processed_rows
+                progress.rows_rejected = len(error_rows)
+                progress.chunks_done += 1
+                progress.bytes_read = _stream_position(file.stream)
+                progress.updated_at = datetime.utcnow()
+                db.session.commit() # One transaction per chunk; the progress row is committed with its rows
+
+            # The staged rows become the session's holdings once the whole file has been read
+            if diff is None:
+                # Replace the session's previous holdings with the new ones in one transaction
+                PortfolioHolding.query.filter_by(session_id=current_upload_session_id).delete()
+                PortfolioHolding.query.filter_by(session_id=staging_session_id).update({"session_id": current_upload_session_id})
+                changed_tickers = None # Everything is analyzed again
+            else:
+                changed_tickers = _apply_holdings_diff(current_upload_session_id, staging_session_id, diff)
+                current_app.logger.info(f"Re-upload for session {current_upload_session_id}: {diff.unchanged} row(s) unchanged, "
+                                        f"{len(changed_tickers)} ticker(s) changed")
+            # Positions (lots merged per ticker) are what the analysis reads; rebuilt in the same transaction
+            PortfolioPosition.refresh(current_upload_session_id, changed_tickers)
+            position_count = PortfolioPosition.query.filter_by(session_id=current_upload_session_id).count()
+            progress.status = "succeeded"
+            progress.finished_at = progress.updated_at = datetime.utcnow()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            parse_error = isinstance(e, (pd.errors.ParserError, UnicodeDecodeError))
+            current_app.logger.error(f"Error reading CSV: {e}" if parse_error else f"Error storing upload {upload_id}: {e}", exc_info=not parse_error)
+            PortfolioHolding.query.filter_by(session_id=staging_session_id).delete() # Chunks already committed
+            progress.status = "failed"
+            progress.error = str(e)
+            progress.finished_at = progress.updated_at = datetime.utcnow()
+            db.session.commit()
+            if parse_error:
+                return jsonify({"error": f"Could not parse CSV file: {e}"}), 400
+            return jsonify({"error": "System error while storing the uploaded portfolio."}), 500
+
+        # Analysis runs in a background worker; the dashboard shows its progress and then the stored result.
+        # The job is kept in step with the holdings even when rows were rejected, since a later
+        # re-upload only re-analyzes the tickers it changes.
+        enqueue_analysis_job(current_upload_session_id, holdings_count=position_count, changed_tickers=changed_tickers)
 
-        for index, row in df.iterrows():
-            try:
-                ticker = str(row["Ticker"])
-                quantity = int(row["Quantity"])
-
-                if not ticker or quantity <= 0:
-                    error_rows.append({"row": index + 2, "error": "Ticker cannot be empty and Quantity must be positive."})
-                    continue
-
-                purchase_price = None
-                if "PurchasePrice" in actual_columns and pd.notna(row["PurchasePrice"]):
-                    try:
-                        purchase_price = float(row["PurchasePrice"])
-                        if purchase_price < 0:
-                             error_rows.append({"row": index + 2, "field": "PurchasePrice", "error": "PurchasePrice cannot be negative."})
-                             continue
-                    except ValueError:
-                        error_rows.append({"row": index + 2, "field": "PurchasePrice", "error": "Invalid format for PurchasePrice."})
-                        continue
-                
-                purchase_date = None
-                if "PurchaseDate" in actual_columns and pd.notna(row["PurchaseDate"]):
-                    try:
-                        # Attempt to parse various common date formats
-                        purchase_date = pd.to_datetime(row["PurchaseDate"]).date()
-                    except Exception:
-                        error_rows.append({"row": index + 2, "field": "PurchaseDate", "error": "Invalid format for PurchaseDate. Use YYYY-MM-DD."})
-                        continue
-
-                holding = PortfolioHolding(
-                    session_id=current_upload_session_id,
-                    ticker_symbol=ticker.upper(), # Standardize ticker to uppercase
-                    quantity=quantity,
-                    purchase_price=purchase_price,
-                    purchase_date=purchase_date
-                )
-                db.session.add(holding)
-                processed_rows += 1
-            except Exception as e:
-                current_app.logger.error(f"Error processing row {index + 2}: {e}")
-                error_rows.append({"row": index + 2, "error": str(e)})
-        
         if error_rows:
             # Rollback if any row has critical error during its own processing, 
             # or decide if partial success is okay.
@@ -129,6 +229,14 @@ def handle_portfolio_upload():
     else:
         return jsonify({"error": "Invalid file type. Please upload a CSV file."}), 400
 
+@upload_bp.route("/uploads/<upload_id>", methods=["GET"])
+def upload_progress(upload_id):
+    """Reports the rows processed and rejected so far by an upload; the upload page polls this while the upload runs."""
+    progress = UploadProgress.query.filter_by(upload_id=upload_id).first()
+    if progress is None:
+        return jsonify({"error": "Unknown upload"}), 404
+    return jsonify(progress.to_dict())
+
 # Example of how a view blueprint might be structured (in a different file e.g. view_routes.py)
 # view_bp = Blueprint("view_bp", __name__, template_folder="../../templates")
 # @view_bp.route("/dashboard")
@@ -0,0 +1,40 @@
+// Client-side JavaScript for the Dashboard Page (dashboard.html)
+// While the portfolio analysis job is queued or running, polls its status endpoint, shows the
+// progress, and reloads the page (which then renders the stored result) once the job has finished.
+
+document.addEventListener("DOMContentLoaded", function() {
+    const status = document.getElementById("analysis-status");
+    if (!status) {
+        return;
+    }
+    const statusUrl = status.dataset.statusUrl;
+
+    function describe(job) {
+        if (job.status === "queued") {
+            return "Analysis queued...";
+        }
+        if (job.phase === "analyzing" && job.progress_total > 0) {
+            return "Analyzing holdings: " + job.progress_done + " of " + job.progress_total + "...";
+        }
+        if (job.phase === "risk") {
+            return "Computing portfolio risk...";
+        }
+        return "Analyzing your portfolio...";
+    }
+
+    function poll() {
+        fetch(statusUrl, { headers: { "Accept": "application/json" } })
+            .then(function(response) { return response.json(); })
+            .then(function(job) {
+                if (job.status === "succeeded" || job.status === "failed") {
+                    window.location.reload();
+                    return;
+                }
+                status.textContent = describe(job);
+                setTimeout(poll, 2000);
+            })
+            .catch(function() { setTimeout(poll, 5000); });
+    }
+
+    poll();
+});
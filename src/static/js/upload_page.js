@@ -1,12 +1,44 @@
 // Client-side JavaScript for the Upload Page (index.html)
-// Currently, no specific client-side logic is implemented beyond standard form submission.
+// Tags each upload with an id and, while the upload request runs, polls its progress endpoint
+// to show how many rows have been processed and rejected so far (large files are ingested in chunks).
 // This file is included for future enhancements, such as:
 // - Client-side validation of the file type or size before upload.
 // - AJAX form submission to provide a smoother UX without full page reloads (though current backend redirects).
-// - Displaying more interactive loading indicators.
 
 document.addEventListener("DOMContentLoaded", function() {
     const form = document.querySelector("form");
+    const progress = document.getElementById("upload-progress");
+
+    function newUploadId() {
+        if (window.crypto && window.crypto.randomUUID) {
+            return window.crypto.randomUUID();
+        }
+        return Date.now().toString(36) + "-" + Math.random().toString(36).slice(2, 12);
+    }
+
+    function pollProgress(url) {
+        fetch(url, { headers: { "Accept": "application/json" } })
+            .then(function(response) { return response.ok ? response.json() : null; })
+            .then(function(upload) {
+                if (upload) {
+                    let text = "Processed " + upload.rows_processed + " row(s)";
+                    if (upload.rows_rejected > 0) {
+                        text += ", " + upload.rows_rejected + " rejected";
+                    }
+                    if (upload.bytes_total > 0 && upload.bytes_read !== null) {
+                        text += " (" + Math.min(100, Math.round(100 * upload.bytes_read / upload.bytes_total)) + "% of the file)";
+                    }
+                    progress.textContent = text + "...";
+                    progress.hidden = false;
+                    if (upload.status !== "running") {
+                        return; // The upload request finishes and the browser moves on to its response
+                    }
+                }
+                setTimeout(function() { pollProgress(url); }, 1000);
+            })
+            .catch(function() { setTimeout(function() { pollProgress(url); }, 2000); });
+    }
+
     if (form) {
         form.addEventListener("submit", function() {
             const button = form.querySelector("button[type='submit']");
@@ -14,7 +46,12 @@ document.addEventListener("DOMContentLoaded", function() {
                 button.disabled = true;
                 button.textContent = "Processing...";
             }
+            const uploadIdInput = document.getElementById("upload_id");
+            if (uploadIdInput && progress) {
+                uploadIdInput.value = newUploadId();
+                const url = progress.dataset.progressUrl.replace("UPLOAD_ID", encodeURIComponent(uploadIdInput.value));
+                setTimeout(function() { pollProgress(url); }, 1000);
+            }
         });
     }
 });
-
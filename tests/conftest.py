@@ -0,0 +1,52 @@
+# tests/conftest.py
+# The app reads its configuration from the environment when src.main is imported, so the test
+# settings are put in place before the first test module imports it: a throwaway SQLite database,
+# no in-app analysis worker, no on-disk caches, and upstream URLs that nothing listens on.
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+_TMP_DIR = tempfile.mkdtemp(prefix="portfolio_advisor_tests_")
+for name, value in {
+    "DATABASE_URL": f"sqlite:///{os.path.join(_TMP_DIR, 'app.db')}",
+    "ANALYSIS_WORKER_IN_APP": "false",
+    "WARMUP_ENABLED": "false",
+    "SENTIMENT_PRELOAD": "false",
+    "PRICE_HISTORY_DB_PATH": "",
+    "FEATURE_STORE_DB_PATH": "",
+    "SENTIMENT_CACHE_DB_PATH": "",
+    "NEWS_SENTIMENT_DB_PATH": "",
+    "YAHOO_FINANCE_BASE_URL": "http://127.0.0.1:9",
+    "DATA_BANK_BASE_URL": "http://127.0.0.1:9",
+    "HTTP_MAX_RETRIES": "0",
+}.items():
+    os.environ[name] = value
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture(scope="session")
+def app():
+    from src.main import app
+    app.config["TESTING"] = True
+    return app
+
+@pytest.fixture
+def app_context(app):
+    with app.app_context():
+        yield app
+
+@pytest.fixture
+def db(app_context):
+    """The app's database, emptied after the test."""
+    from src.main import db
+    yield db
+    db.session.rollback()
+    for table in reversed(db.metadata.sorted_tables):
+        db.session.execute(table.delete())
+    db.session.commit()
+
+@pytest.fixture
+def client(app, db):
+    return app.test_client()
@@ -0,0 +1,66 @@
+# tests/test_analysis_job_reuse.py
+# After a differential re-upload the analysis job reuses the stored advice of unchanged tickers.
+# Advice that failed, lacks its details or is too old must be analyzed again instead. The
+# upstream URLs point at a closed port, so whatever is re-analyzed comes back as an "Error".
+
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from src.ai_engine.analysis_jobs import AnalysisWorker
+from src.data_services.price_history_store import get_price_history_store
+
+DAY = 24 * 60 * 60
+MAX_AGE = 60 * 60
+
+def _position(ticker):
+    return SimpleNamespace(ticker_symbol=ticker, quantity=10, purchase_price=100.0, priced_quantity=10, purchase_date=None)
+
+def _advice(ticker):
+    return {"symbol": ticker, "recommendation": "Hold", "reason": "Stored advice", "details": {"portfolio_weight": 0.5}}
+
+@pytest.fixture
+def worker(app_context, monkeypatch, tmp_path):
+    # Unchanged tickers are priced from the local price history
+    monkeypatch.setitem(app_context.config, "PRICE_HISTORY_DB_PATH", str(tmp_path / "prices.db"))
+    closes = [100.0 + i for i in range(30)]
+    chart = {"timestamp": [1_700_000_000 + DAY * i for i in range(30)], "indicators": {"quote": [{"close": closes}]}}
+    for ticker in ("AAA", "BBB", "CCC"):
+        get_price_history_store().append_chart(ticker, chart)
+    worker = AnalysisWorker(app_context, reuse_max_age_seconds=MAX_AGE)
+    monkeypatch.setattr(worker, "_update_running", lambda job_id, **fields: None)
+    return worker
+
+def _reanalyzed(result, tickers):
+    return {ticker for ticker, recommendation in zip(tickers, result["recommendations"])
+            if recommendation.get("reason") != "Stored advice"}
+
+def test_fresh_complete_advice_is_reused(worker):
+    now = time.time()
+    previous = {"recommendations": [_advice("AAA"), _advice("BBB")], "analyzed_at": {"AAA": now, "BBB": now}}
+    result = worker._analyze_changes(1, [_position("AAA"), _position("BBB")], ["BBB"], previous)
+    assert _reanalyzed(result, ["AAA", "BBB"]) == {"BBB"}
+    assert result["analyzed_at"]["AAA"] == now
+    assert result["analyzed_at"]["BBB"] >= now
+
+@pytest.mark.parametrize("stored", [
+    {"symbol": "AAA", "recommendation": "Error", "reason": "Stored advice"},
+    {"symbol": "AAA", "error": "Failed to retrieve complete market data.", "reason": "Stored advice"},
+    {"symbol": "AAA", "recommendation": "Hold", "reason": "Stored advice"}, # No details
+])
+def test_failed_or_incomplete_advice_is_analyzed_again(worker, stored):
+    now = time.time()
+    previous = {"recommendations": [stored, _advice("BBB")], "analyzed_at": {"AAA": now, "BBB": now}}
+    result = worker._analyze_changes(1, [_position("AAA"), _position("BBB")], [], previous)
+    assert _reanalyzed(result, ["AAA", "BBB"]) == {"AAA"}
+
+def test_old_advice_is_analyzed_again(worker):
+    now = time.time()
+    previous = {
+        "recommendations": [_advice("AAA"), _advice("BBB"), _advice("CCC")],
+        "analyzed_at": {"AAA": now - MAX_AGE - 1, "BBB": now}, # CCC: stored before ages were recorded
+    }
+    result = worker._analyze_changes(1, [_position("AAA"), _position("BBB"), _position("CCC")], [], previous)
+    assert _reanalyzed(result, ["AAA", "BBB", "CCC"]) == {"AAA", "CCC"}
+    assert result["analyzed_at"]["AAA"] >= now
@@ -0,0 +1,58 @@
+# tests/test_analysis_job_stream.py
+# An analysis job streams the session's positions through the analysis pipeline: progress is
+# written to the job row as advice arrives, and portfolio risk runs once the stream has ended.
+
+import json
+
+import pytest
+
+from src.ai_engine.analysis_jobs import AnalysisWorker, enqueue_analysis_job
+from src.data_services.data_aggregator import DataAggregator
+
+SESSION_ID = "stream-test"
+TICKERS = ["AAPL", "GOOG", "MSFT", "NVDA", "TSLA"]
+
+@pytest.fixture
+def positions(db):
+    from src.models.portfolio_holding import PortfolioHolding
+    from src.models.portfolio_position import PortfolioPosition
+    for ticker in TICKERS:
+        db.session.add(PortfolioHolding(session_id=SESSION_ID, ticker_symbol=ticker, quantity=10, purchase_price=100.0))
+    PortfolioPosition.refresh(SESSION_ID)
+    db.session.commit()
+    enqueue_analysis_job(SESSION_ID, holdings_count=len(TICKERS))
+
+def test_job_streams_holdings_and_records_progress(app, db, positions, monkeypatch):
+    def aggregate_everything(*args, **kwargs):
+        raise AssertionError("the job must not aggregate the whole portfolio up front")
+    monkeypatch.setattr(DataAggregator, "get_aggregated_data_for_holdings", aggregate_everything)
+
+    worker = AnalysisWorker(app)
+    updates = []
+    update_running = worker._update_running
+    def record_update(job_id, **fields):
+        updates.append(fields)
+        update_running(job_id, **fields)
+    monkeypatch.setattr(worker, "_update_running", record_update)
+    monkeypatch.setattr(worker, "_progress", lambda job_id: lambda done, total: record_update(job_id, progress_done=done, progress_total=total))
+    stream_advice = worker._stream_advice
+    def check_holdings(job_id, analyzer, holdings):
+        # The pipeline threads must not load expired ORM instances through this thread's session
+        assert not any(isinstance(holding, db.Model) for holding in holdings)
+        return stream_advice(job_id, analyzer, holdings)
+    monkeypatch.setattr(worker, "_stream_advice", check_holdings)
+
+    assert worker.run_once()
+
+    from src.models.analysis_job import AnalysisJob
+    job = AnalysisJob.query.filter_by(session_id=SESSION_ID).one()
+    assert job.status == "succeeded", job.error
+    result = json.loads(job.result)
+    assert [recommendation["symbol"] for recommendation in result["recommendations"]] == TICKERS
+    assert set(result["analyzed_at"]) == set(TICKERS)
+
+    progress = [fields["progress_done"] for fields in updates if "progress_done" in fields]
+    assert progress == list(range(1, len(TICKERS) + 1))
+    phases = [fields["phase"] for fields in updates if "phase" in fields]
+    assert phases == ["risk"]
+    assert updates.index({"phase": "risk"}) > max(i for i, fields in enumerate(updates) if "progress_done" in fields)
@@ -0,0 +1,65 @@
+# tests/test_backtest.py
+# Offline backtest: the full-series indicators it replays the rules over must equal the batch
+# indicators of each history prefix (what the live analysis would have computed on that day), and
+# per-ticker CSV files are found whatever the case of their names.
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.ai_engine.backtest import CsvPriceSource, _feature_matrix, run_backtest
+from src.ai_engine.batch_indicators import TECHNICAL_FEATURES, compute_indicator_series, compute_technical_indicators
+from src.ai_engine.rule_compiler import load_rule_set
+from src.ai_engine.rule_engine import DEFAULT_RULES_PATH, RuleEngine
+
+def _write_history(path, seed, bars=300):
+    closes = 100 + np.cumsum(np.random.default_rng(seed).standard_normal(bars))
+    dates = pd.bdate_range("2020-01-01", periods=bars).strftime("%Y-%m-%d")
+    pd.DataFrame({"Date": dates, "Close": closes}).to_csv(path, index=False)
+    return closes
+
+@pytest.fixture
+def closes():
+    closes = 100 + np.cumsum(np.random.default_rng(17).standard_normal(320))
+    closes[150:170] = closes[149] # A flat stretch: no gains or losses for the RSI
+    return closes
+
+def test_indicator_series_match_batch_indicators_of_every_prefix(closes):
+    series = compute_indicator_series(closes)
+    prefixes = [closes[:bar + 1] for bar in range(len(closes))]
+    for bar, expected in enumerate(compute_technical_indicators(prefixes)):
+        for name in TECHNICAL_FEATURES:
+            if expected[name] is None:
+                assert np.isnan(series[name][bar]), (name, bar)
+            else:
+                assert series[name][bar] == pytest.approx(expected[name], rel=1e-9, abs=1e-9), (name, bar)
+
+def test_replayed_advice_matches_the_live_rule_engine(app_context, closes):
+    rule_set = load_rule_set(DEFAULT_RULES_PATH)
+    matrix, _ = _feature_matrix(rule_set, closes, sentiment=0.6)
+    advice_codes, _, _, _ = rule_set.evaluate(matrix)
+
+    features = compute_technical_indicators([closes[:bar + 1] for bar in range(len(closes))])
+    for row, close in zip(features, closes):
+        row["current_price"] = float(close)
+    live = RuleEngine(rules_path=DEFAULT_RULES_PATH).generate_advice_batch(
+        [f"BAR{bar}" for bar in range(len(closes))], features, [0.6] * len(closes))
+    assert [rule_set.advice_names[code] for code in advice_codes] == [result["recommendation"] for result in live]
+
+def test_csv_source_loads_files_whatever_the_case_of_their_names(tmp_path):
+    lower = _write_history(tmp_path / "aapl.csv", 1)
+    upper = _write_history(tmp_path / "MSFT.csv", 2)
+    source = CsvPriceSource(str(tmp_path))
+    assert source.symbols() == ["AAPL", "MSFT"]
+    assert np.allclose(source.load("AAPL")[1], lower)
+    assert np.allclose(source.load("msft")[1], upper)
+
+    report = run_backtest(source, DEFAULT_RULES_PATH, workers=1)
+    assert [result["symbol"] for result in report["tickers"]] == ["AAPL", "MSFT"]
+    assert report["summary"]["tickers_failed"] == 0
+
+def test_missing_symbol_is_reported_per_ticker(tmp_path):
+    _write_history(tmp_path / "aapl.csv", 1)
+    report = run_backtest(CsvPriceSource(str(tmp_path)), DEFAULT_RULES_PATH, symbols=["AAPL", "NOPE"], workers=1)
+    assert "error" not in report["tickers"][0]
+    assert "No CSV file for NOPE" in report["tickers"][1]["error"]
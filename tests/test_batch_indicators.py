@@ -0,0 +1,47 @@
+# tests/test_batch_indicators.py
+# The vectorized indicators over a price matrix must match the single-ticker FeatureEngineer
+# methods for every history length, including histories too short for an indicator.
+
+import numpy as np
+import pytest
+
+from src.ai_engine.batch_indicators import TECHNICAL_FEATURES, compute_technical_indicators
+from src.ai_engine.feature_engineering import FeatureEngineer
+
+def _single_ticker(engineer, prices):
+    macd_line, macd_signal, macd_histogram = engineer.calculate_macd(prices)
+    return {
+        "sma_20_day": engineer.calculate_sma(prices, 20),
+        "sma_50_day": engineer.calculate_sma(prices, 50),
+        "sma_200_day": engineer.calculate_sma(prices, 200),
+        "rsi_14_day": engineer.calculate_rsi(prices, 14),
+        "macd_line": macd_line,
+        "macd_signal": macd_signal,
+        "macd_histogram": macd_histogram,
+    }
+
+def _price_histories():
+    rng = np.random.default_rng(9)
+    histories = [100 + np.cumsum(rng.standard_normal(length)) for length in (1, 5, 14, 15, 20, 25, 26, 49, 50, 60, 199, 200, 300, 1260)]
+    histories.append(np.full(40, 10.0)) # No gains or losses
+    histories.append(np.arange(1.0, 40.0)) # Gains only
+    histories.append(np.arange(40.0, 1.0, -1)) # Losses only
+    return histories
+
+def test_batch_indicators_match_single_ticker_methods(app_context):
+    engineer = FeatureEngineer()
+    histories = _price_histories()
+    for prices, batch in zip(histories, compute_technical_indicators(histories)):
+        expected = _single_ticker(engineer, prices)
+        assert set(batch) == set(TECHNICAL_FEATURES)
+        for name, value in expected.items():
+            if value is None:
+                assert batch[name] is None, (name, len(prices))
+            else:
+                assert batch[name] == pytest.approx(value, rel=1e-9, abs=1e-9), (name, len(prices))
+
+def test_subset_of_indicators(app_context):
+    histories = _price_histories()
+    subset = compute_technical_indicators(histories, names=["rsi_14_day"])
+    full = compute_technical_indicators(histories)
+    assert [row["rsi_14_day"] for row in subset] == [row["rsi_14_day"] for row in full]
@@ -0,0 +1,60 @@
+# tests/test_batch_job.py
+# POST /api/batch/analyze validates the portfolios and queues them as an analysis job; a worker
+# runs the batch and the result is fetched from the job endpoints.
+
+from src.ai_engine.analysis_jobs import AnalysisWorker
+
+BATCH = {"portfolios": [
+    {"id": "alpha", "holdings": [
+        {"ticker": "aapl", "quantity": 10, "purchase_price": 150.0, "purchase_date": "2023-01-15"},
+        {"ticker": "MSFT", "quantity": 2},
+    ]},
+    {"id": "beta", "holdings": [
+        {"ticker": "AAPL", "quantity": 1},
+        {"ticker": "", "quantity": 3}, # Rejected
+    ]},
+]}
+
+def test_batch_is_queued_and_analyzed_by_a_worker(app, client):
+    response = client.post("/api/batch/analyze", json=BATCH)
+    assert response.status_code == 202
+    queued = response.get_json()
+    assert queued["errors"] == [{"portfolio_id": "beta", "holding": 1, "error": "Ticker cannot be empty and Quantity must be positive."}]
+    assert client.get(queued["result_url"]).status_code == 202
+
+    assert AnalysisWorker(app).run_once()
+
+    status = client.get(queued["status_url"]).get_json()
+    assert status["status"] == "succeeded", status["error"]
+    assert status["progress_done"] == status["progress_total"] == 2 # Distinct tickers
+    result = client.get(queued["result_url"]).get_json()["result"]
+    assert [portfolio["portfolio_id"] for portfolio in result["portfolios"]] == ["alpha", "beta"]
+    assert [[recommendation["symbol"] for recommendation in portfolio["recommendations"]] for portfolio in result["portfolios"]] == [["AAPL", "MSFT"], ["AAPL"]]
+    assert result["stats"]["distinct_tickers"] == 2
+    assert result["errors"] == queued["errors"]
+
+    from src.models.batch_input import BatchInput
+    assert BatchInput.query.count() == 0 # Dropped once the result is stored
+
+def test_batch_over_the_limit_is_rejected(app, client, monkeypatch):
+    monkeypatch.setitem(app.config, "BATCH_ANALYSIS_MAX_HOLDINGS", 3)
+    assert client.post("/api/batch/analyze", json=BATCH).status_code == 413
+
+def test_json_values_of_the_wrong_type_are_rejected(app, client):
+    batch = {"portfolios": [{"id": "gamma", "holdings": [
+        {"ticker": "AAPL", "quantity": True},
+        {"ticker": "MSFT", "quantity": 2, "purchase_price": [1.5]},
+        {"ticker": "", "quantity": 3},
+        {"ticker": "GOOG", "quantity": "4", "purchase_price": 10},
+    ]}]}
+    response = client.post("/api/batch/analyze", json=batch)
+    assert response.status_code == 202
+    assert response.get_json()["errors"] == [
+        {"portfolio_id": "gamma", "holding": 0, "field": "Quantity", "error": "Invalid format for Quantity."},
+        {"portfolio_id": "gamma", "holding": 1, "field": "PurchasePrice", "error": "Invalid format for PurchasePrice."},
+        {"portfolio_id": "gamma", "holding": 2, "error": "Ticker cannot be empty and Quantity must be positive."},
+    ]
+
+    from src.models.batch_input import BatchInput
+    [(_, holdings)] = BatchInput.query.one().portfolio_list()
+    assert [(holding["ticker_symbol"], holding["quantity"]) for holding in holdings] == [("GOOG", 4)]
@@ -0,0 +1,111 @@
+# tests/test_http_transport.py
+# HttpTransport against LocalUpstreamServer: retries, circuit breaking (one failure per request,
+# open, half-open, close) and rate limiting.
+
+import time
+
+import pytest
+
+from src.data_services.http_transport import CircuitBreaker, CircuitOpenError, HttpTransport, TokenBucket, TransportError
+from src.data_services.local_upstream import LocalUpstreamServer
+
+@pytest.fixture
+def upstream():
+    with LocalUpstreamServer() as server:
+        yield server
+
+def _transport(upstream, max_retries=2, failure_threshold=2, reset_seconds=0.2, rate_limiter=None):
+    return HttpTransport("test", upstream.base_url, max_retries=max_retries, backoff_base=0.001, backoff_max=0.001,
+                         timeout=2.0, rate_limiter=rate_limiter,
+                         circuit_breaker=CircuitBreaker(failure_threshold=failure_threshold, reset_seconds=reset_seconds))
+
+def test_retries_until_the_upstream_answers(app_context, upstream):
+    transport = _transport(upstream)
+    upstream.fail_next = 2
+    assert transport.get_json("/chart", params={"symbol": "AAPL"}) == {"path": "/chart", "params": {"symbol": "AAPL"}}
+    assert upstream.request_count == 3
+    assert transport.circuit_breaker.consecutive_failures == 0
+
+def test_failed_request_counts_once_against_the_breaker(app_context, upstream):
+    transport = _transport(upstream, failure_threshold=3)
+    upstream.fail_next = 3
+    with pytest.raises(TransportError):
+        transport.get_json("/chart")
+    assert upstream.request_count == 3
+    assert transport.circuit_breaker.consecutive_failures == 1
+    assert transport.circuit_breaker.state == CircuitBreaker.CLOSED
+
+def test_undecodable_body_is_a_transport_error(app_context, upstream):
+    transport = _transport(upstream, max_retries=0)
+    upstream.malformed_next = 1
+    with pytest.raises(TransportError, match="Invalid JSON"):
+        transport.get_json("/chart")
+    assert transport.circuit_breaker.consecutive_failures == 1
+
+    upstream.malformed_next = 1
+    transport.max_retries = 1
+    assert transport.get_json("/chart")["path"] == "/chart" # Retried like any other failure
+
+def test_client_errors_do_not_trip_the_breaker(app_context, upstream):
+    transport = _transport(upstream, failure_threshold=1)
+    upstream.error_status = 404
+    upstream.fail_next = 1
+    with pytest.raises(TransportError, match="HTTP 404"):
+        transport.get_json("/missing")
+    assert upstream.request_count == 1 # Not retried
+    assert transport.circuit_breaker.state == CircuitBreaker.CLOSED
+
+def test_breaker_opens_fails_fast_and_closes_after_a_successful_trial(app_context, upstream):
+    transport = _transport(upstream, max_retries=0, failure_threshold=2)
+    upstream.error_rate = 1.0
+    for _ in range(2):
+        with pytest.raises(TransportError):
+            transport.get_json("/chart")
+    assert transport.circuit_breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        transport.get_json("/chart")
+    assert upstream.request_count == 2 # Failed fast
+
+    time.sleep(0.25)
+    with pytest.raises(TransportError): # The half-open trial fails: open again
+        transport.get_json("/chart")
+    assert transport.circuit_breaker.state == CircuitBreaker.OPEN
+    assert upstream.request_count == 3
+
+    time.sleep(0.25)
+    upstream.error_rate = 0.0
+    assert transport.get_json("/chart")["path"] == "/chart"
+    assert transport.circuit_breaker.state == CircuitBreaker.CLOSED
+
+def test_open_breaker_does_not_take_rate_limit_tokens(app_context, upstream):
+    bucket = TokenBucket(rate_per_second=0.001, capacity=2)
+    transport = _transport(upstream, max_retries=0, failure_threshold=1, reset_seconds=60, rate_limiter=bucket)
+    upstream.fail_next = 1
+    with pytest.raises(TransportError):
+        transport.get_json("/chart")
+    for _ in range(5):
+        with pytest.raises(CircuitOpenError):
+            transport.get_json("/chart")
+    assert bucket.available_tokens() == pytest.approx(1.0, abs=0.01)
+
+def test_requests_are_rate_limited(app_context, upstream):
+    transport = _transport(upstream, rate_limiter=TokenBucket(rate_per_second=20, capacity=1))
+    started = time.monotonic()
+    for _ in range(6):
+        transport.get_json("/chart")
+    assert time.monotonic() - started >= 5 / 20 * 0.9 # The first request uses the burst token
+    assert upstream.request_count == 6
+
+def test_rate_limit_timeout_releases_a_half_open_trial(app_context, upstream):
+    bucket = TokenBucket(rate_per_second=0.001, capacity=1)
+    transport = _transport(upstream, max_retries=0, failure_threshold=1, reset_seconds=0.05, rate_limiter=bucket)
+    transport.timeout = 0.05
+    upstream.fail_next = 1
+    with pytest.raises(TransportError): # Uses the only token
+        transport.get_json("/chart")
+    time.sleep(0.1)
+    with pytest.raises(TransportError, match="Rate limit"):
+        transport.get_json("/chart")
+    bucket._tokens = 1.0
+    assert transport.get_json("/chart")["path"] == "/chart" # The trial was not left hanging
+    assert transport.circuit_breaker.state == CircuitBreaker.CLOSED
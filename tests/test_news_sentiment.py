@@ -0,0 +1,67 @@
+# tests/test_news_sentiment.py
+# Time-decayed news sentiment shared through its SQLite file by several trackers (one per worker
+# process in production), and the bound on feed items waiting for their ticker.
+
+import json
+
+import pytest
+
+from src.ai_engine import news_sentiment
+from src.ai_engine.news_sentiment import NewsSentimentTracker
+
+class _FixedScores:
+    """Scores every text by its "score:<value>" suffix."""
+    def score_texts(self, texts):
+        return [float(text.rsplit("score:", 1)[1]) for text in texts]
+
+def _stock(ticker, *headlines):
+    developments = [{"headline": headline, "date": f"2024-05-{day + 1:02d}"} for day, headline in enumerate(headlines)]
+    return {"ticker": ticker, "yahoo_finance": {"insights": {"sigDevs": developments}}}
+
+def _stored(db_path, ticker):
+    tracker = NewsSentimentTracker(db_path=str(db_path))
+    row = tracker._connection().execute("SELECT state FROM news_sentiment WHERE ticker = ?", (ticker,)).fetchone()
+    return json.loads(row[0])
+
+def test_trackers_sharing_a_file_add_to_each_other(tmp_path):
+    db_path = tmp_path / "news.sqlite3"
+    first, second = NewsSentimentTracker(db_path=str(db_path)), NewsSentimentTracker(db_path=str(db_path))
+    analyzer = _FixedScores()
+    # Both have the ticker cached before either writes
+    assert first.update_many([_stock("AAPL")], analyzer) == [0.0]
+    assert second.update_many([_stock("AAPL")], analyzer) == [0.0]
+
+    first.update_many([_stock("AAPL", "Good quarter score:1.0")], analyzer)
+    second.update_many([_stock("AAPL", "Recall announced score:-0.5")], analyzer)
+
+    assert _stored(db_path, "AAPL")["items"] == 2 # The second write did not replace the first
+    combined = second.update_many([_stock("AAPL")], analyzer)[0]
+    assert first.update_many([_stock("AAPL")], analyzer) == [combined] # And the first sees the second's item
+    assert -0.5 < combined < 1.0
+
+    # An item both have seen is not counted twice
+    first.update_many([_stock("AAPL", "Good quarter score:1.0")], analyzer)
+    assert _stored(db_path, "AAPL")["items"] == 2
+
+def test_pending_feed_items_are_capped(tmp_path, monkeypatch):
+    monkeypatch.setattr(news_sentiment, "MAX_PENDING_FEED_ITEMS", 3)
+    monkeypatch.setattr(news_sentiment, "MAX_PENDING_FEED_TOTAL", 4)
+    feed = tmp_path / "feed.jsonl"
+    tracker = NewsSentimentTracker(feed_path=str(feed))
+    analyzer = _FixedScores()
+
+    def append(ticker, count):
+        with open(feed, "a", encoding="utf-8") as out:
+            for i in range(count):
+                out.write(json.dumps({"ticker": ticker, "date": "2024-05-01", "headline": f"{ticker} {i} score:0.1"}) + "\n")
+
+    append("OLD", 2)
+    tracker.update_many([], analyzer)
+    append("NEW", 4) # Capped at 3 for the ticker, then OLD is dropped to keep the total within 4
+    tracker.update_many([], analyzer)
+    assert tracker.stats()["pending_feed_items"] == 3
+    assert set(tracker._pending_feed_items) == {"NEW"}
+
+    tracker.update_many([_stock("NEW")], analyzer)
+    assert tracker.stats()["pending_feed_items"] == 0
+    assert tracker._aggregates["NEW"].items == 3
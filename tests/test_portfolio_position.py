@@ -0,0 +1,76 @@
+# tests/test_portfolio_position.py
+# Positions merge an upload session's lots per ticker, and a risk report over the positions matches one over the lots.
+
+import datetime
+
+import numpy as np
+import pytest
+
+from src.ai_engine.risk_engine import PortfolioRiskAnalyzer, ReturnCovariance
+from src.data_services.data_aggregator import DataAggregator
+from src.data_services.price_series import PriceSeries
+
+SESSION_ID = "position-test"
+CURRENT_PRICES = {"AAPL": 130.0, "MSFT": 310.0, "GOOG": 95.0}
+
+def _price_series(ticker, bars=40):
+    start = int(datetime.datetime(2024, 1, 1).timestamp())
+    closes = np.linspace(CURRENT_PRICES[ticker] * 0.9, CURRENT_PRICES[ticker], bars)
+    return PriceSeries(ticker, [start + i * 86400 for i in range(bars)], closes, closes, closes, closes)
+
+def _risk_report(rows):
+    aggregated_data = []
+    for row in rows:
+        stock_data = DataAggregator._new_stock_data(row, {})
+        stock_data["yahoo_finance"]["price_series"] = _price_series(row.ticker_symbol)
+        aggregated_data.append(stock_data)
+    return PortfolioRiskAnalyzer(ReturnCovariance()).analyze(aggregated_data)
+
+@pytest.fixture
+def lots(db):
+    from src.models.portfolio_holding import PortfolioHolding
+    rows = [
+        ("AAPL", 10, 150.0, datetime.date(2023, 3, 1)),
+        ("AAPL", 5, None, datetime.date(2022, 6, 1)),
+        ("MSFT", 3, 300.0, None),
+        ("GOOG", 2, 100.0, datetime.date(2023, 1, 2)),
+    ]
+    for ticker, quantity, purchase_price, purchase_date in rows:
+        db.session.add(PortfolioHolding(session_id=SESSION_ID, ticker_symbol=ticker, quantity=quantity,
+                                        purchase_price=purchase_price, purchase_date=purchase_date))
+    db.session.commit()
+    return PortfolioHolding.query.filter_by(session_id=SESSION_ID).order_by(PortfolioHolding.id).all()
+
+def _positions(db):
+    from src.models.portfolio_position import PortfolioPosition
+    PortfolioPosition.refresh(SESSION_ID)
+    db.session.commit()
+    return {position.ticker_symbol: position for position in PortfolioPosition.query.filter_by(session_id=SESSION_ID)}
+
+def test_refresh_merges_lots(db, lots):
+    aapl = _positions(db)["AAPL"]
+    assert (aapl.quantity, aapl.priced_quantity, aapl.lot_count) == (15, 10, 2)
+    assert aapl.purchase_price == pytest.approx(150.0)
+    assert aapl.purchase_date == datetime.date(2022, 6, 1)
+
+def test_positions_keep_lot_totals_with_unpriced_lots(db, lots):
+    by_lot = _risk_report(lots)["portfolio"]
+    by_position = _risk_report(list(_positions(db).values()))["portfolio"]
+    assert by_lot["total_cost_basis"] == 2600.0
+    for key in ("total_cost_basis", "total_market_value", "unrealized_pnl", "unrealized_pnl_percentage"):
+        assert by_position[key] == pytest.approx(by_lot[key]), key
+
+def test_refresh_only_rebuilds_given_tickers(db, lots):
+    from src.models.portfolio_holding import PortfolioHolding
+    _positions(db)
+    for lot in lots:
+        if lot.ticker_symbol == "GOOG":
+            db.session.delete(lot) # Through the session, so the identity map does not keep the deleted lot
+    db.session.commit()
+    db.session.add(PortfolioHolding(session_id=SESSION_ID, ticker_symbol="MSFT", quantity=1, purchase_price=None))
+    from src.models.portfolio_position import PortfolioPosition
+    PortfolioPosition.refresh(SESSION_ID, ["GOOG"])
+    db.session.commit()
+    positions = {position.ticker_symbol: position for position in PortfolioPosition.query.filter_by(session_id=SESSION_ID)}
+    assert set(positions) == {"AAPL", "MSFT"}
+    assert positions["MSFT"].quantity == 3 # Not in the refreshed tickers, so not rebuilt
@@ -0,0 +1,102 @@
+# tests/test_rule_engine.py
+# The compiled rule set in advice_rules.json must reproduce the hand-written if/elif chain it
+# replaced (kept below as the reference), recommendation dict for recommendation dict.
+
+import itertools
+import json
+import os
+
+import numpy as np
+
+from src.ai_engine.rule_engine import DEFAULT_RULES_PATH, RuleEngine
+from src.data_services.price_series import PriceSeries
+
+THRESHOLDS = {"rsi_oversold": 30, "rsi_overbought": 70, "sentiment_positive_strong": 0.5, "sentiment_negative_strong": -0.5}
+
+def _if_else_advice(ticker, engineered_features, sentiment_score, market_data):
+    """RuleEngine.generate_advice before the rules were compiled (SMA and P/E rules were disabled)."""
+    advice = "Hold"
+    reason = "Default recommendation; no strong signals detected."
+    confidence_score = 0.5
+    price_series = (market_data or {}).get("yahoo_finance", {}).get("price_series")
+    current_price = price_series.last_close if price_series is not None else engineered_features.get("current_price")
+
+    if sentiment_score > THRESHOLDS["sentiment_positive_strong"]:
+        advice = "Consider Buy"
+        reason = "Strong positive sentiment detected from news and analyst opinions."
+        confidence_score = 0.7
+    elif sentiment_score < THRESHOLDS["sentiment_negative_strong"]:
+        advice = "Consider Sell"
+        reason = "Strong negative sentiment detected from news and analyst opinions."
+        confidence_score = 0.7
+
+    rsi = engineered_features.get("rsi_14_day")
+    if rsi is not None:
+        if rsi < THRESHOLDS["rsi_oversold"]:
+            if advice == "Consider Sell":
+                advice = "Hold"
+                reason = f"Conflicting signals: RSI ({rsi:.2f}) indicates oversold, but sentiment is negative. Recommending Hold."
+                confidence_score = 0.4
+            else:
+                advice = "Buy"
+                reason = f"RSI ({rsi:.2f}) indicates the stock may be oversold."
+                confidence_score = max(confidence_score, 0.75)
+        elif rsi > THRESHOLDS["rsi_overbought"]:
+            if advice == "Consider Buy":
+                advice = "Hold"
+                reason = f"Conflicting signals: RSI ({rsi:.2f}) indicates overbought, but sentiment is positive. Recommending Hold."
+                confidence_score = 0.4
+            else:
+                advice = "Sell"
+                reason = f"RSI ({rsi:.2f}) indicates the stock may be overbought."
+                confidence_score = max(confidence_score, 0.75)
+
+    return {
+        "symbol": ticker,
+        "recommendation": advice,
+        "reason": reason.strip(),
+        "confidence_score": round(confidence_score, 2),
+        "details": {
+            "rsi_14d": f"{rsi:.2f}" if rsi is not None else "N/A",
+            "sentiment_score": f"{sentiment_score:.4f}",
+            "current_price": f"{current_price:.2f}" if current_price is not None else "N/A",
+        },
+    }
+
+def _cases():
+    closes = np.array([101.0, 102.5, 99.75])
+    series = PriceSeries("X", [1, 2, 3], closes, closes, closes, closes)
+    sentiments = [-0.9, -0.5, -0.4999, 0.0, 0.5, 0.5001, 0.9]
+    rsis = [None, 5.0, 29.999, 30.0, 50.0, 70.0, 70.001, 99.0]
+    market_data = [None, {"yahoo_finance": {"price_series": series}}]
+    extra_features = [{}, {"current_price": 42.0, "sma_20_day": 120.0, "sma_50_day": 100.0}]
+    for i, (sentiment, rsi, market, extra) in enumerate(itertools.product(sentiments, rsis, market_data, extra_features)):
+        features = dict(extra)
+        if rsi is not None:
+            features["rsi_14_day"] = rsi
+        yield f"T{i}", features, sentiment, market
+
+def test_compiled_rules_match_the_if_else_chain(app_context):
+    cases = list(_cases())
+    engine = RuleEngine(rules_path=DEFAULT_RULES_PATH)
+    batch = engine.generate_advice_batch(*map(list, zip(*cases)))
+    for case, result in zip(cases, batch):
+        assert result == _if_else_advice(*case), case
+    assert engine.generate_advice(*cases[5]) == _if_else_advice(*cases[5])
+
+def test_threshold_edits_are_picked_up_without_a_restart(app_context, tmp_path):
+    with open(DEFAULT_RULES_PATH) as source:
+        rules = json.load(source)
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps(rules))
+    engine = RuleEngine(rules_path=str(path))
+    assert engine.generate_advice("X", {"rsi_14_day": 35.0}, 0.0, None)["recommendation"] == "Hold"
+
+    rules["thresholds"]["rsi_oversold"] = 40
+    path.write_text(json.dumps(rules))
+    os.utime(path, ns=(os.stat(path).st_mtime_ns + 10**9,) * 2) # A distinct mtime even on coarse clocks
+    assert engine.generate_advice("X", {"rsi_14_day": 35.0}, 0.0, None)["recommendation"] == "Buy"
+
+    path.write_text("{not json") # An invalid edit keeps the previous rules
+    os.utime(path, ns=(os.stat(path).st_mtime_ns + 2 * 10**9,) * 2)
+    assert engine.generate_advice("X", {"rsi_14_day": 35.0}, 0.0, None)["recommendation"] == "Buy"
@@ -0,0 +1,71 @@
+# tests/test_streaming_indicators.py
+# Indicator state advanced one bar at a time (and persisted between refreshes) must give the same
+# features as the batch indicators recomputed over the full history.
+
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.ai_engine.batch_indicators import compute_technical_indicators
+from src.ai_engine.feature_engineering import FeatureEngineer
+from src.ai_engine.streaming_indicators import StreamingRSI, TickerIndicatorState
+from src.data_services.price_history_store import PriceHistoryStore
+from src.data_services.price_series import PriceSeries
+
+DAY = 86400
+
+def _assert_features_match(streamed, batch):
+    assert set(streamed) == set(batch)
+    for name, value in batch.items():
+        if value is None:
+            assert streamed[name] is None, name
+        else:
+            assert streamed[name] == pytest.approx(value, rel=1e-9, abs=1e-9), name
+
+@pytest.fixture
+def closes():
+    return 100 + np.cumsum(np.random.default_rng(10).standard_normal(400))
+
+def test_state_updated_bar_by_bar_matches_batch(closes):
+    state = TickerIndicatorState()
+    for length, close in enumerate(closes, start=1):
+        state.update(length * DAY, float(close))
+        if length in (1, 14, 15, 20, 26, 50, 199, 200, 201, 400):
+            _assert_features_match(state.features(), compute_technical_indicators([closes[:length]])[0])
+
+def test_persisted_state_resumes_where_it_stopped(closes):
+    timestamps = DAY * np.arange(1, len(closes) + 1)
+    state = TickerIndicatorState.from_history(timestamps[:250], closes[:250])
+    resumed = TickerIndicatorState.from_dict(json.loads(json.dumps(state.to_dict())))
+    for timestamp, close in zip(timestamps[250:], closes[250:]):
+        resumed.update(int(timestamp), float(close))
+    assert not resumed.update(int(timestamps[100]), 1.0) # Older bars are ignored
+    _assert_features_match(resumed.features(), compute_technical_indicators([closes])[0])
+
+def test_feature_engineer_refreshes_stored_state_incrementally(app_context, tmp_path, closes):
+    store = PriceHistoryStore(str(tmp_path / "prices.sqlite3"))
+    engineer = FeatureEngineer(price_store=store, streaming_indicators=True)
+    timestamps = 1_600_000_000 + DAY * np.arange(len(closes))
+    for length in (300, 301, 301, 305, 400):
+        series = PriceSeries("X", timestamps[:length], closes[:length], closes[:length], closes[:length], closes[:length])
+        _assert_features_match(engineer._streaming_technicals("X", series), compute_technical_indicators([closes[:length]])[0])
+        assert store.load_indicator_state("X")["bars"] == length - 1 # The newest bar is only previewed
+
+    revised = closes.copy()
+    revised[-1] += 5.0 # The still-forming bar changed since the last fetch
+    series = PriceSeries("X", timestamps, revised, revised, revised, revised)
+    _assert_features_match(engineer._streaming_technicals("X", series), compute_technical_indicators([revised])[0])
+
+def test_wilder_rsi_matches_reference(closes):
+    rsi = StreamingRSI(14, "wilder")
+    for close in closes:
+        rsi.update(close)
+    deltas = pd.Series(closes).diff()
+    gains, losses = deltas.clip(lower=0), -deltas.clip(upper=0)
+    average_gain, average_loss = gains[1:15].mean(), losses[1:15].mean()
+    for i in range(15, len(closes)):
+        average_gain = (average_gain * 13 + gains[i]) / 14
+        average_loss = (average_loss * 13 + losses[i]) / 14
+    assert rsi.value == pytest.approx(100 - 100 / (1 + average_gain / average_loss), rel=1e-9)
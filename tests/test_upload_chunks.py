@@ -0,0 +1,81 @@
+# tests/test_upload_chunks.py
+# An upload is validated chunk by chunk with the same result whatever the chunk size, and a failed
+# or abandoned upload leaves no staged rows behind.
+
+import datetime
+import io
+import random
+
+import pytest
+
+from src.data_services.portfolio_csv import read_csv_chunks, validate_holdings
+
+def _validate(text, chunk_rows):
+    holdings, errors = [], []
+    for chunk in read_csv_chunks(io.BytesIO(text.encode()), chunk_rows):
+        chunk_holdings, chunk_errors = validate_holdings(chunk)
+        holdings += chunk_holdings
+        errors += chunk_errors
+    return holdings, errors
+
+def _random_csv(rng, rows):
+    tickers = ["AAPL", "msft", "", "1234", "007", " BRK.B"]
+    quantities = ["10", "2.5", "3.0", "-4", "0", "abc", "", "1e2", " 7 ", "99999999999999999999"]
+    prices = ["150.25", "", "-1", "x", "1e3", ".5", "0", " 12.5"]
+    dates = ["2023-01-15", "", "2023-13-01", "01/02/2023", "yesterday", "2024-02-29"]
+    lines = ["Ticker,Quantity,PurchasePrice,PurchaseDate"]
+    for _ in range(rows):
+        lines.append(",".join(rng.choice(column) for column in (tickers, quantities, prices, dates)))
+    return "\n".join(lines) + "\n"
+
+def test_chunked_validation_matches_whole_file(app_context):
+    rng = random.Random(22)
+    for _ in range(60):
+        text = _random_csv(rng, rng.randint(1, 25))
+        whole = _validate(text, 0)
+        for chunk_rows in (1, 3):
+            assert _validate(text, chunk_rows) == whole, text
+
+def test_fractional_quantity_rejected_in_any_chunk(app_context):
+    text = "Ticker,Quantity\nAAPL,2.5\n" + "MSFT,1\n" * 20 + "GOOG,abc\n"
+    for chunk_rows in (0, 5, 10):
+        holdings, errors = _validate(text, chunk_rows)
+        assert [error["row"] for error in errors] == [2, 23]
+        assert len(holdings) == 20
+
+def test_numeric_tickers_and_whole_quantities_read_as_written(app_context):
+    holdings, errors = _validate("Ticker,Quantity,PurchasePrice\n1234,10.0,5\n", 0)
+    assert errors == []
+    assert holdings == [{"ticker_symbol": "1234", "quantity": 10, "purchase_price": 5.0, "purchase_date": None}]
+
+def _upload(client, text):
+    return client.post("/api/upload_portfolio", data={"portfolio_csv": (io.BytesIO(text.encode()), "portfolio.csv")},
+                       content_type="multipart/form-data")
+
+def _stored_holdings():
+    from src.models.portfolio_holding import PortfolioHolding
+    return sorted((holding.session_id, holding.ticker_symbol, holding.quantity) for holding in PortfolioHolding.query.all())
+
+def test_failed_upload_leaves_no_staged_rows(app, client, monkeypatch):
+    from src.models.portfolio_position import PortfolioPosition
+    monkeypatch.setitem(app.config, "UPLOAD_CHUNK_ROWS", 2)
+    assert _upload(client, "Ticker,Quantity\nAAPL,1\n").status_code == 302
+    before = _stored_holdings()
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("database went away")
+    monkeypatch.setattr(PortfolioPosition, "refresh", fail)
+    response = _upload(client, "Ticker,Quantity\nMSFT,1\nGOOG,2\nAMZN,3\n")
+    assert response.status_code == 500
+    assert _stored_holdings() == before # Previous holdings kept, staged chunks removed
+
+def test_expired_unfinished_uploads_are_pruned(app, client, db):
+    from src.models.portfolio_holding import PortfolioHolding
+    from src.models.upload_progress import UploadProgress
+    started = datetime.datetime.utcnow() - datetime.timedelta(days=2)
+    db.session.add(UploadProgress(upload_id="stale-upload", session_id="gone", status="running", started_at=started))
+    db.session.add(PortfolioHolding(session_id="gone:stale-upload", ticker_symbol="AAPL", quantity=1))
+    db.session.commit()
+    assert _upload(client, "Ticker,Quantity\nMSFT,1\n").status_code == 302
+    assert PortfolioHolding.query.filter_by(session_id="gone:stale-upload").count() == 0
+    assert UploadProgress.query.filter_by(upload_id="stale-upload").first() is None
@@ -0,0 +1,88 @@
+# tests/test_upload_validation.py
+# validate_holdings checks every row column-wise and reports the same holdings and errors as the
+# row-by-row loop it replaced; the one deliberate difference is that a fractional quantity is
+# rejected instead of truncated.
+
+import io
+import random
+
+import pandas as pd
+from flask import current_app
+
+from src.data_services.portfolio_csv import read_csv_chunks, validate_holdings
+
+def _row_loop(text):
+    """The upload route's former row-by-row validation, on a CSV read with type inference."""
+    df = pd.read_csv(io.StringIO(text))
+    holdings, error_rows = [], []
+    for index, row in df.iterrows():
+        try:
+            ticker = str(row["Ticker"])
+            quantity = int(row["Quantity"])
+
+            if not ticker or quantity <= 0:
+                error_rows.append({"row": index + 2, "error": "Ticker cannot be empty and Quantity must be positive."})
+                continue
+
+            purchase_price = None
+            if pd.notna(row["PurchasePrice"]):
+                try:
+                    purchase_price = float(row["PurchasePrice"])
+                    if purchase_price < 0:
+                        error_rows.append({"row": index + 2, "field": "PurchasePrice", "error": "PurchasePrice cannot be negative."})
+                        continue
+                except ValueError:
+                    error_rows.append({"row": index + 2, "field": "PurchasePrice", "error": "Invalid format for PurchasePrice."})
+                    continue
+
+            purchase_date = None
+            if pd.notna(row["PurchaseDate"]):
+                try:
+                    purchase_date = pd.to_datetime(row["PurchaseDate"]).date()
+                except Exception:
+                    error_rows.append({"row": index + 2, "field": "PurchaseDate", "error": "Invalid format for PurchaseDate. Use YYYY-MM-DD."})
+                    continue
+
+            holdings.append({"ticker_symbol": ticker.upper(), "quantity": quantity,
+                             "purchase_price": purchase_price, "purchase_date": purchase_date})
+        except Exception as e:
+            current_app.logger.error(f"Error processing row {index + 2}: {e}")
+            error_rows.append({"row": index + 2, "error": str(e)})
+    return holdings, error_rows
+
+def _column_wise(text):
+    chunk = next(read_csv_chunks(io.BytesIO(text.encode()), 10_000))
+    return validate_holdings(chunk)
+
+def _random_csv(rng, rows):
+    tickers = ["AAPL", "msft", "Goog", "BRK.B"] # Alphabetic: the row loop read an empty ticker as "nan"
+    quantities = ["10", "1", "0", "-4", "250", "abc", "", "x1"]
+    prices = ["150.25", "", "-1", "x", "1e3", ".5", "0", "12"]
+    dates = ["2023-01-15", "", "2023-13-01", "01/02/2023", "yesterday", "2024-02-29", "2024-02-30"]
+    lines = ["Ticker,Quantity,PurchasePrice,PurchaseDate"]
+    for _ in range(rows):
+        lines.append(",".join(rng.choice(column) for column in (tickers, quantities, prices, dates)))
+    return "\n".join(lines) + "\n"
+
+def test_column_wise_validation_matches_the_row_loop(app_context):
+    rng = random.Random(21)
+    for _ in range(80):
+        text = _random_csv(rng, rng.randint(1, 30))
+        assert _column_wise(text) == _row_loop(text), text
+
+def test_all_numeric_columns_match_the_row_loop(app_context):
+    # Columns the row loop read as int64/float64 rather than text
+    text = "Ticker,Quantity,PurchasePrice,PurchaseDate\nAAPL,10,150.5,\nmsft,0,2,\nGOOG,3,-1,\nTSLA,7,,\n"
+    holdings, error_rows = _column_wise(text)
+    assert (holdings, error_rows) == _row_loop(text)
+    assert [holding["ticker_symbol"] for holding in holdings] == ["AAPL", "TSLA"]
+    assert [error["row"] for error in error_rows] == [3, 4]
+
+def test_fractional_quantity_is_rejected(app_context):
+    # The row loop truncated 2.5 to 2 when the column read as numbers (and rejected it with int()'s
+    # message when it read as text); it is now rejected either way
+    text = "Ticker,Quantity,PurchasePrice,PurchaseDate\nAAPL,2.5,,\nMSFT,3.0,,\n"
+    assert [holding["quantity"] for holding in _row_loop(text)[0]] == [2, 3]
+    holdings, error_rows = _column_wise(text)
+    assert holdings == [{"ticker_symbol": "MSFT", "quantity": 3, "purchase_price": None, "purchase_date": None}]
+    assert error_rows == [{"row": 2, "error": "Quantity must be a whole number: 2.5"}]
@@ -0,0 +1,61 @@
+# tests/test_warmup_budget.py
+# The warm-up request budget is one budget per day, shared through the database by every
+# scheduler (process) that runs the warm-up. Chart data (on disk, read by every process) is
+# refreshed once per ticker; in-memory data by each process that runs analysis jobs.
+
+import threading
+
+import pytest
+
+from src.data_services.warmup_scheduler import IN_MEMORY_ENDPOINTS, WarmupScheduler
+
+TICKERS = ["AAPL", "GOOG", "MSFT", "NVDA", "TSLA"]
+
+@pytest.fixture
+def warmed(app, db, monkeypatch, tmp_path):
+    """Holdings of TICKERS (AAPL most widely held) and the list of (endpoint, ticker) refreshed."""
+    from src.data_services.market_data_cache import CachedYahooFinanceClient
+    from src.data_services.price_history_store import IncrementalChartLoader
+    from src.models.portfolio_holding import PortfolioHolding
+
+    for rank, ticker in enumerate(TICKERS):
+        for holder in range(len(TICKERS) - rank):
+            db.session.add(PortfolioHolding(session_id=f"warmup-{holder}", ticker_symbol=ticker, quantity=1))
+    db.session.commit()
+    monkeypatch.setitem(app.config, "PRICE_HISTORY_DB_PATH", str(tmp_path / "prices.db"))
+    refreshed = []
+    monkeypatch.setattr(CachedYahooFinanceClient, "refresh", lambda self, endpoint, ticker: refreshed.append((endpoint, ticker)) or {"ok": True})
+    monkeypatch.setattr(IncrementalChartLoader, "get_price_series", lambda self, ticker: refreshed.append(("price_series", ticker)) or {"ok": True})
+    return refreshed
+
+def test_chart_data_is_refreshed_once_and_in_memory_data_per_analysis_process(app, warmed):
+    standalone = WarmupScheduler(app, request_budget=100, warm_memory=False).run_once()
+    assert standalone["endpoints"] == ["price_series"]
+    assert warmed == [("price_series", ticker) for ticker in TICKERS]
+
+    warmed.clear()
+    for _ in range(2): # Two processes running analysis jobs
+        summary = WarmupScheduler(app, request_budget=100).run_once()
+        assert summary["requests_made"] == len(TICKERS) * len(IN_MEMORY_ENDPOINTS)
+    assert not any(endpoint == "price_series" for endpoint, _ in warmed) # Already on disk
+    assert sorted(warmed) == sorted([(endpoint, ticker) for ticker in TICKERS for endpoint in IN_MEMORY_ENDPOINTS] * 2)
+
+def test_schedulers_running_at_once_stay_within_the_days_budget(app, warmed):
+    budget = 10
+    schedulers = [WarmupScheduler(app, request_budget=budget, warm_memory=i > 0) for i in range(3)]
+    runs = [None] * len(schedulers)
+    def run(i):
+        runs[i] = schedulers[i].run_once()
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(len(schedulers))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(warmed) == sum(summary["requests_made"] for summary in runs)
+    assert budget - 1 <= len(warmed) <= budget # At most one request short: no reservation fits in what is left
+    charts = [ticker for endpoint, ticker in warmed if endpoint == "price_series"]
+    assert len(charts) == len(set(charts)) # No ticker's chart refreshed twice
+
+    # The day's budget is spent: another pass that day makes no requests
+    assert WarmupScheduler(app, request_budget=budget).run_once()["requests_made"] == 0